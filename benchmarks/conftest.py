@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from awsstepfuncs import ChoiceState, PassState, StateMachine, VariableChoice
+
+# The "small" scale keeps a benchmark run short enough for every change; run
+# with AWSSTEPFUNCS_BENCHMARK_SCALE=full before a release
+SCALES = {
+    "small": {
+        "n_states": [10, 100],
+        "n_compiled_states": [100, 1000],
+        "n_items": [100],
+        "map_depth": [1, 3],
+    },
+    "full": {
+        "n_states": [10, 100, 1000, 10_000],
+        "n_compiled_states": [100, 1000, 10_000],
+        "n_items": [1000, 10_000, 100_000],
+        "map_depth": [1, 3, 5],
+    },
+}
+
+
+def pytest_generate_tests(metafunc):
+    scale = SCALES[os.environ.get("AWSSTEPFUNCS_BENCHMARK_SCALE", "small")]
+    for argname, sizes in scale.items():
+        if argname in metafunc.fixturenames:
+            metafunc.parametrize(argname, sizes)
+
+
+def build_pass_chain(n_states):
+    """Build a state machine of Pass States one after another."""
+    states = [PassState(f"Pass {index}") for index in range(n_states)]
+    for state, next_state in zip(states, states[1:]):
+        state >> next_state
+    return StateMachine(start_state=states[0])
+
+
+def build_choice_loop(n_states):
+    """Build a state machine of Choice States that can all loop back to the start.
+
+    The loop is only taken if the input has "loop" set to true, so simulating it
+    with other input goes through every Choice State once.
+    """
+    end_state = PassState("End")
+    next_state = end_state
+    choice_states = []
+    for index in reversed(range(n_states)):
+        choice_state = ChoiceState(f"Choice {index}", choices=[], default=next_state)
+        choice_states.append(choice_state)
+        next_state = choice_state
+    start_state = choice_states[-1]
+    for choice_state in choice_states:
+        choice_state.choices = [
+            VariableChoice(
+                variable="$.loop", boolean_equals=True, next_state=start_state
+            )
+        ]
+    return StateMachine(start_state=start_state)
+
+
+@pytest.fixture()
+def pass_chain():
+    return build_pass_chain
+
+
+@pytest.fixture()
+def choice_loop():
+    return build_choice_loop
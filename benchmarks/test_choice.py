@@ -0,0 +1,31 @@
+import pytest
+
+from awsstepfuncs.choice import ChoiceRule, DataTestExpressionType
+
+# Values of the variable and of the data-test expression for each kind of operator
+VALUES = {
+    "string": ("b", "a"),
+    "numeric": (2, 1),
+    "boolean": (True, True),
+    "timestamp": ("2021-01-02T00:00:00Z", "2021-01-01T00:00:00Z"),
+}
+
+
+@pytest.mark.parametrize(
+    "operator", [expression_type.value for expression_type in DataTestExpressionType]
+)
+def test_choice_rule_evaluate(benchmark, operator):
+    if not hasattr(ChoiceRule, f"_{operator}"):
+        pytest.skip(f"{operator} is not simulated yet")
+
+    if operator.startswith("is_"):
+        data, expression = {"value": "b"}, True
+    elif operator == "string_matches":
+        data, expression = {"value": "bob"}, "b*"
+    else:
+        variable, other = VALUES[operator.split("_")[0]]
+        data = {"value": variable, "other": other}
+        expression = "$.other" if operator.endswith("_path") else other
+    choice_rule = ChoiceRule("$.value", **{operator: expression})
+
+    benchmark(choice_rule.evaluate, data)
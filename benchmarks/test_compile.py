@@ -0,0 +1,65 @@
+import pytest
+
+from awsstepfuncs import StateMachine
+from awsstepfuncs.serialization import set_json_backend
+from awsstepfuncs.synthetic import generate_state_machine
+
+
+def test_compile_pass_chain(benchmark, pass_chain, n_compiled_states):
+    state_machine = pass_chain(n_compiled_states)
+    compiled = benchmark(state_machine.compile)
+    assert len(compiled["States"]) == n_compiled_states
+
+
+def test_compile_choice_loop(benchmark, choice_loop, n_compiled_states):
+    state_machine = choice_loop(n_compiled_states)
+    compiled = benchmark(state_machine.compile)
+    assert len(compiled["States"]) == n_compiled_states + 1
+
+
+def test_to_json_choice_loop(benchmark, tmp_path, choice_loop, n_compiled_states):
+    state_machine = choice_loop(n_compiled_states)
+    benchmark(state_machine.to_json, tmp_path / "state_machine.json")
+
+
+def test_compile_synthetic(benchmark, n_compiled_states):
+    state_machine = generate_state_machine(0, n_states=n_compiled_states, map_depth=2)
+    compiled = benchmark(state_machine.compile)
+    assert len(compiled["States"]) == n_compiled_states
+
+
+def build_deep_map(map_depth):
+    return generate_state_machine(
+        0, n_states=100, map_ratio=0.3, map_depth=map_depth, map_iterator_states=10
+    )
+
+
+def test_compile_deep_map(benchmark, map_depth):
+    benchmark.pedantic(
+        StateMachine.compile,
+        setup=lambda: ((build_deep_map(map_depth),), {}),
+        rounds=5,
+    )
+
+
+def test_recompile_deep_map(benchmark, map_depth):
+    state_machine = build_deep_map(map_depth)
+    state_machine.compile()
+    benchmark(state_machine.compile)
+
+
+def test_to_json_gzip_deep_map(benchmark, tmp_path, map_depth):
+    state_machine = build_deep_map(map_depth)
+    benchmark(state_machine.to_json, tmp_path / "state_machine.json.gz")
+
+
+@pytest.mark.parametrize("json_backend", ["json", "orjson"])
+def test_definition_hash(benchmark, n_compiled_states, json_backend):
+    if json_backend == "orjson":
+        pytest.importorskip("orjson")
+    set_json_backend(json_backend)
+    try:
+        state_machine = generate_state_machine(0, n_states=n_compiled_states)
+        benchmark(state_machine.definition_hash)
+    finally:
+        set_json_backend("auto")
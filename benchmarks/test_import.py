@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+COMPILE_ONLY = """
+from awsstepfuncs import PassState, StateMachine
+
+StateMachine(start_state=PassState("Pass", input_path="$.foo")).compile()
+"""
+
+
+def test_import_time(benchmark):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", "import awsstepfuncs"],),
+        kwargs={"check": True},
+        rounds=5,
+    )
+
+
+def test_compile_only_time(benchmark):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", COMPILE_ONLY],),
+        kwargs={"check": True},
+        rounds=5,
+    )
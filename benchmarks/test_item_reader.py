@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from awsstepfuncs.s3 import ItemReader, LocalS3
+
+
+@pytest.mark.parametrize("input_type", ["JSON", "JSONL", "CSV"])
+def test_item_reader(benchmark, tmp_path, n_items, input_type):
+    items = [{"id": str(index), "name": f"item {index}"} for index in range(n_items)]
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    if input_type == "JSON":
+        document = json.dumps(items)
+    elif input_type == "JSONL":
+        document = "".join(json.dumps(item) + "\n" for item in items)
+    else:
+        document = "id,name\n" + "".join(
+            f"{item['id']},{item['name']}\n" for item in items
+        )
+    (bucket / "items").write_text(document)
+    item_reader = ItemReader(
+        parameters={"Bucket": "bucket", "Key": "items"}, input_type=input_type
+    )
+    s3 = LocalS3(tmp_path)
+
+    read_items = benchmark(lambda: list(item_reader.read(s3, {})))
+    assert read_items == items
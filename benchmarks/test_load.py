@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from awsstepfuncs import StateMachine
+from awsstepfuncs.serialization import set_json_backend
+from awsstepfuncs.synthetic import generate_state_machine
+
+
+@pytest.fixture(autouse=True)
+def _reset_json_backend():
+    yield
+    set_json_backend("auto")
+
+
+def test_from_dict_synthetic(benchmark, n_compiled_states):
+    compiled = generate_state_machine(
+        0, n_states=n_compiled_states, task_ratio=0.2, map_depth=2
+    ).compile()
+    state_machine = benchmark(StateMachine.from_dict, compiled)
+    assert len(state_machine.all_states) == n_compiled_states
+
+
+def test_from_dict_deep_map(benchmark, map_depth):
+    compiled = generate_state_machine(
+        0, n_states=100, map_ratio=0.3, map_depth=map_depth, map_iterator_states=10
+    ).compile()
+    benchmark(StateMachine.from_dict, compiled)
+
+
+@pytest.mark.parametrize("json_backend", ["json", "orjson"])
+def test_from_json_corpus(benchmark, tmp_path, json_backend):
+    if json_backend == "orjson":
+        pytest.importorskip("orjson")
+    set_json_backend(json_backend)
+    paths = []
+    for seed in range(200):
+        path = tmp_path / f"state_machine_{seed}.json"
+        compiled = generate_state_machine(seed, n_states=50, map_depth=1).compile()
+        path.write_text(json.dumps(compiled))
+        paths.append(path)
+
+    def load_corpus():
+        return [StateMachine.from_json(path) for path in paths]
+
+    assert len(benchmark(load_corpus)) == len(paths)
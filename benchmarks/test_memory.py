@@ -0,0 +1,165 @@
+import gc
+import json
+import tracemalloc
+
+import pytest
+
+from awsstepfuncs import MapState, PassState, StateMachine, Verbosity
+from awsstepfuncs.synthetic import generate_state_machine
+
+N_STATES = 50_000
+
+N_MAP_ITEMS = 100
+ITEM_SIZE = 100_000
+
+
+def build_state_machine():
+    return generate_state_machine(
+        0,
+        n_states=N_STATES,
+        choice_ratio=0.3,
+        task_ratio=0.3,
+        catcher_density=0.5,
+    )
+
+
+def test_memory_per_state(benchmark):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        state_machine = build_state_machine()
+        gc.collect()
+        bytes_per_state = (tracemalloc.get_traced_memory()[0] - before) / N_STATES
+    finally:
+        tracemalloc.stop()
+    del state_machine
+
+    benchmark.extra_info["bytes_per_state"] = round(bytes_per_state)
+    benchmark.pedantic(build_state_machine, rounds=1)
+
+
+def build_map_chain(stream_output):
+    first_map_state = MapState(
+        "First",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        stream_output=stream_output,
+    )
+    second_map_state = MapState(
+        "Second",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        stream_output=stream_output,
+    )
+    first_map_state >> second_map_state
+    return StateMachine(start_state=first_map_state)
+
+
+@pytest.mark.parametrize("stream_output", [False, True])
+def test_memory_map_chain(benchmark, stream_output):
+    state_machine = build_map_chain(stream_output)
+
+    def simulate():
+        items = ("x" * ITEM_SIZE for _ in range(N_MAP_ITEMS))
+        state_output = state_machine.simulate(items, verbosity=Verbosity.SILENT)
+        return sum(len(output) for output in state_output)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        assert simulate() == N_MAP_ITEMS * ITEM_SIZE
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    benchmark.extra_info["peak_bytes"] = peak_bytes
+    benchmark.pedantic(simulate, rounds=1)
+
+
+@pytest.mark.parametrize("reducer", [None, "count"])
+def test_memory_map_reducer(benchmark, reducer):
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        reducer=reducer,
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    def simulate():
+        items = ("x" * ITEM_SIZE for _ in range(N_MAP_ITEMS))
+        return state_machine.simulate(items, verbosity=Verbosity.SILENT)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        simulate()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    benchmark.extra_info["peak_bytes"] = peak_bytes
+    benchmark.pedantic(simulate, rounds=1)
+
+
+@pytest.mark.parametrize("output_memory_limit", [None, 1_000_000])
+def test_memory_map_spill(benchmark, output_memory_limit):
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        output_memory_limit=output_memory_limit,
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    def simulate():
+        items = ("x" * ITEM_SIZE for _ in range(N_MAP_ITEMS))
+        state_output = state_machine.simulate(items, verbosity=Verbosity.SILENT)
+        assert len(state_output) == N_MAP_ITEMS
+        return state_output
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        simulate()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    benchmark.extra_info["peak_bytes"] = peak_bytes
+    benchmark.pedantic(simulate, rounds=1)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_memory_map_input_document(benchmark, tmp_path, lazy):
+    path = tmp_path / "input.json"
+    with path.open("w") as fp:
+        json.dump(
+            {"records": ["x" * ITEM_SIZE for _ in range(N_MAP_ITEMS)], "run": 1}, fp
+        )
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        items_path="$.records",
+        max_concurrency=4,
+        reducer="count",
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    def simulate():
+        if lazy:
+            return state_machine.simulate(input_document=path, verbosity=0)
+        with path.open() as fp:
+            return state_machine.simulate(json.load(fp), verbosity=0)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        assert simulate() == N_MAP_ITEMS
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    benchmark.extra_info["peak_bytes"] = peak_bytes
+    benchmark.pedantic(simulate, rounds=1)
@@ -0,0 +1,11 @@
+from awsstepfuncs.metrics import LatencyHistogram, SimulationMetrics
+
+
+def test_histogram_record(benchmark):
+    histogram = LatencyHistogram()
+    benchmark(histogram.record, 123_456)
+
+
+def test_metrics_record(benchmark):
+    metrics = SimulationMetrics()
+    benchmark(metrics.record, "My Task", "Execute", 123_456)
@@ -0,0 +1,50 @@
+from awsstepfuncs import PassState, StateMachine, Verbosity
+from awsstepfuncs.printer import Printer
+
+
+def build_state_machine(n_states=20):
+    states = [
+        PassState(f"Pass {index}", result_path="$.result", result=index)
+        for index in range(n_states)
+    ]
+    for state, next_state in zip(states, states[1:]):
+        state >> next_state
+    return StateMachine(start_state=states[0])
+
+
+def state_input():
+    return {"items": [{"id": index, "name": f"item {index}"} for index in range(50)]}
+
+
+def test_simulate_silent(benchmark):
+    state_machine = build_state_machine()
+    benchmark(lambda: state_machine.simulate(state_input(), verbosity=Verbosity.SILENT))
+
+
+def test_simulate_bypassing_printer(benchmark):
+    """The baseline for a silent simulation: printing is a no-op function."""
+    state_machine = build_state_machine()
+
+    def simulate():
+        state_machine.print = lambda *messages, **kwargs: None
+        state_machine.recorder = None
+        state_machine.history = None
+        return state_machine._run(state_input(), resource_to_mock_fn={})
+
+    benchmark(simulate)
+
+
+def test_silent_printer_call(benchmark):
+    printer = Printer(verbosity=Verbosity.SILENT)
+    payload = state_input()
+    benchmark(lambda: printer("State output:", payload, level=Verbosity.PAYLOADS))
+
+
+def test_noop_call(benchmark):
+    """The baseline for a silent printer call."""
+
+    def noop(*messages, **kwargs):
+        pass
+
+    payload = state_input()
+    benchmark(lambda: noop("State output:", payload, level=Verbosity.PAYLOADS))
@@ -0,0 +1,15 @@
+import pytest
+
+from awsstepfuncs.reference_path import ReferencePath
+
+
+@pytest.mark.parametrize("depth", [1, 5, 20])
+def test_reference_path_apply(benchmark, depth):
+    data = leaf = {}
+    for _ in range(depth):
+        leaf["child"] = {}
+        leaf = leaf["child"]
+    leaf["value"] = 1
+    reference_path = ReferencePath("$" + ".child" * depth + ".value")
+
+    assert benchmark(reference_path.apply, data) == 1
@@ -0,0 +1,163 @@
+import time
+
+import pytest
+
+from awsstepfuncs import MapState, PassState, StateMachine, TaskState, Verbosity
+from awsstepfuncs.item_batcher import ItemBatcher
+from awsstepfuncs.metrics import SimulationMetrics
+from awsstepfuncs.shared_context import SharedContext
+from awsstepfuncs.synthetic import generate_payload, generate_state_machine
+
+
+def test_simulate_pass_chain(benchmark, pass_chain, n_states):
+    state_machine = pass_chain(n_states)
+    benchmark.pedantic(
+        state_machine.simulate,
+        args=({"foo": 1},),
+        kwargs={"verbosity": Verbosity.SILENT},
+        rounds=3,
+    )
+
+
+def test_simulate_choice_loop(benchmark, choice_loop, n_states):
+    state_machine = choice_loop(n_states)
+    benchmark.pedantic(
+        state_machine.simulate,
+        args=({"foo": 1},),
+        kwargs={"verbosity": Verbosity.SILENT},
+        rounds=3,
+    )
+
+
+def test_simulate_map(benchmark, n_items):
+    iterator = StateMachine(start_state=PassState("Pass"))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    state_machine = StateMachine(start_state=map_state)
+    items = [{"index": index} for index in range(n_items)]
+
+    state_output = benchmark.pedantic(
+        state_machine.simulate,
+        args=(items,),
+        kwargs={"verbosity": Verbosity.SILENT},
+        rounds=3,
+    )
+    assert len(state_output) == n_items
+
+
+def test_simulate_synthetic(benchmark, n_states):
+    state_machine = generate_state_machine(0, n_states=n_states, map_depth=1)
+    state_input = generate_payload(0, n_items=5, map_depth=1)
+    benchmark.pedantic(
+        state_machine.simulate,
+        args=(state_input,),
+        kwargs={"verbosity": Verbosity.SILENT},
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 0])
+def test_simulate_map_waiting_mocks(benchmark, max_concurrency):
+    resource = "arn:aws:lambda:us-east-1:123456789012:function:Wait"
+
+    def mock_wait(event, context):
+        time.sleep(0.05)
+        return event
+
+    iterator = StateMachine(start_state=TaskState("Wait", resource=resource))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=max_concurrency)
+    state_machine = StateMachine(start_state=map_state)
+
+    state_output = benchmark.pedantic(
+        state_machine.simulate,
+        args=(list(range(1, 21)),),
+        kwargs={
+            "resource_to_mock_fn": {resource: mock_wait},
+            "verbosity": Verbosity.SILENT,
+        },
+        rounds=3,
+    )
+    assert state_output == list(range(1, 21))
+
+
+@pytest.mark.parametrize("max_items_per_batch", [None, 25])
+def test_simulate_map_item_batcher(benchmark, n_items, max_items_per_batch):
+    resource = "arn:aws:lambda:us-east-1:123456789012:function:Count"
+
+    def mock_count(event, context):
+        return len(event["Items"]) if max_items_per_batch else 1
+
+    iterator = StateMachine(start_state=TaskState("Count", resource=resource))
+    item_batcher = (
+        ItemBatcher(max_items_per_batch=max_items_per_batch)
+        if max_items_per_batch
+        else None
+    )
+    map_state = MapState(
+        "Map",
+        iterator=iterator,
+        max_concurrency=0,
+        item_batcher=item_batcher,
+        reducer="sum",
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    state_output = benchmark.pedantic(
+        state_machine.simulate,
+        args=(list(range(n_items)),),
+        kwargs={
+            "resource_to_mock_fn": {resource: mock_count},
+            "verbosity": Verbosity.SILENT,
+        },
+        rounds=3,
+    )
+    assert state_output == n_items
+    benchmark.extra_info["items_per_second"] = round(
+        n_items / benchmark.stats.stats.mean
+    )
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_simulate_map_shared_context(benchmark, n_items, shared):
+    table = {f"key {index}": {"index": index} for index in range(10_000)}
+    iterator = StateMachine(start_state=PassState("Pass", input_path="$.key"))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=4, backend="process")
+    state_machine = StateMachine(start_state=map_state)
+
+    with SharedContext() as shared_context:
+        if shared:
+            table = shared_context.share_table(table)
+        # Each item carries the table, as a copy or as a handle
+        items = [{"table": table, "key": f"key {index}"} for index in range(n_items)]
+        state_output = benchmark.pedantic(
+            state_machine.simulate,
+            args=(items,),
+            kwargs={"verbosity": Verbosity.SILENT},
+            rounds=3,
+        )
+    assert len(state_output) == n_items
+    benchmark.extra_info["items_per_second"] = round(
+        n_items / benchmark.stats.stats.mean
+    )
+
+
+@pytest.mark.parametrize("backend", ["thread", "process", "auto"])
+def test_simulate_map_backends(benchmark, pass_chain, n_items, backend):
+    # Iterations of Pass States only run Python code, so they are CPU-bound
+    map_state = MapState(
+        "Map", iterator=pass_chain(2), max_concurrency=0, backend=backend
+    )
+    state_machine = StateMachine(start_state=map_state)
+    metrics = SimulationMetrics()
+
+    state_output = benchmark.pedantic(
+        state_machine.simulate,
+        args=(list(range(n_items)),),
+        kwargs={"verbosity": Verbosity.SILENT, "metrics": metrics},
+        rounds=3,
+    )
+    assert len(state_output) == n_items
+    benchmark.extra_info["items_per_second"] = round(
+        n_items / benchmark.stats.stats.mean
+    )
+    if decision := metrics.map_backends.get("Map"):
+        benchmark.extra_info["decision"] = decision._asdict()
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from awsstepfuncs.synthetic import generate_state_machine
+from awsstepfuncs.validation import validate_definition, validate_many
+
+
+def test_validate_synthetic(benchmark, n_compiled_states):
+    compiled = generate_state_machine(
+        0, n_states=n_compiled_states, task_ratio=0.2, map_depth=2
+    ).compile()
+    assert benchmark(validate_definition, compiled) == []
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("corpus")
+    paths = []
+    for seed in range(1000):
+        path = directory / f"state_machine_{seed}.json"
+        compiled = generate_state_machine(seed, n_states=100, map_depth=1).compile()
+        path.write_text(json.dumps(compiled))
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("max_workers", [1, None])
+def test_validate_many_corpus(benchmark, corpus, max_workers):
+    results = benchmark.pedantic(
+        validate_many, (corpus,), {"max_workers": max_workers}, rounds=3
+    )
+    assert not any(results)
@@ -20,6 +20,7 @@ setup(
     python_requires=">=3.8.0",
     setup_requires=["setuptools_scm"],
     install_requires=read_requirements(requirements_path),
+    extras_require={"orjson": ["orjson>=3"]},
     use_scm_version={
         "version_scheme": "guess-next-dev",
         "local_scheme": "dirty-tag",
@@ -8,7 +8,9 @@ from awsstepfuncs.choice import (  # noqa: F401
     NotChoice,
     VariableChoice,
 )
+from awsstepfuncs.counters import stats  # noqa: F401
 from awsstepfuncs.errors import AWSStepFuncsError, AWSStepFuncsValueError  # noqa: F401
+from awsstepfuncs.printer import Verbosity  # noqa: F401
 from awsstepfuncs.state import (  # noqa: F401
     ChoiceState,
     FailState,
@@ -5,21 +5,65 @@ Based on this table: https://states-language.net/spec.html#state-type-table
 from __future__ import annotations
 
 import re
+import sys
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional
 
+from awsstepfuncs import counters
 from awsstepfuncs.error_handlers import Catcher, Retrier
 from awsstepfuncs.errors import AWSStepFuncsValueError
-from awsstepfuncs.printer import Printer, Style
+from awsstepfuncs.history import ExecutionHistory
+from awsstepfuncs.metrics import SimulationMetrics
+from awsstepfuncs.printer import Printer, Style, Verbosity
+from awsstepfuncs.recording import AbstractExecutionLog
 from awsstepfuncs.reference_path import ReferencePath
+from awsstepfuncs.trace import AbstractTraceSink, TraceEventType
 from awsstepfuncs.types import ResourceToMockFn
 
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.profiling import SimulationProfiler
+    from awsstepfuncs.s3 import LocalS3
+
 MAX_STATE_NAME_LENGTH = 128
 
+# The attributes of states and state machines set for each simulation, which
+# aren't pickled
+SIMULATION_ATTRIBUTES = frozenset(
+    {"print", "recorder", "history", "trace", "metrics", "profiler", "s3"}
+)
+
+# Incremented whenever a state is renamed. Since states refer to the states
+# they transition to by name, a rename invalidates all cached compiled states
+_rename_count = 0
+
 
 class AbstractState(ABC):
     """An Amazon States Language state including Name, Comment, and Type."""
 
+    __slots__ = (
+        "name",
+        "comment",
+        "next_state",
+        "_current",
+        "_compiled",
+        "_compiled_rename_count",
+        # Used for simulations
+        "print",
+        "recorder",
+        "history",
+        "trace",
+        "metrics",
+        "profiler",
+        "s3",
+    )
+
+    # Setting any other attribute invalidates the cached compiled state
+    _untracked_attributes: FrozenSet[str] = (
+        frozenset({"_current", "_compiled", "_compiled_rename_count"})
+        | SIMULATION_ATTRIBUTES
+    )
+
     def __init__(self, name: str, comment: Optional[str] = None):
         """Initialize subclasses.
 
@@ -36,10 +80,42 @@ class AbstractState(ABC):
                 f"State name cannot exceed {MAX_STATE_NAME_LENGTH} characters"
             )
 
-        self.name = name
+        self._compiled: Optional[Dict[str, Any]] = None
+        self._compiled_rename_count = 0
+        self.name = sys.intern(name)
         self.comment = comment
         self.next_state: Optional[AbstractState] = None
         self.print: Printer  # Used for simulations
+        self.recorder: Optional[AbstractExecutionLog] = None  # Used for simulations
+        self.history: Optional[ExecutionHistory] = None  # Used for simulations
+        self.trace: Optional[AbstractTraceSink] = None  # Used for simulations
+        self.metrics: Optional[SimulationMetrics] = None  # Used for simulations
+        self.profiler: Optional[SimulationProfiler] = None  # Used for simulations
+        self.s3: Optional[LocalS3] = None  # Used for simulations
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, without what is set for simulations.
+
+        Returns:
+            The attributes of the state.
+        """
+        return {
+            name: getattr(self, name)
+            for cls in type(self).__mro__
+            for name in getattr(cls, "__slots__", ())
+            if name not in SIMULATION_ATTRIBUTES and hasattr(self, name)
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore a pickled state, which is then ready to be simulated again.
+
+        Args:
+            state: The attributes of the state.
+        """
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        for name in SIMULATION_ATTRIBUTES - {"print"}:
+            object.__setattr__(self, name, None)
 
     def compile(self) -> Dict[str, Any]:  # noqa: A003
         """Compile the state to Amazon States Language.
@@ -54,6 +130,45 @@ class AbstractState(ABC):
             compiled["Comment"] = comment
         return compiled
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute, invalidating the cached compiled state.
+
+        Args:
+            name: The name of the attribute.
+            value: The value of the attribute.
+        """
+        if name == "name" and hasattr(self, "name"):
+            global _rename_count
+            _rename_count += 1
+        object.__setattr__(self, name, value)
+        if self._compiled is not None and name not in self._untracked_attributes:
+            object.__setattr__(self, "_compiled", None)
+
+    def invalidate(self) -> None:
+        """Discard the cached compiled state.
+
+        Setting any attribute of a state, adding a Retrier or Catcher, and
+        renaming any state are all detected. Call this after changing a state
+        in place in a way that isn't, such as mutating its parameters, its list
+        of choices, or the choices themselves.
+        """
+        self._compiled = None
+
+    def compile_cached(self) -> Dict[str, Any]:
+        """Compile the state, reusing the last compilation if nothing changed.
+
+        Compiling a state machine compiles each state with this method. The
+        returned dictionary is shared with later calls and must not be mutated.
+
+        Returns:
+            A dictionary representing the compiled state in Amazon States
+            Language.
+        """
+        if self._compiled is None or self._compiled_rename_count != _rename_count:
+            self._compiled = self.compile()
+            self._compiled_rename_count = _rename_count
+        return self._compiled
+
     @abstractmethod
     def _execute(self, state_input: Any, resource_to_mock_fn: ResourceToMockFn) -> Any:
         """Execute the state.
@@ -69,6 +184,27 @@ class AbstractState(ABC):
         """
         raise NotImplementedError
 
+    def _execute_phase(
+        self, state_input: Any, resource_to_mock_fn: ResourceToMockFn
+    ) -> Any:
+        """Execute the state, timing it if metrics are collected.
+
+        Args:
+            state_input: The input state data.
+            resource_to_mock_fn: A mapping of resource URIs to mock functions to
+                use if the state performs a task.
+
+        Returns:
+            The output of the state, or an empty dictionary if it has none.
+        """
+        if self.metrics is None:
+            return self._execute(state_input, resource_to_mock_fn) or {}
+        start = perf_counter_ns()
+        try:
+            return self._execute(state_input, resource_to_mock_fn) or {}
+        finally:
+            self.metrics.record(self.name, "Execute", perf_counter_ns() - start)
+
     def simulate(
         self, state_input: Any, *, resource_to_mock_fn: ResourceToMockFn
     ) -> Any:
@@ -82,7 +218,7 @@ class AbstractState(ABC):
         Returns:
             The output of the state after applying any output processing.
         """
-        return self._execute(state_input, resource_to_mock_fn) or {}
+        return self._execute_phase(state_input, resource_to_mock_fn)
 
     def __rshift__(self, other: AbstractState, /) -> AbstractState:
         """Overload >> operator to set state execution order.
@@ -140,6 +276,8 @@ class AbstractInputPathOutputPathState(AbstractState):
     a state by using Reference Paths.
     """
 
+    __slots__ = ("input_path", "output_path")
+
     def __init__(
         self, *args: Any, input_path: str = "$", output_path: str = "$", **kwargs: Any
     ):
@@ -169,25 +307,43 @@ class AbstractInputPathOutputPathState(AbstractState):
             The output of the state after applying any output processing.
         """
         state_input = self._apply_input_path(state_input)
-        state_output = self._execute(state_input, resource_to_mock_fn) or {}
+        state_output = self._execute_phase(state_input, resource_to_mock_fn)
         return self._apply_output_path(state_output)
 
     def _apply_input_path(self, state_input: Any) -> Any:
         """Apply input path to some state input."""
+        if self.metrics is not None:
+            start = perf_counter_ns()
         state_input = self.input_path.apply(state_input)
+        if self.metrics is not None:
+            self.metrics.record(self.name, "InputPath", perf_counter_ns() - start)
+        if self.trace is not None:
+            self.trace.emit(
+                TraceEventType.PATH_APPLIED, self.name, "InputPath", state_input
+            )
         self.print(
             f"State input after applying input path of {self.input_path}:",
             state_input,
+            level=Verbosity.PAYLOADS,
             style=Style.DIM,
         )
         return state_input
 
     def _apply_output_path(self, state_output: Any) -> Any:
         """Apply output path to some state output."""
+        if self.metrics is not None:
+            start = perf_counter_ns()
         state_output = self.output_path.apply(state_output)
+        if self.metrics is not None:
+            self.metrics.record(self.name, "OutputPath", perf_counter_ns() - start)
+        if self.trace is not None:
+            self.trace.emit(
+                TraceEventType.PATH_APPLIED, self.name, "OutputPath", state_output
+            )
         self.print(
             f"State output after applying output path of {self.output_path}:",
             state_output,
+            level=Verbosity.PAYLOADS,
             style=Style.DIM,
         )
         return state_output
@@ -210,6 +366,8 @@ class AbstractInputPathOutputPathState(AbstractState):
 class AbstractNextOrEndState(AbstractInputPathOutputPathState):
     """An Amazon States Language state including Next or End."""
 
+    __slots__ = ()
+
     def compile(self) -> Dict[str, Any]:  # noqa: A003
         """Compile the state to Amazon States Language.
 
@@ -228,6 +386,8 @@ class AbstractNextOrEndState(AbstractInputPathOutputPathState):
 class AbstractResultPathState(AbstractNextOrEndState):
     """An Amazon States Language state including ResultPath."""
 
+    __slots__ = ("result_path",)
+
     def __init__(self, *args: Any, result_path: Optional[str] = "$", **kwargs: Any):
         """Initialize subclasses.
 
@@ -266,7 +426,7 @@ class AbstractResultPathState(AbstractNextOrEndState):
             The output of the state after applying any output processing.
         """
         state_input = self._apply_input_path(state_input)
-        state_output = self._execute(state_input, resource_to_mock_fn) or {}
+        state_output = self._execute_phase(state_input, resource_to_mock_fn)
         state_output = self._apply_result_path(state_input, state_output)
         return self._apply_output_path(state_output)
 
@@ -280,6 +440,8 @@ class AbstractResultPathState(AbstractNextOrEndState):
         Returns:
             The state resulting from applying ResultPath.
         """
+        if self.metrics is not None:
+            start = perf_counter_ns()
         if str(self.result_path) == "$":
             # Just keep state output
             output = state_output
@@ -291,15 +453,24 @@ class AbstractResultPathState(AbstractNextOrEndState):
         elif match := re.fullmatch(r"\$\.([A-Za-z]+)", str(self.result_path)):
             # Move the state output as a key in state input
             result_key = match.group(1)
+            if counters.enabled:
+                counters.increment(counters.RESULT_PATH_MERGE)
             state_input[result_key] = state_output
             output = state_input
 
         else:  # pragma: no cover
             assert False, "Should never happen"  # noqa: PT015
 
+        if self.metrics is not None:
+            self.metrics.record(self.name, "ResultPath", perf_counter_ns() - start)
+        if self.trace is not None:
+            self.trace.emit(
+                TraceEventType.PATH_APPLIED, self.name, "ResultPath", output
+            )
         self.print(
             f"Output from applying result path of {self.result_path}:",
             output,
+            level=Verbosity.PAYLOADS,
             style=Style.DIM,
         )
         return output
@@ -308,6 +479,8 @@ class AbstractResultPathState(AbstractNextOrEndState):
 class AbstractParametersState(AbstractResultPathState):
     """An Amazon States Language state including Parameters."""
 
+    __slots__ = ("parameters",)
+
     def __init__(
         self, *args: Any, parameters: Optional[Dict[str, Any]] = None, **kwargs: Any
     ):
@@ -342,6 +515,8 @@ class AbstractParametersState(AbstractResultPathState):
 class AbstractResultSelectorState(AbstractParametersState):
     """An Amazon States Language state including ResultSelector."""
 
+    __slots__ = ("result_selector",)
+
     def __init__(
         self, *args: Any, result_selector: Dict[str, str] = None, **kwargs: Any
     ):
@@ -409,12 +584,20 @@ class AbstractResultSelectorState(AbstractParametersState):
             The output of the state after applying any output processing.
         """
         state_input = self._apply_input_path(state_input)
-        state_output = self._execute(state_input, resource_to_mock_fn) or {}
+        state_output = self._execute_phase(state_input, resource_to_mock_fn)
         if self.result_selector:
             state_output = self._apply_result_selector(state_output)
+            if self.trace is not None:
+                self.trace.emit(
+                    TraceEventType.PATH_APPLIED,
+                    self.name,
+                    "ResultSelector",
+                    state_output,
+                )
             self.print(
                 f"State output after applying result selector {self.result_selector}:",
                 state_output,
+                level=Verbosity.PAYLOADS,
                 style=Style.DIM,
             )
         state_output = self._apply_result_path(state_input, state_output)
@@ -429,18 +612,24 @@ class AbstractResultSelectorState(AbstractParametersState):
         Returns:
             The filtered state output.
         """
+        if self.metrics is not None:
+            start = perf_counter_ns()
         new_state_output = {}
         for key, reference_path in self.result_selector.items():  # type: ignore
             key = key[:-2]  # Strip ".$"
             if extracted := ReferencePath(reference_path).apply(state_output):
                 new_state_output[key] = extracted
 
+        if self.metrics is not None:
+            self.metrics.record(self.name, "ResultSelector", perf_counter_ns() - start)
         return new_state_output
 
 
 class AbstractRetryCatchState(AbstractResultSelectorState):
     """An Amazon States Language state including Retry and Catch."""
 
+    __slots__ = ("retriers", "catchers")
+
     def __init__(self, *args: Any, **kwargs: Any):
         """Initialize subclasses.
 
@@ -499,6 +688,7 @@ class AbstractRetryCatchState(AbstractResultSelectorState):
             max_attempts=max_attempts,
         )
         self.retriers.append(retrier)
+        self.invalidate()
         return self
 
     def add_catcher(
@@ -531,4 +721,5 @@ class AbstractRetryCatchState(AbstractResultSelectorState):
             next_state=next_state,
         )
         self.catchers.append(catcher)
+        self.invalidate()
         return self
@@ -2,8 +2,9 @@ from __future__ import annotations
 
 from abc import ABC
 from enum import Enum
-from typing import Any, List, Union
+from typing import Any, Dict, List, Union
 
+from awsstepfuncs import counters
 from awsstepfuncs.abstract_state import AbstractState
 from awsstepfuncs.errors import AWSStepFuncsValueError
 from awsstepfuncs.reference_path import ReferencePath
@@ -60,6 +61,8 @@ class DataTestExpressionType(Enum):
 class DataTestExpression:
     """A data-test expression."""
 
+    __slots__ = ("expression_type", "expression")
+
     def __init__(self, type: str, expression: Any):  # noqa: A002
         """Initialize a data-test expression.
 
@@ -67,10 +70,18 @@ class DataTestExpression:
             type: The type of data-test expression, such as string_equals.
             expression: The expression to use when evaluating based on the type.
         """
-        # NOTE: The enum is just used for validation
-        self.type = DataTestExpressionType(type).value
+        self.expression_type = DataTestExpressionType(type)
         self.expression = ReferencePath(expression) if "path" in type else expression
 
+    @property
+    def type(self) -> str:  # noqa: A003
+        """Return the type of data-test expression, such as string_equals.
+
+        Returns:
+            The value of the data-test expression type.
+        """
+        return self.expression_type.value
+
     def __repr__(self) -> str:
         """A string representation of a data-test expression."""
         return f"{self.__class__.__name__}({self.type}={self.expression!r})"
@@ -84,6 +95,8 @@ class ChoiceRule:
     expression on some data.
     """
 
+    __slots__ = ("variable", "data_test_expression")
+
     def __init__(self, variable: str, **data_test_expression: Any):
         """Initialize a Choice Rule.
 
@@ -114,6 +127,23 @@ class ChoiceRule:
         """
         return f"{self.__class__.__name__}({self.variable!r}, {self.data_test_expression.type}={self.data_test_expression.expression!r})"
 
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the Choice Rule to Amazon States Language.
+
+        >>> ChoiceRule("$.value", numeric_greater_than_equals_path="$.min").compile()
+        {'Variable': '$.value', 'NumericGreaterThanEqualsPath': '$.min'}
+
+        Returns:
+            A dictionary representing the compiled Choice Rule.
+        """
+        operator = "".join(
+            word.capitalize() for word in self.data_test_expression.type.split("_")
+        )
+        expression = self.data_test_expression.expression
+        if isinstance(expression, ReferencePath):
+            expression = str(expression)
+        return {"Variable": str(self.variable), operator: expression}
+
     def evaluate(self, data: Any) -> bool:
         """Evaulate the Choice Rule with a data-test expression on some data.
 
@@ -123,6 +153,8 @@ class ChoiceRule:
         Returns:
             True or false based on the data and the Choice Rule.
         """
+        if counters.enabled:
+            counters.increment(counters.CHOICE_RULE_EVALUATION)
         variable_value = self.variable.apply(data)
 
         if variable_value is None:
@@ -214,6 +246,8 @@ class ChoiceRule:
 class AbstractChoice(ABC):
     """Choices for Choice State."""
 
+    __slots__ = ("next_state",)
+
     def __init__(self, next_state: AbstractState):
         """Perform common initialization steps for all choices.
 
@@ -222,6 +256,14 @@ class AbstractChoice(ABC):
         """
         self.next_state = next_state
 
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the choice to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled choice.
+        """
+        return {"Next": self.next_state.name}
+
     def evaluate(self, data: Any) -> bool:
         """Evaulate the choice on some given data.
 
@@ -241,6 +283,8 @@ class NotChoice(AbstractChoice):
     on whether the Choice Rule is false.
     """
 
+    __slots__ = ("choice_rule",)
+
     def __init__(
         self,
         variable: str,
@@ -261,6 +305,14 @@ class NotChoice(AbstractChoice):
             **data_test_expression,
         )
 
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the Not Choice to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled Not Choice.
+        """
+        return {"Not": self.choice_rule.compile(), **super().compile()}
+
     def evaluate(self, data: Any) -> bool:
         """Evaulate the Not Choice on some given data.
 
@@ -280,6 +332,8 @@ class AndChoice(AbstractChoice):
     on whether all Choice Rules are true.
     """
 
+    __slots__ = ("choice_rules",)
+
     def __init__(
         self,
         choice_rules: List[ChoiceRule],
@@ -295,6 +349,17 @@ class AndChoice(AbstractChoice):
         super().__init__(next_state)
         self.choice_rules = choice_rules
 
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the And Choice to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled And Choice.
+        """
+        return {
+            "And": [choice_rule.compile() for choice_rule in self.choice_rules],
+            **super().compile(),
+        }
+
     def evaluate(self, data: Any) -> bool:
         """Evaulate the And Choice on some given data.
 
@@ -317,6 +382,8 @@ class VariableChoice(AbstractChoice):
     type.
     """
 
+    __slots__ = ("choice_rule",)
+
     def __init__(
         self,
         variable: str,
@@ -337,6 +404,14 @@ class VariableChoice(AbstractChoice):
             **data_test_expression,
         )
 
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the Variable Choice to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled Variable Choice.
+        """
+        return {**self.choice_rule.compile(), **super().compile()}
+
     def evaluate(self, data: Any) -> bool:
         """Evaulate the Variable Choice on some given data.
 
@@ -0,0 +1,155 @@
+"""Counters of the library's hot paths.
+
+Counting is off by default. Turn it on by setting the environment variable
+`AWSSTEPFUNCS_STATS=1` before importing `awsstepfuncs`, or with
+`enable_stats()`. Read the counters with `awsstepfuncs.stats()`:
+
+>>> from awsstepfuncs import stats
+>>> from awsstepfuncs.reference_path import ReferencePath
+>>> enable_stats()
+>>> before = stats()
+>>> ReferencePath("$.foo").apply({"foo": 1})
+1
+>>> stats().diff(before)[REFERENCE_PATH_APPLY]
+1
+>>> disable_stats()
+
+While counting is off, each counted code path only checks a module attribute.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterator, Mapping
+
+STATS_ENV_VAR = "AWSSTEPFUNCS_STATS"
+
+REFERENCE_PATH_APPLY = "reference_path.apply"
+JSONPATH_PARSE = "jsonpath.parse"
+CHOICE_RULE_EVALUATION = "choice_rule.evaluation"
+PRINTER_FORMAT = "printer.format"
+RESULT_PATH_MERGE = "result_path.merge"
+
+enabled = os.environ.get(STATS_ENV_VAR, "") not in {"", "0"}
+
+_lock = threading.Lock()
+_counters: Counter = Counter()
+
+
+def enable_stats() -> None:
+    """Start counting."""
+    global enabled
+    enabled = True
+
+
+def disable_stats() -> None:
+    """Stop counting. The counters keep their values."""
+    global enabled
+    enabled = False
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """Increment a counter.
+
+    Call sites check `enabled` first so that nothing is counted (or locked) when
+    counting is off.
+
+    Args:
+        name: The name of the counter.
+        amount: How much to add to the counter.
+    """
+    with _lock:
+        _counters[name] += amount
+
+
+def reset_stats() -> None:
+    """Reset all counters to zero."""
+    with _lock:
+        _counters.clear()
+
+
+class StatsSnapshot(Mapping[str, int]):
+    """A snapshot of the counters. Counters that never ran read as zero."""
+
+    def __init__(self, counts: Dict[str, int]):
+        """Initialize a snapshot.
+
+        Args:
+            counts: The value of each counter.
+        """
+        self._counts = counts
+
+    def __getitem__(self, name: str) -> int:
+        """Return the value of a counter.
+
+        Args:
+            name: The name of the counter.
+
+        Returns:
+            The value of the counter, or zero if it never ran.
+        """
+        return self._counts.get(name, 0)
+
+    def __contains__(self, name: object) -> bool:
+        """Whether the counter ran.
+
+        Args:
+            name: The name of the counter.
+
+        Returns:
+            Whether the counter is in the snapshot.
+        """
+        return name in self._counts
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the counters that ran.
+
+        Returns:
+            An iterator over the counter names.
+        """
+        return iter(self._counts)
+
+    def __len__(self) -> int:
+        """Return the number of counters that ran.
+
+        Returns:
+            The number of counters.
+        """
+        return len(self._counts)
+
+    def __repr__(self) -> str:
+        """Return a string representation of the snapshot.
+
+        Returns:
+            A string representing the snapshot.
+        """
+        return f"{self.__class__.__name__}({self._counts!r})"
+
+    def diff(self, earlier: StatsSnapshot) -> StatsSnapshot:
+        """Return how much each counter grew since an earlier snapshot.
+
+        Args:
+            earlier: The earlier snapshot.
+
+        Returns:
+            A snapshot of the differences, without the counters that didn't
+            change.
+        """
+        return StatsSnapshot(
+            {
+                name: count - earlier[name]
+                for name, count in self._counts.items()
+                if count != earlier[name]
+            }
+        )
+
+
+def stats() -> StatsSnapshot:
+    """Take a snapshot of the counters.
+
+    Returns:
+        The snapshot.
+    """
+    with _lock:
+        return StatsSnapshot(dict(_counters))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import sys
 from abc import ABC
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type, Union
 
@@ -12,6 +13,8 @@ if TYPE_CHECKING:  # pragma: no cover
 class AbstractErrorHandler(ABC):
     """Error handlers compose of Retriers and Catchers."""
 
+    __slots__ = ("error_equals",)
+
     def __init__(self, error_equals: List[str]):
         """Initialize child classes with error_equals handled.
 
@@ -21,7 +24,7 @@ class AbstractErrorHandler(ABC):
         self.error_equals: List[Union[str, Type[StateSimulationError]]] = [
             error_class
             if (error_class := StateSimulationError.from_string(error_string))
-            else error_string
+            else sys.intern(error_string)
             for error_string in error_equals
         ]
 
@@ -42,6 +45,8 @@ class AbstractErrorHandler(ABC):
 class Retrier(AbstractErrorHandler):
     """Used to retry a failed state given the error names."""
 
+    __slots__ = ("interval_seconds", "backoff_rate", "max_attempts")
+
     def __init__(
         self,
         error_equals: List[str],
@@ -101,6 +106,8 @@ class Retrier(AbstractErrorHandler):
 class Catcher(AbstractErrorHandler):
     """Used to go from an errored state to another state."""
 
+    __slots__ = ("next_state",)
+
     def __init__(self, error_equals: List[str], next_state: AbstractState):
         """Initialize a Catcher.
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, Type
+from typing import Any, Dict, Optional, Type
 
 
 class AWSStepFuncsError(Exception):
@@ -33,6 +33,32 @@ class AWSStepFuncsValueError(AWSStepFuncsError):
     """
 
 
+class ReplayDivergenceError(AWSStepFuncsError):
+    """Raised when a replayed simulation diverges from its recording."""
+
+    def __init__(
+        self,
+        *,
+        position: int,
+        expected: Optional[Dict[str, Any]],
+        actual: Optional[Dict[str, Any]],
+    ):
+        """Initialize a ReplayDivergenceError.
+
+        Args:
+            position: The 1-based position of the diverging record.
+            expected: The recorded record, or None if the recording had ended.
+            actual: The record produced by the replayed simulation, or None if
+                the simulation had ended.
+        """
+        self.position = position
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            f"Replay diverged at record {position}: expected {expected}, got {actual}"
+        )
+
+
 class StateSimulationError(AWSStepFuncsError):
     """Raised when there is an error while simulating a state.
 
@@ -75,6 +101,8 @@ class StateSimulationError(AWSStepFuncsError):
                 StateTimeoutError,
                 TaskFailedError,
                 NoChoiceMatchedError,
+                ItemReaderFailedError,
+                ResultWriterFailedError,
             }
         }
         return mapping.get(error_string)
@@ -102,6 +130,18 @@ class NoChoiceMatchedError(StateSimulationError):
     error_string = "States.NoChoiceMatched"
 
 
+class ItemReaderFailedError(StateSimulationError):
+    """Raised when a Map State failed to read its items."""
+
+    error_string = "States.ItemReaderFailed"
+
+
+class ResultWriterFailedError(StateSimulationError):
+    """Raised when a Map State failed to write its results."""
+
+    error_string = "States.ResultWriterFailed"
+
+
 class FailStateError(StateSimulationError):
     """Raised when running a Fail State."""
 
@@ -0,0 +1,408 @@
+"""Queryable execution history of a simulation.
+
+Events are stored in a compact columnar layout: parallel arrays hold the event
+type, state ID, and timestamp of every event, and a fourth array holds a
+reference into a side store of payloads (state input, state output, or error
+details). Payloads are snapshotted as JSON when the event happens, so later
+states mutating their data doesn't rewrite history.
+
+Events are rendered in the shape of AWS Step Functions' `GetExecutionHistory`
+only when they are read.
+"""
+from __future__ import annotations
+
+import json
+import time
+from array import array
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.recording import serialize
+
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.abstract_state import AbstractState
+
+NO_REFERENCE = -1
+
+HistoryEvent = Dict[str, Any]
+
+
+class HistoryEventType(Enum):
+    """All the different types of history events.
+
+    The values are stored in the history's event type array, so they must fit
+    in an unsigned byte.
+    """
+
+    EXECUTION_STARTED = 1
+    EXECUTION_SUCCEEDED = 2
+    EXECUTION_FAILED = 3
+    STATE_ENTERED = 4
+    STATE_EXITED = 5
+    STATE_FAILED = 6
+    MAP_ITERATION_STARTED = 7
+    MAP_ITERATION_SUCCEEDED = 8
+    MAP_ITERATION_FAILED = 9
+
+    def aws_name(self, state_type: Optional[str] = None) -> str:
+        """Return the name that AWS Step Functions uses for the event type.
+
+        >>> HistoryEventType.STATE_ENTERED.aws_name("Pass")
+        'PassStateEntered'
+        >>> HistoryEventType.STATE_FAILED.aws_name("Task")
+        'TaskFailed'
+        >>> HistoryEventType.MAP_ITERATION_STARTED.aws_name()
+        'MapIterationStarted'
+
+        Args:
+            state_type: The type of the state of the event, if any.
+
+        Returns:
+            The AWS name of the event type.
+        """
+        words = "".join(word.capitalize() for word in self.name.split("_"))
+        if state_type is None:
+            return words
+        if self is HistoryEventType.STATE_FAILED and state_type == "Task":
+            return "TaskFailed"
+        return state_type + words
+
+
+_STATE_DETAILS_KEYS = {
+    HistoryEventType.STATE_ENTERED: ("stateEnteredEventDetails", "input"),
+    HistoryEventType.STATE_EXITED: ("stateExitedEventDetails", "output"),
+}
+
+_PAYLOAD_KEYS = {
+    HistoryEventType.EXECUTION_STARTED: "input",
+    HistoryEventType.EXECUTION_SUCCEEDED: "output",
+    HistoryEventType.MAP_ITERATION_STARTED: "input",
+    HistoryEventType.MAP_ITERATION_SUCCEEDED: "output",
+}
+
+
+class ExecutionHistory:
+    """The history of events of a simulated execution.
+
+    Get one by simulating with `return_history=True`:
+
+    .. highlight:: python
+    .. code-block:: python
+
+        history = state_machine.simulate({"foo": 1}, return_history=True)
+        final_output = history.output
+        task_events = list(history.filter(state_name="My Task"))
+        history.to_jsonl("history.jsonl")
+    """
+
+    def __init__(self, *, max_events: Optional[int] = None):
+        """Initialize an empty execution history.
+
+        Args:
+            max_events: If set, only keep the last `max_events` events (a ring
+                buffer), which is useful for long-looping state machines.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when max_events is not positive.
+        """
+        if max_events is not None and max_events <= 0:
+            raise AWSStepFuncsValueError("max_events must be a positive integer")
+
+        self.max_events = max_events
+        self.output: Any = None
+
+        size = max_events or 0
+        self._event_types = array("B", bytes(size))
+        self._state_ids = array("l", [NO_REFERENCE]) * size
+        self._timestamps = array("d", [0.0]) * size
+        self._payload_refs = array("l", [NO_REFERENCE]) * size
+        self._payloads: Dict[int, Any] = {}
+        self._next_payload_ref = 0
+        self._event_count = 0
+
+        self._state_names: List[str] = []
+        self._state_types: List[str] = []
+        self._state_ids_by_key: Dict[Tuple[str, str], int] = {}
+        self._depth = 0
+
+    def __len__(self) -> int:
+        """Return the number of events kept in the history.
+
+        Returns:
+            The number of events kept.
+        """
+        if self.max_events:
+            return min(self._event_count, self.max_events)
+        return self._event_count
+
+    def add_event(
+        self,
+        event_type: HistoryEventType,
+        state: Optional[AbstractState] = None,
+        payload: Any = None,
+    ) -> None:
+        """Add an event to the history.
+
+        Args:
+            event_type: The type of the event.
+            state: The state of the event, if any.
+            payload: The payload of the event, if any. State data is snapshotted
+                as JSON, error details are kept as is.
+        """
+        state_id = self._intern_state(state) if state else NO_REFERENCE
+        payload_ref = NO_REFERENCE
+        if payload is not None:
+            payload_ref = self._next_payload_ref
+            self._next_payload_ref += 1
+            self._payloads[payload_ref] = (
+                payload if isinstance(payload, tuple) else serialize(payload)
+            )
+
+        timestamp = time.time()
+        if self.max_events:
+            slot = self._event_count % self.max_events
+            if self._event_count >= self.max_events:
+                self._payloads.pop(self._payload_refs[slot], None)
+            self._event_types[slot] = event_type.value
+            self._state_ids[slot] = state_id
+            self._timestamps[slot] = timestamp
+            self._payload_refs[slot] = payload_ref
+        else:
+            self._event_types.append(event_type.value)
+            self._state_ids.append(state_id)
+            self._timestamps.append(timestamp)
+            self._payload_refs.append(payload_ref)
+        self._event_count += 1
+
+    def _intern_state(self, state: AbstractState) -> int:
+        """Return the ID of a state, adding it to the state table if needed.
+
+        Args:
+            state: The state to look up.
+
+        Returns:
+            The ID of the state.
+        """
+        key = (state.name, state.state_type)  # type: ignore
+        if (state_id := self._state_ids_by_key.get(key)) is None:
+            state_id = len(self._state_names)
+            self._state_ids_by_key[key] = state_id
+            self._state_names.append(state.name)
+            self._state_types.append(state.state_type)  # type: ignore
+        return state_id
+
+    def start_execution(self, state_input: Any) -> None:
+        """Add the event for the start of a (possibly nested) execution.
+
+        Args:
+            state_input: The input of the execution.
+        """
+        self._depth += 1
+        event_type = (
+            HistoryEventType.EXECUTION_STARTED
+            if self._depth == 1
+            else HistoryEventType.MAP_ITERATION_STARTED
+        )
+        self.add_event(event_type, payload=state_input)
+
+    def end_execution(self, state_output: Any, error: Optional[Exception]) -> None:
+        """Add the event for the end of a (possibly nested) execution.
+
+        Args:
+            state_output: The output of the execution.
+            error: The error that failed the execution, if it failed.
+        """
+        top_level = self._depth == 1
+        self._depth -= 1
+        if error:
+            self.add_event(
+                HistoryEventType.EXECUTION_FAILED
+                if top_level
+                else HistoryEventType.MAP_ITERATION_FAILED,
+                payload=self.error_details(error),
+            )
+        else:
+            self.add_event(
+                HistoryEventType.EXECUTION_SUCCEEDED
+                if top_level
+                else HistoryEventType.MAP_ITERATION_SUCCEEDED,
+                payload=state_output,
+            )
+        if top_level:
+            self.output = state_output
+
+    @staticmethod
+    def error_details(error: Exception) -> Tuple[str, str]:
+        """Extract the error name and cause of an error.
+
+        Args:
+            error: The error.
+
+        Returns:
+            A tuple of the error name and the cause.
+        """
+        return (
+            getattr(error, "error_string", error.__class__.__name__),
+            getattr(error, "cause", str(error)),
+        )
+
+    def _slots(self, reverse_order: bool = False) -> Iterator[Tuple[int, int]]:
+        """Iterate over the event IDs and array slots of the kept events.
+
+        Args:
+            reverse_order: Whether to iterate from the latest event.
+
+        Yields:
+            Tuples of event ID (1-based) and array slot.
+        """
+        first_id = self._event_count - len(self) + 1
+        event_ids = range(first_id, self._event_count + 1)
+        for event_id in reversed(event_ids) if reverse_order else event_ids:
+            slot = event_id - 1
+            if self.max_events:
+                slot %= self.max_events
+            yield event_id, slot
+
+    def _render(self, event_id: int, slot: int) -> HistoryEvent:
+        """Render an event in the shape of AWS Step Functions.
+
+        Args:
+            event_id: The ID of the event.
+            slot: The array slot of the event.
+
+        Returns:
+            The rendered event.
+        """
+        event_type = HistoryEventType(self._event_types[slot])
+        state_id = self._state_ids[slot]
+        state_type = self._state_types[state_id] if state_id != NO_REFERENCE else None
+        event: HistoryEvent = {
+            "timestamp": datetime.fromtimestamp(
+                self._timestamps[slot], tz=timezone.utc
+            ),
+            "type": event_type.aws_name(state_type),
+            "id": event_id,
+            "previousEventId": event_id - 1,
+        }
+
+        payload = self._payloads.get(self._payload_refs[slot])
+        if event_type in _STATE_DETAILS_KEYS:
+            details_key, payload_key = _STATE_DETAILS_KEYS[event_type]
+            event[details_key] = {
+                "name": self._state_names[state_id],
+                payload_key: payload,
+            }
+        else:
+            details: Dict[str, Any] = {}
+            if isinstance(payload, tuple):
+                details["error"], details["cause"] = payload
+            elif payload is not None:
+                details[_PAYLOAD_KEYS[event_type]] = payload
+            if state_id != NO_REFERENCE:
+                details["name"] = self._state_names[state_id]
+            aws_name = event["type"]
+            event[aws_name[0].lower() + aws_name[1:] + "EventDetails"] = details
+        return event
+
+    def __iter__(self) -> Iterator[HistoryEvent]:
+        """Iterate over the kept events from the oldest one.
+
+        Yields:
+            Each event in the shape of AWS Step Functions.
+        """
+        for event_id, slot in self._slots():
+            yield self._render(event_id, slot)
+
+    def filter(  # noqa: A003
+        self,
+        *,
+        state_name: Optional[str] = None,
+        event_type: Optional[HistoryEventType] = None,
+    ) -> Iterator[HistoryEvent]:
+        """Iterate over the kept events matching a state name and/or event type.
+
+        Only the matching events are rendered.
+
+        Args:
+            state_name: Only keep events of the state with this name.
+            event_type: Only keep events of this type.
+
+        Yields:
+            Each matching event in the shape of AWS Step Functions.
+        """
+        for event_id, slot in self._slots():
+            if event_type and self._event_types[slot] != event_type.value:
+                continue
+            if state_name is not None:
+                state_id = self._state_ids[slot]
+                if (
+                    state_id == NO_REFERENCE
+                    or self._state_names[state_id] != state_name
+                ):
+                    continue
+            yield self._render(event_id, slot)
+
+    def get_execution_history(
+        self,
+        *,
+        max_results: int = 100,
+        next_token: Optional[str] = None,
+        reverse_order: bool = False,
+    ) -> Dict[str, Any]:
+        """Page through the history like AWS Step Functions' GetExecutionHistory.
+
+        >>> history = ExecutionHistory()
+        >>> for _ in range(3):
+        ...     history.add_event(HistoryEventType.EXECUTION_STARTED)
+        >>> page = history.get_execution_history(max_results=2)
+        >>> [event["id"] for event in page["events"]], page["nextToken"]
+        ([1, 2], '2')
+        >>> page = history.get_execution_history(max_results=2, next_token="2")
+        >>> [event["id"] for event in page["events"]], "nextToken" in page
+        ([3], False)
+
+        Args:
+            max_results: The maximum number of events per page.
+            next_token: The token returned by the previous page, if any.
+            reverse_order: Whether to list the latest events first.
+
+        Returns:
+            A page with "events" and, if there are more events, "nextToken".
+        """
+        skip = int(next_token) if next_token else 0
+        events: List[HistoryEvent] = []
+        for index, (event_id, slot) in enumerate(self._slots(reverse_order)):
+            if index < skip:
+                continue
+            if len(events) == max_results:
+                return {"events": events, "nextToken": str(index)}
+            events.append(self._render(event_id, slot))
+        return {"events": events}
+
+    def to_jsonl(self, fp: Union[str, Path, TextIO]) -> None:
+        """Export the kept events as JSON lines.
+
+        Args:
+            fp: A path or a text file object to write to.
+        """
+        if isinstance(fp, (str, Path)):
+            with Path(fp).open("w") as opened_fp:
+                self.to_jsonl(opened_fp)
+            return
+
+        for event in self:
+            event["timestamp"] = event["timestamp"].isoformat()
+            fp.write(json.dumps(event) + "\n")
@@ -0,0 +1,310 @@
+"""Incremental re-simulation of state machines after definition edits.
+
+Every state is fingerprinted by its compiled Amazon States Language. A
+`SimulationCache` keeps, for each named execution, the trace of states it went
+through along with the fingerprint and input of each state at the time. When
+the execution is simulated again:
+
+- If none of the traced states changed, the cached output is returned without
+  executing anything.
+- Otherwise the simulation resumes at the first changed state with the input
+  recorded for it, since every transition before it would produce the same
+  result as last time.
+
+Mocks are assumed to be deterministic; clear the cache if a mock changes.
+"""
+from __future__ import annotations
+
+import json
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from awsstepfuncs.abstract_state import AbstractState
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.printer import Printer, Verbosity
+from awsstepfuncs.recording import AbstractExecutionLog, digest, serialize
+from awsstepfuncs.state import MapState
+from awsstepfuncs.state_machine import StateMachine
+from awsstepfuncs.types import ResourceToMockFn
+
+Transition = Dict[str, Optional[str]]
+
+
+def fingerprint(state: AbstractState) -> str:
+    """Fingerprint a state by its compiled Amazon States Language.
+
+    >>> from awsstepfuncs import PassState
+    >>> fingerprint(PassState("Pass")) == fingerprint(PassState("Pass"))
+    True
+    >>> fingerprint(PassState("Pass")) == fingerprint(PassState("Pass", result=1))
+    False
+
+    Args:
+        state: The state to fingerprint.
+
+    Returns:
+        A digest of the compiled state.
+    """
+    return digest(state.compile())
+
+
+class SimulationStatus(Enum):
+    """How the output of an incremental simulation was obtained."""
+
+    NEW = "new"
+    UNCHANGED = "unchanged"
+    RESUMED = "resumed"
+
+
+class IncrementalResult:
+    """The result of simulating a named execution with a `SimulationCache`."""
+
+    def __init__(
+        self,
+        *,
+        status: SimulationStatus,
+        output: Any,
+        resumed_from: Optional[str] = None,
+    ):
+        """Initialize an incremental simulation result.
+
+        Args:
+            status: How the output was obtained.
+            output: The final output of the execution.
+            resumed_from: The name of the state that the simulation was resumed
+                from, if it was resumed.
+        """
+        self.status = status
+        self.output = output
+        self.resumed_from = resumed_from
+
+    def __repr__(self) -> str:
+        """Return a string representation of the result.
+
+        Returns:
+            A string representing the result.
+        """
+        return f"{self.__class__.__name__}(status={self.status.value!r}, resumed_from={self.resumed_from!r})"
+
+
+class TraceCollector(AbstractExecutionLog):
+    """Collect the top-level transitions of a simulation for caching."""
+
+    def __init__(self, fingerprints: Dict[str, str]):
+        """Initialize a trace collector.
+
+        Args:
+            fingerprints: The fingerprint of each state by name.
+        """
+        self.fingerprints = fingerprints
+        self.transitions: List[Transition] = []
+        self._depth = 0
+
+    def start_execution(self) -> None:
+        """Handle the start of a (possibly nested) execution."""
+        self._depth += 1
+
+    def record_transition(
+        self,
+        state_name: str,
+        state_input_snapshot: str,
+        state_output: Any,
+        next_state_name: Optional[str],
+    ) -> None:
+        """Collect a transition of the top-level state machine.
+
+        Args:
+            state_name: The name of the state that was executed.
+            state_input_snapshot: The input to the state serialized with
+                `serialize()` before the state was executed.
+            state_output: The output of the state.
+            next_state_name: The name of the state transitioned to, if any.
+        """
+        if self._depth == 1:
+            self.transitions.append(
+                {
+                    "state": state_name,
+                    "fingerprint": self.fingerprints[state_name],
+                    "input": state_input_snapshot,
+                    "next": next_state_name,
+                }
+            )
+
+    def invoke_mock(self, resource: str, mock_input: Any, run_mock: Any) -> Any:
+        """Run the mock.
+
+        Args:
+            resource: The resource URI of the mock.
+            mock_input: The event passed to the mock.
+            run_mock: Runs the mock and returns its output.
+
+        Returns:
+            The output of the mock.
+        """
+        return run_mock()
+
+    def end_execution(self, execution_output: Any) -> None:
+        """Handle the end of a (possibly nested) execution.
+
+        Args:
+            execution_output: The final output of the execution.
+        """
+        self._depth -= 1
+
+
+class SimulationCache:
+    """Cache execution traces to only re-simulate what an edit affects.
+
+    .. highlight:: python
+    .. code-block:: python
+
+        cache = SimulationCache("simulations.json")
+        result = cache.simulate("happy path", state_machine, {"foo": 1})
+        # Edit a state, then simulate again: only states from the edited one
+        # onwards are executed
+        result = cache.simulate("happy path", state_machine, {"foo": 1})
+        assert result.status is SimulationStatus.RESUMED
+        cache.save()
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Initialize a simulation cache.
+
+        Args:
+            path: A JSON file to load cached traces from and save them to with
+                `save()`. If omitted, traces are only kept in memory.
+        """
+        self.path = Path(path) if path else None
+        self.traces: Dict[str, Dict[str, Any]] = {}
+        if self.path and self.path.exists():
+            with self.path.open() as fp:
+                self.traces = json.load(fp)
+
+    def save(self) -> None:
+        """Save the cached traces to the cache file, if there is one."""
+        if self.path:
+            with self.path.open("w") as fp:
+                json.dump(self.traces, fp)
+
+    def simulate(
+        self,
+        name: str,
+        state_machine: StateMachine,
+        state_input: Any = None,
+        /,
+        *,
+        resource_to_mock_fn: Optional[ResourceToMockFn] = None,
+        colorful: bool = False,
+        verbosity: Verbosity = Verbosity.PAYLOADS,
+    ) -> IncrementalResult:
+        """Simulate a named execution, reusing its cached trace if possible.
+
+        Args:
+            name: A unique name for the execution, such as a test case name.
+            state_machine: The state machine to simulate.
+            state_input: Data to pass to the first state.
+            resource_to_mock_fn: A dictionary mapping Resource URI to a mock
+                function to use in the simulation.
+            colorful: Whether to make the simulation STDOUT messages ✨pop✨.
+            verbosity: How much to print to STDOUT.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the state input or output isn't
+                JSON-serializable (such as a generator), or a Map State of the
+                state machine streams its output, so it can't be cached.
+
+        Returns:
+            The result of the simulation.
+        """
+        if state_input is None:
+            state_input = {}
+        state_input_snapshot = serialize(state_input, strict=True)
+        if any(
+            isinstance(state, MapState) and state.stream_output
+            for state in state_machine.all_states
+        ):
+            raise AWSStepFuncsValueError(
+                "Simulations with Map States streaming their output can't be cached"
+            )
+        fingerprints = {
+            state.name: fingerprint(state) for state in state_machine.all_states
+        }
+
+        kept_transitions: List[Transition] = []
+        start_state = state_machine.start_state
+        resumed = False
+        cached_trace = self.traces.get(name)
+        if (
+            cached_trace
+            and cached_trace["input"] == state_input_snapshot
+            and cached_trace["start"] == start_state.name
+        ):
+            changed_at = self._first_changed_transition(
+                cached_trace["transitions"], fingerprints
+            )
+            if changed_at is None:
+                return IncrementalResult(
+                    status=SimulationStatus.UNCHANGED,
+                    output=json.loads(cached_trace["output"]),
+                )
+            kept_transitions = cached_trace["transitions"][:changed_at]
+            resumed = True
+            resumed_transition = cached_trace["transitions"][changed_at]
+            if changed_at:
+                start_state = next(
+                    state
+                    for state in state_machine.all_states
+                    if state.name == resumed_transition["state"]
+                )
+                state_input = json.loads(resumed_transition["input"])
+
+        collector = TraceCollector(fingerprints)
+        state_machine.print = Printer(colorful=colorful, verbosity=verbosity)
+        state_machine.recorder = collector
+        state_machine.history = None
+        state_machine.trace = None
+        state_machine.metrics = None
+        state_machine.profiler = None
+        state_machine.s3 = None
+        try:
+            state_output = state_machine._run(
+                state_input,
+                resource_to_mock_fn=resource_to_mock_fn or {},
+                start_state=start_state,
+            )
+        finally:
+            state_machine.print.flush()
+
+        self.traces[name] = {
+            "input": state_input_snapshot,
+            "start": state_machine.start_state.name,
+            "transitions": kept_transitions + collector.transitions,
+            "output": serialize(state_output, strict=True),
+        }
+        if resumed:
+            return IncrementalResult(
+                status=SimulationStatus.RESUMED,
+                output=state_output,
+                resumed_from=start_state.name,
+            )
+        return IncrementalResult(status=SimulationStatus.NEW, output=state_output)
+
+    @staticmethod
+    def _first_changed_transition(
+        transitions: List[Transition], fingerprints: Dict[str, str]
+    ) -> Optional[int]:
+        """Find the first transition through a state that has changed.
+
+        Args:
+            transitions: The cached transitions.
+            fingerprints: The current fingerprint of each state by name.
+
+        Returns:
+            The index of the first changed transition, or None if no traced
+            state has changed.
+        """
+        for index, transition in enumerate(transitions):
+            if fingerprints.get(transition["state"]) != transition["fingerprint"]:  # type: ignore
+                return index
+        return None
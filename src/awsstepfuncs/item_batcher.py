@@ -0,0 +1,144 @@
+"""Batching of the items of Map States.
+
+A Map State with an `ItemBatcher` runs its iterator once per batch of items
+instead of once per item, as AWS Step Functions does: each iteration gets an
+object with the batch as "Items" (and the `batch_input`, if set, as
+"BatchInput") as its input. Batches are built as the items stream in, so only
+the batch being built is held in memory:
+
+>>> item_batcher = ItemBatcher(max_items_per_batch=2)
+>>> list(item_batcher.batch(["a", "b", "c"]))
+[{'Items': ['a', 'b']}, {'Items': ['c']}]
+
+Batches can also be limited by their size in bytes, as the JSON input of the
+iteration. Each item is serialized once to measure it; batches themselves are
+never serialized:
+
+>>> item_batcher = ItemBatcher(max_input_bytes_per_batch=16)
+>>> list(item_batcher.batch([1, 22, 333]))
+[{'Items': [1, 22]}, {'Items': [333]}]
+>>> item_batcher = ItemBatcher(max_items_per_batch=10, batch_input={"run": 1})
+>>> next(item_batcher.batch(["a"]))
+{'BatchInput': {'run': 1}, 'Items': ['a']}
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from awsstepfuncs.errors import AWSStepFuncsValueError, StateSimulationError
+from awsstepfuncs.serialization import get_json_backend
+
+# The size of `{"Items":[]}`, and of `"BatchInput":` and the comma after it
+_ITEMS_OVERHEAD = len(b'{"Items":[]}')
+_BATCH_INPUT_OVERHEAD = len(b'"BatchInput":,')
+
+
+class ItemBatcher:
+    """Group the items of a Map State into batches."""
+
+    __slots__ = ("max_items_per_batch", "max_input_bytes_per_batch", "batch_input")
+
+    def __init__(
+        self,
+        *,
+        max_items_per_batch: Optional[int] = None,
+        max_input_bytes_per_batch: Optional[int] = None,
+        batch_input: Optional[Dict[str, Any]] = None,
+    ):
+        """Initialize an item batcher.
+
+        Args:
+            max_items_per_batch: If set, how many items each batch holds at
+                most.
+            max_input_bytes_per_batch: If set, how many bytes the input of
+                each iteration (the batch and the batch input, serialized to
+                JSON) is at most. AWS Step Functions allows up to 256 KiB.
+            batch_input: If set, a fixed object to pass to every iteration
+                along with its batch.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when neither limit is set, or a limit
+                isn't positive.
+        """
+        if max_items_per_batch is None and max_input_bytes_per_batch is None:
+            raise AWSStepFuncsValueError(
+                "max_items_per_batch or max_input_bytes_per_batch must be set"
+            )
+        if max_items_per_batch is not None and max_items_per_batch <= 0:
+            raise AWSStepFuncsValueError("max_items_per_batch must be positive")
+        if max_input_bytes_per_batch is not None and max_input_bytes_per_batch <= 0:
+            raise AWSStepFuncsValueError("max_input_bytes_per_batch must be positive")
+        self.max_items_per_batch = max_items_per_batch
+        self.max_input_bytes_per_batch = max_input_bytes_per_batch
+        self.batch_input = batch_input
+
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the item batcher to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled item batcher in Amazon
+            States Language.
+        """
+        compiled: Dict[str, Any] = {}
+        if self.max_items_per_batch is not None:
+            compiled["MaxItemsPerBatch"] = self.max_items_per_batch
+        if self.max_input_bytes_per_batch is not None:
+            compiled["MaxInputBytesPerBatch"] = self.max_input_bytes_per_batch
+        if self.batch_input is not None:
+            compiled["BatchInput"] = self.batch_input
+        return compiled
+
+    def batch(self, items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """Group items into batches as they come.
+
+        Args:
+            items: The items to group.
+
+        Raises:
+            StateSimulationError: Raised when an item alone is larger than
+                max_input_bytes_per_batch.
+
+        Yields:
+            The input of the iteration of each batch, in the order of the items.
+        """
+        max_items = self.max_items_per_batch
+        max_bytes = self.max_input_bytes_per_batch
+        dumps = get_json_backend().dumps
+        empty_size = _ITEMS_OVERHEAD
+        if self.batch_input is not None:
+            empty_size += _BATCH_INPUT_OVERHEAD + len(dumps(self.batch_input))
+
+        batch: List[Any] = []
+        batch_size = empty_size
+        for item in items:
+            if max_bytes is not None:
+                # Items after the first are preceded by a comma
+                item_size = len(dumps(item)) + 1
+                if batch and batch_size + item_size > max_bytes:
+                    yield self._batch_input(batch)
+                    batch, batch_size = [], empty_size
+                if empty_size + item_size - 1 > max_bytes:
+                    raise StateSimulationError(
+                        f"An item of {item_size - 1} bytes can't fit in a batch of "
+                        f"at most {max_bytes} bytes"
+                    )
+                batch_size += item_size - (not batch)
+            batch.append(item)
+            if len(batch) == max_items:
+                yield self._batch_input(batch)
+                batch, batch_size = [], empty_size
+        if batch:
+            yield self._batch_input(batch)
+
+    def _batch_input(self, batch: List[Any]) -> Dict[str, Any]:
+        """Build the input of the iteration of a batch.
+
+        Args:
+            batch: The items of the batch.
+
+        Returns:
+            The input of the iteration.
+        """
+        if self.batch_input is None:
+            return {"Items": batch}
+        return {"BatchInput": self.batch_input, "Items": batch}
@@ -0,0 +1,647 @@
+"""JSON documents parsed lazily, as states access them.
+
+A state machine can be simulated with a JSON document read from a file path or
+binary stream as its input (see the `input_document` argument of
+`StateMachine.simulate()`), which is never parsed whole:
+
+- Looking up a key of an object scans the object up to that key, skipping over
+  the values of the other keys without building them. Objects are
+  `LazyJSONObject`s, which remember where each key scanned is in the document.
+- Arrays are `LazyJSONArray`s, whose elements are parsed one at a time while
+  iterating over them.
+
+A Map State whose items_path selects an array of such a document streams its
+items with flat memory, however large the array, while Reference Paths to
+scalars elsewhere in the document still resolve:
+
+>>> import io
+>>> data = b'{"records": [{"id": 1}, {"id": 2}], "run": 7}'
+>>> document = open_document(io.BytesIO(data))
+>>> document
+<LazyJSONObject at byte 0>
+>>> document["run"], document["records"]
+(7, <LazyJSONArray at byte 12>)
+>>> list(document["records"])
+[{'id': 1}, {'id': 2}]
+
+Objects can be updated (such as by a ResultPath), which never changes the
+document itself. Objects and arrays are pickled (such as when a mock returns
+them) as the dictionaries and lists they hold. Elements of arrays are only
+parsed while iterating: arrays can't be indexed, and a Reference Path such as
+`$.records[0]` doesn't resolve.
+
+Execution histories, recordings, and JSON lines traces serialize the state data
+of every step, which loads lazily parsed objects and arrays whole (see their
+`__json__()` methods), so memory isn't flat when simulating with any of them. A
+`RingBufferSink` keeps them lazy.
+"""
+from __future__ import annotations
+
+import copy
+import itertools
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from collections.abc import Iterable, MutableMapping
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Pattern, Set, Tuple, Union
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.serialization import CHUNK_SIZE, get_json_backend
+
+# Structural characters are ASCII, which never appear inside the multi-byte
+# UTF-8 sequences of other characters, so documents are scanned as bytes
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_CONTAINER_SPECIAL = re.compile(rb'["\[\]{}]')
+_SCALAR_END = re.compile(rb"[ \t\n\r,:\]}]")
+
+
+def open_document(
+    source: Union[str, Path, IO[bytes]], *, chunk_size: int = CHUNK_SIZE
+) -> Any:
+    """Open a JSON document to parse lazily.
+
+    Args:
+        source: The path of the document, or a binary file to read it from.
+            Files which can't seek (such as pipes) are first copied to a
+            temporary file.
+        chunk_size: How many bytes to read at a time.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the document is empty.
+
+    Returns:
+        A `LazyJSONObject` or `LazyJSONArray` if the document is an object or an
+        array, or else the parsed document.
+    """
+    document = _JSONFile(source, chunk_size)
+    if not _Scanner(document, 0).peek():
+        raise AWSStepFuncsValueError("The JSON document is empty")
+    return _load(document, 0)
+
+
+class LazyJSONObject(MutableMapping):
+    """A JSON object whose values are parsed when they are looked up."""
+
+    __slots__ = (
+        "_document",
+        "_offset",
+        "_offsets",
+        "_values",
+        "_deleted",
+        "_resume_offset",
+        "_skip_value",
+    )
+
+    def __init__(self, document: _JSONFile, offset: int):
+        """Initialize a lazy JSON object.
+
+        Args:
+            document: The document the object is in.
+            offset: The offset of the object in the document.
+        """
+        self._document = document
+        self._offset = offset
+        # The offsets of the values of the keys scanned so far
+        self._offsets: Dict[str, int] = {}
+        # The values looked up or set
+        self._values: Dict[str, Any] = {}
+        self._deleted: Set[str] = set()
+        # Where to resume scanning keys, and whether a value must be skipped
+        # first, or None once all keys are scanned
+        self._resume_offset: Optional[int] = offset
+        self._skip_value = False
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the value of a key, parsing it if it wasn't looked up yet.
+
+        Args:
+            key: The key.
+
+        Raises:
+            KeyError: Raised when the key isn't in the object.
+
+        Returns:
+            The value, lazy if it's an object or an array.
+        """
+        if key in self._values:
+            return self._values[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        # Concurrent Map State iterations may look up keys at once
+        with self._document.lock:
+            if key not in self._offsets:
+                self._scan(until=key)
+            if key not in self._offsets:
+                raise KeyError(key)
+            value = self._values[key] = _load(self._document, self._offsets[key])
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        """Set the value of a key, without changing the document.
+
+        Args:
+            key: The key.
+            value: The new value.
+        """
+        self._values[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key: str) -> None:
+        """Delete a key, without changing the document.
+
+        Args:
+            key: The key.
+
+        Raises:
+            KeyError: Raised when the key isn't in the object.
+        """
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        self._deleted.add(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys, scanning the whole object first.
+
+        Yields:
+            The keys of the document, then the keys set since.
+        """
+        with self._document.lock:
+            self._scan()
+        for key in list(self._offsets):
+            if key not in self._deleted:
+                yield key
+        for key in list(self._values):
+            if key not in self._offsets:
+                yield key
+
+    def __len__(self) -> int:
+        """Return the number of keys, scanning the whole object.
+
+        Returns:
+            The number of keys.
+        """
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        """Whether the object has keys, without scanning it if possible."""
+        if self._values:
+            return True
+        if not self._deleted:
+            scanner = _Scanner(self._document, self._offset)
+            scanner.expect(b"{")
+            return scanner.peek() != b"}"
+        return any(True for _ in self)
+
+    def __repr__(self) -> str:
+        """Return a representation which doesn't parse the object.
+
+        Returns:
+            The representation.
+        """
+        return f"<{self.__class__.__name__} at byte {self._offset}>"
+
+    def __copy__(self) -> LazyJSONObject:
+        """Copy the object, sharing the values looked up or set.
+
+        Returns:
+            The copy.
+        """
+        return self._copy(dict(self._values))
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> LazyJSONObject:
+        """Copy the object and the values looked up or set.
+
+        Args:
+            memo: The objects already copied.
+
+        Returns:
+            The copy.
+        """
+        return self._copy(copy.deepcopy(self._values, memo))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the object as a dictionary, as the document can't be pickled.
+
+        Mocks run in processes of their own and send their results back
+        pickled, so they can return (parts of) a lazily parsed input.
+
+        Returns:
+            How to rebuild the object as a dictionary.
+        """
+        return (dict, (list(self.items()),))
+
+    def __json__(self) -> Dict[str, Any]:
+        """Load the object whole, such as to serialize it.
+
+        Returns:
+            The object as a dictionary.
+        """
+        return dict(self)
+
+    def close(self) -> None:
+        """Close the document if it was opened from a path or copied."""
+        self._document.close()
+
+    def _copy(self, values: Dict[str, Any]) -> LazyJSONObject:
+        """Copy the object with some values.
+
+        Args:
+            values: The values of the copy.
+
+        Returns:
+            The copy.
+        """
+        copied = self.__class__(self._document, self._offset)
+        with self._document.lock:
+            copied._offsets = dict(self._offsets)
+            copied._resume_offset = self._resume_offset
+            copied._skip_value = self._skip_value
+        copied._values = values
+        copied._deleted = set(self._deleted)
+        return copied
+
+    def _scan(self, until: Optional[str] = None) -> None:
+        """Scan the keys of the object, recording the offsets of their values.
+
+        Args:
+            until: If set, stop scanning once this key is found, before
+                skipping its value.
+        """
+        if self._resume_offset is None:
+            return
+        scanner = _Scanner(self._document, self._resume_offset)
+        if self._skip_value:
+            scanner.skip()
+            closed = scanner.expect(b",}") == b"}"
+        else:
+            scanner.expect(b"{")
+            closed = scanner.peek() == b"}"
+        while not closed:
+            if scanner.peek() != b'"':
+                raise AWSStepFuncsValueError(
+                    f"Expected a key at byte {scanner.offset} of the JSON document"
+                )
+            key = scanner.parse()
+            scanner.expect(b":")
+            scanner.peek()
+            self._offsets.setdefault(key, scanner.offset)
+            if key == until:
+                self._resume_offset = scanner.offset
+                self._skip_value = True
+                return
+            scanner.skip()
+            closed = scanner.expect(b",}") == b"}"
+        self._resume_offset = None
+
+
+class LazyJSONArray(Iterable):
+    """A JSON array whose elements are parsed one at a time while iterating."""
+
+    __slots__ = ("_document", "_offset")
+
+    def __init__(self, document: _JSONFile, offset: int):
+        """Initialize a lazy JSON array.
+
+        Args:
+            document: The document the array is in.
+            offset: The offset of the array in the document.
+        """
+        self._document = document
+        self._offset = offset
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the elements, parsing each as it's reached.
+
+        Yields:
+            Each element of the array, parsed whole.
+        """
+        scanner = _Scanner(self._document, self._offset)
+        scanner.expect(b"[")
+        if scanner.peek() == b"]":
+            return
+        while True:
+            yield scanner.parse()
+            if scanner.expect(b",]") == b"]":
+                return
+
+    def __eq__(self, other: Any) -> bool:
+        """Compare the elements with those of a list or array, one at a time.
+
+        Args:
+            other: The object to compare with.
+
+        Returns:
+            Whether the arrays have equal elements.
+        """
+        if not isinstance(other, (list, LazyJSONArray)):
+            return NotImplemented
+        missing = object()
+        return all(
+            element == other_element
+            for element, other_element in itertools.zip_longest(
+                self, other, fillvalue=missing
+            )
+        )
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        """Return a representation which doesn't parse the array.
+
+        Returns:
+            The representation.
+        """
+        return f"<{self.__class__.__name__} at byte {self._offset}>"
+
+    def __copy__(self) -> LazyJSONArray:
+        """Return the array itself, which can't be changed.
+
+        Returns:
+            The array.
+        """
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> LazyJSONArray:
+        """Return the array itself, which can't be changed.
+
+        Args:
+            memo: The objects already copied.
+
+        Returns:
+            The array.
+        """
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the array as a list, as the document can't be pickled.
+
+        Returns:
+            How to rebuild the array as a list.
+        """
+        return (list, (list(self),))
+
+    def __json__(self) -> List[Any]:
+        """Load the array whole, such as to serialize it.
+
+        Returns:
+            The array as a list.
+        """
+        return list(self)
+
+    def close(self) -> None:
+        """Close the document if it was opened from a path or copied."""
+        self._document.close()
+
+
+class _JSONFile:
+    """A JSON document read from many offsets, by many threads."""
+
+    __slots__ = ("_file", "_close", "chunk_size", "lock", "__weakref__")
+
+    def __init__(self, source: Union[str, Path, IO[bytes]], chunk_size: int):
+        """Open a JSON document.
+
+        Args:
+            source: The path of the document, or a binary file to read it from.
+            chunk_size: How many bytes to read at a time.
+        """
+        self._close: Optional[weakref.finalize] = None
+        if isinstance(source, (str, Path)):
+            self._file: IO[bytes] = open(source, "rb")  # noqa: SIM115
+        elif source.seekable():
+            self._file = source
+        else:
+            self._file = tempfile.TemporaryFile(prefix="awsstepfuncs-input-")
+            shutil.copyfileobj(source, self._file)
+        if self._file is not source:
+            # Lazy values may outlive the simulation, so the file is closed
+            # when none are left
+            self._close = weakref.finalize(self, self._file.close)
+        self.chunk_size = chunk_size
+        self.lock = threading.RLock()
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read bytes of the document.
+
+        Args:
+            offset: The offset to read from.
+            size: How many bytes to read at most.
+
+        Returns:
+            The bytes read, which are empty at the end of the document.
+        """
+        with self.lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def close(self) -> None:
+        """Close the file if it was opened from a path or copied."""
+        if self._close is not None:
+            self._close()
+
+
+class _Scanner:
+    """Read the values of a JSON document sequentially from an offset.
+
+    Values are scanned for their end without being parsed, and only the bytes
+    of the value being parsed are buffered.
+    """
+
+    __slots__ = ("_document", "_buffer", "_start", "_position")
+
+    def __init__(self, document: _JSONFile, offset: int):
+        """Initialize a scanner.
+
+        Args:
+            document: The document to scan.
+            offset: The offset to start scanning from.
+        """
+        self._document = document
+        self._buffer = b""
+        # The offset of the first byte of the buffer in the document
+        self._start = offset
+        self._position = 0
+
+    @property
+    def offset(self) -> int:
+        """The offset of the scanner in the document."""
+        return self._start + self._position
+
+    def peek(self) -> bytes:
+        """Skip whitespace and return the next byte.
+
+        Returns:
+            The next byte, or nothing at the end of the document.
+        """
+        while True:
+            self._position = _WHITESPACE.match(  # type: ignore
+                self._buffer, self._position
+            ).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position : self._position + 1]
+            if not self._read_more(self._position):
+                return b""
+
+    def expect(self, characters: bytes) -> bytes:
+        """Read the next byte, which must be one of some characters.
+
+        Args:
+            characters: The characters expected.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the next byte is unexpected.
+
+        Returns:
+            The byte read.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            expected = " or ".join(chr(character) for character in characters)
+            raise AWSStepFuncsValueError(
+                f"Expected {expected} at byte {self.offset} of the JSON document"
+            )
+        self._position += 1
+        return character
+
+    def skip(self) -> None:
+        """Skip the next value without parsing it."""
+        self._scan_value(keep=False)
+
+    def parse(self) -> Any:
+        """Parse the next value whole.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the value isn't valid JSON.
+
+        Returns:
+            The parsed value.
+        """
+        self.peek()
+        start = self.offset
+        self._scan_value(keep=True)
+        value = self._buffer[start - self._start : self._position]
+        try:
+            return get_json_backend().loads(value)
+        except ValueError as exc:
+            raise AWSStepFuncsValueError(
+                f"Invalid JSON at byte {start} of the JSON document: {exc}"
+            ) from None
+
+    def _scan_value(self, *, keep: bool) -> None:
+        """Move past the next value.
+
+        Args:
+            keep: Whether to keep the value in the buffer.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the document ends first.
+        """
+        first = self.peek()
+        start = self.offset
+        if not first:
+            raise AWSStepFuncsValueError("Unexpected end of the JSON document")
+        if first == b'"':
+            self._position += 1
+            self._skip_string(start if keep else None)
+        elif first in b"[{":
+            self._position += 1
+            depth = 1
+            while depth:
+                match = self._search(_CONTAINER_SPECIAL, start if keep else None)
+                if match is None:
+                    raise AWSStepFuncsValueError("Unexpected end of the JSON document")
+                self._position = match.end()
+                character = match.group()
+                if character == b'"':
+                    self._skip_string(start if keep else None)
+                elif character in b"[{":
+                    depth += 1
+                else:
+                    depth -= 1
+        else:
+            match = self._search(_SCALAR_END, start if keep else None)
+            self._position = len(self._buffer) if match is None else match.start()
+
+    def _skip_string(self, keep_from: Optional[int]) -> None:
+        """Move past the end of a string, after its opening quote.
+
+        Args:
+            keep_from: If set, the offset from which to keep the buffer.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the string isn't terminated.
+        """
+        while True:
+            match = self._search(_STRING_SPECIAL, keep_from)
+            if match is None:
+                raise AWSStepFuncsValueError("Unterminated string in the JSON document")
+            # Also skip the character a backslash escapes
+            self._position = match.end() + (match.group() == b"\\")
+            if match.group() == b'"':
+                return
+
+    def _search(
+        self, pattern: Pattern[bytes], keep_from: Optional[int]
+    ) -> Optional[re.Match]:
+        """Search for a pattern from the position, reading more as needed.
+
+        Args:
+            pattern: The pattern to search for.
+            keep_from: If set, the offset from which to keep the buffer.
+
+        Returns:
+            The match, or None if the document ends first.
+        """
+        while True:
+            if (match := pattern.search(self._buffer, self._position)) is not None:
+                return match
+            self._position = max(self._position, len(self._buffer))
+            keep_index = (
+                self._position if keep_from is None else keep_from - self._start
+            )
+            if not self._read_more(keep_index):
+                return None
+
+    def _read_more(self, keep_index: int) -> bool:
+        """Read the next chunk into the buffer.
+
+        Args:
+            keep_index: The index from which to keep the buffer.
+
+        Returns:
+            Whether anything was read.
+        """
+        keep_index = min(keep_index, len(self._buffer))
+        # Reading as much as is kept makes buffering a large value linear
+        chunk = self._document.read_at(
+            self._start + len(self._buffer),
+            max(self._document.chunk_size, len(self._buffer) - keep_index),
+        )
+        self._buffer = self._buffer[keep_index:] + chunk
+        self._start += keep_index
+        self._position -= keep_index
+        return bool(chunk)
+
+
+def _load(document: _JSONFile, offset: int) -> Any:
+    """Load the value at an offset of a document.
+
+    Args:
+        document: The document.
+        offset: The offset of the value.
+
+    Returns:
+        A lazy object or array, or else the parsed value.
+    """
+    scanner = _Scanner(document, offset)
+    first = scanner.peek()
+    if first == b"{":
+        return LazyJSONObject(document, scanner.offset)
+    if first == b"[":
+        return LazyJSONArray(document, scanner.offset)
+    return scanner.parse()
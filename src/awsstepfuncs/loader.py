@@ -0,0 +1,475 @@
+"""Load state machines from Amazon States Language.
+
+Definitions are parsed in a single pass over their states, collecting the
+transitions of each state, which are then resolved through a table of the
+states by name. Nested state machines, such as Map State iterators, are only
+loaded the first time they are needed.
+
+>>> state_machine = load_state_machine(
+...     {
+...         "StartAt": "Greet",
+...         "States": {
+...             "Greet": {"Type": "Pass", "Result": "Hello", "Next": "Done"},
+...             "Done": {"Type": "Succeed"},
+...         },
+...     }
+... )
+>>> state_machine.start_state
+PassState(name='Greet', next_state='Done')
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Tuple, Type, Union
+
+from awsstepfuncs.abstract_state import AbstractRetryCatchState, AbstractState
+from awsstepfuncs.choice import (
+    AbstractChoice,
+    AndChoice,
+    ChoiceRule,
+    DataTestExpressionType,
+    NotChoice,
+    VariableChoice,
+)
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.item_batcher import ItemBatcher
+from awsstepfuncs.s3 import ItemReader, ResultWriter
+from awsstepfuncs.serialization import get_json_backend
+from awsstepfuncs.state import (
+    ChoiceState,
+    FailState,
+    MapState,
+    PassState,
+    SucceedState,
+    TaskState,
+    WaitState,
+)
+from awsstepfuncs.state_machine import StateMachine
+
+# Fields that are passed as is to the state constructors
+FIELD_TO_KWARG = {
+    "Comment": "comment",
+    "InputPath": "input_path",
+    "OutputPath": "output_path",
+    "ResultPath": "result_path",
+    "Parameters": "parameters",
+    "ResultSelector": "result_selector",
+    "Result": "result",
+    "Resource": "resource",
+    "TimeoutSeconds": "timeout_seconds",
+    "Seconds": "seconds",
+    "SecondsPath": "seconds_path",
+    "TimestampPath": "timestamp_path",
+    "Error": "error",
+    "Cause": "cause",
+    "ItemsPath": "items_path",
+    "MaxConcurrency": "max_concurrency",
+}
+
+STATE_MACHINE_FIELDS = frozenset({"StartAt", "States", "Comment", "Version"})
+RETRIER_FIELDS = frozenset(
+    {"ErrorEquals", "IntervalSeconds", "BackoffRate", "MaxAttempts"}
+)
+CATCHER_FIELDS = frozenset({"ErrorEquals", "Next"})
+ITEM_READER_FIELDS = frozenset({"Resource", "ReaderConfig", "Parameters"})
+READER_CONFIG_FIELDS = frozenset(
+    {"InputType", "CSVHeaderLocation", "CSVHeaders", "MaxItems"}
+)
+ITEM_BATCHER_FIELDS = frozenset(
+    {"MaxItemsPerBatch", "MaxInputBytesPerBatch", "BatchInput"}
+)
+RESULT_WRITER_FIELDS = frozenset({"Resource", "WriterConfig", "Parameters"})
+WRITER_CONFIG_FIELDS = frozenset({"OutputType"})
+
+_COMMON_FIELDS = {"Type", "Comment"}
+_INPUT_OUTPUT_FIELDS = {"InputPath", "OutputPath"}
+_NEXT_OR_END_FIELDS = {"Next", "End"}
+_RESULT_FIELDS = {"ResultPath", "Parameters"}
+_RETRY_CATCH_FIELDS = {"ResultSelector", "Retry", "Catch"}
+
+STATE_TYPES: Dict[str, Tuple[Type[AbstractState], frozenset]] = {
+    "Pass": (
+        PassState,
+        frozenset(
+            _COMMON_FIELDS
+            | _INPUT_OUTPUT_FIELDS
+            | _NEXT_OR_END_FIELDS
+            | _RESULT_FIELDS
+            | {"Result"}
+        ),
+    ),
+    "Task": (
+        TaskState,
+        frozenset(
+            _COMMON_FIELDS
+            | _INPUT_OUTPUT_FIELDS
+            | _NEXT_OR_END_FIELDS
+            | _RESULT_FIELDS
+            | _RETRY_CATCH_FIELDS
+            | {"Resource", "TimeoutSeconds"}
+        ),
+    ),
+    "Map": (
+        MapState,
+        frozenset(
+            _COMMON_FIELDS
+            | _INPUT_OUTPUT_FIELDS
+            | _NEXT_OR_END_FIELDS
+            | _RESULT_FIELDS
+            | _RETRY_CATCH_FIELDS
+            | {
+                "Iterator",
+                "ItemProcessor",
+                "ItemsPath",
+                "MaxConcurrency",
+                "ItemReader",
+                "ItemBatcher",
+                "ResultWriter",
+            }
+        ),
+    ),
+    "Choice": (
+        ChoiceState,
+        frozenset(_COMMON_FIELDS | _INPUT_OUTPUT_FIELDS | {"Choices", "Default"}),
+    ),
+    "Wait": (
+        WaitState,
+        frozenset(
+            _COMMON_FIELDS
+            | _INPUT_OUTPUT_FIELDS
+            | _NEXT_OR_END_FIELDS
+            | {"Seconds", "Timestamp", "SecondsPath", "TimestampPath"}
+        ),
+    ),
+    "Succeed": (SucceedState, frozenset(_COMMON_FIELDS | _INPUT_OUTPUT_FIELDS)),
+    "Fail": (FailState, frozenset(_COMMON_FIELDS | {"Error", "Cause"})),
+}
+
+# Data-test expression operators, such as NumericLessThanPath, to their types
+OPERATOR_TO_TYPE = {
+    "".join(word.capitalize() for word in expression_type.value.split("_")): (
+        expression_type.value
+    )
+    for expression_type in DataTestExpressionType
+}
+
+_Resolve = Callable[[str], AbstractState]
+
+
+def load_state_machine(definition: Dict[str, Any]) -> StateMachine:
+    """Load a state machine from its Amazon States Language definition.
+
+    Args:
+        definition: The parsed definition.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the definition is invalid or uses
+            fields that aren't supported.
+
+    Returns:
+        The state machine.
+    """
+    _check_fields(definition, STATE_MACHINE_FIELDS, None)
+    try:
+        state_definitions: Dict[str, Dict[str, Any]] = definition["States"]
+        start_at = definition["StartAt"]
+    except KeyError as exc:
+        raise AWSStepFuncsValueError(
+            f"State machine definitions must have {exc.args[0]}"
+        ) from None
+
+    states: Dict[str, AbstractState] = {}
+    transitions: List[Tuple[AbstractState, Dict[str, Any]]] = []
+    for name, state_definition in state_definitions.items():
+        states[name] = _load_state(name, state_definition)
+        transitions.append((states[name], state_definition))
+
+    def resolve(name: str) -> AbstractState:
+        try:
+            return states[name]
+        except KeyError:
+            raise AWSStepFuncsValueError(
+                f'Transition to unknown state "{name}"'
+            ) from None
+
+    for state, state_definition in transitions:
+        _load_transitions(state, state_definition, resolve)
+
+    return StateMachine(
+        start_state=resolve(start_at),
+        comment=definition.get("Comment"),
+        version=definition.get("Version"),
+    )
+
+
+def load_state_machine_json(source: Union[str, Path, IO]) -> StateMachine:
+    """Load a state machine from an Amazon States Language JSON file.
+
+    Args:
+        source: The path of the file, or a text or binary file object.
+
+    Returns:
+        The state machine.
+    """
+    if isinstance(source, (str, Path)):
+        document = Path(source).read_bytes()
+    else:
+        document = source.read()
+    return load_state_machine(get_json_backend().loads(document))
+
+
+def _check_fields(
+    definition: Dict[str, Any], supported_fields: frozenset, state_name: Any
+) -> None:
+    """Check that a definition only has supported fields.
+
+    Args:
+        definition: The definition of a state or state machine.
+        supported_fields: The fields that are supported.
+        state_name: The name of the state, or None for a state machine.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when a field isn't supported.
+    """
+    if unsupported_fields := definition.keys() - supported_fields:
+        where = "state machine" if state_name is None else f'state "{state_name}"'
+        raise AWSStepFuncsValueError(
+            f'Unsupported field "{sorted(unsupported_fields)[0]}" in {where}'
+        )
+
+
+def _required_field(definition: Dict[str, Any], field: str, where: str) -> Any:
+    """Return a field that a definition must have.
+
+    Args:
+        definition: The definition of a state, or of a part of a state.
+        field: The name of the field.
+        where: What the definition is, for error messages.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the field is missing.
+
+    Returns:
+        The value of the field.
+    """
+    try:
+        return definition[field]
+    except KeyError:
+        raise AWSStepFuncsValueError(f'Missing field "{field}" in {where}') from None
+
+
+def _load_state(name: str, state_definition: Dict[str, Any]) -> AbstractState:
+    """Load a state without its transitions.
+
+    Args:
+        name: The name of the state.
+        state_definition: The definition of the state.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the state type isn't supported.
+
+    Returns:
+        The state.
+    """
+    state_type = state_definition.get("Type")
+    if state_type not in STATE_TYPES:
+        raise AWSStepFuncsValueError(
+            f'Unsupported type "{state_type}" of state "{name}"'
+        )
+    state_class, supported_fields = STATE_TYPES[state_type]
+    _check_fields(state_definition, supported_fields, name)
+
+    kwargs = {
+        FIELD_TO_KWARG[field]: value
+        for field, value in state_definition.items()
+        if field in FIELD_TO_KWARG
+    }
+    if (timestamp := state_definition.get("Timestamp")) is not None:
+        kwargs["timestamp"] = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if state_class is MapState:
+        iterator_definition = state_definition.get(
+            "Iterator", state_definition.get("ItemProcessor")
+        )
+        if iterator_definition is None:
+            raise AWSStepFuncsValueError(f'Map State "{name}" must have an Iterator')
+        iterator_definition = {
+            field: value
+            for field, value in iterator_definition.items()
+            if field != "ProcessorConfig"
+        }
+        kwargs["iterator"] = lambda: load_state_machine(iterator_definition)
+        kwargs.setdefault("max_concurrency", 0)
+        if (item_reader := state_definition.get("ItemReader")) is not None:
+            kwargs["item_reader"] = _load_item_reader(item_reader, name)
+        if (item_batcher := state_definition.get("ItemBatcher")) is not None:
+            kwargs["item_batcher"] = _load_item_batcher(item_batcher, name)
+        if (result_writer := state_definition.get("ResultWriter")) is not None:
+            kwargs["result_writer"] = _load_result_writer(result_writer, name)
+    if state_class is ChoiceState:
+        kwargs["choices"] = []
+    return state_class(name, **kwargs)
+
+
+def _load_item_reader(definition: Dict[str, Any], name: str) -> ItemReader:
+    """Load the ItemReader of a Map State.
+
+    Args:
+        definition: The definition of the ItemReader.
+        name: The name of the Map State, for error messages.
+
+    Returns:
+        The item reader.
+    """
+    _check_fields(definition, ITEM_READER_FIELDS, name)
+    reader_config = definition.get("ReaderConfig", {})
+    _check_fields(reader_config, READER_CONFIG_FIELDS, name)
+    return ItemReader(
+        parameters=definition.get("Parameters", {}),
+        resource=definition.get("Resource", ""),
+        input_type=reader_config.get("InputType"),
+        csv_header_location=reader_config.get("CSVHeaderLocation"),
+        csv_headers=reader_config.get("CSVHeaders"),
+        max_items=reader_config.get("MaxItems"),
+    )
+
+
+def _load_item_batcher(definition: Dict[str, Any], name: str) -> ItemBatcher:
+    """Load the ItemBatcher of a Map State.
+
+    Args:
+        definition: The definition of the ItemBatcher.
+        name: The name of the Map State, for error messages.
+
+    Returns:
+        The item batcher.
+    """
+    _check_fields(definition, ITEM_BATCHER_FIELDS, name)
+    return ItemBatcher(
+        max_items_per_batch=definition.get("MaxItemsPerBatch"),
+        max_input_bytes_per_batch=definition.get("MaxInputBytesPerBatch"),
+        batch_input=definition.get("BatchInput"),
+    )
+
+
+def _load_result_writer(definition: Dict[str, Any], name: str) -> ResultWriter:
+    """Load the ResultWriter of a Map State.
+
+    Args:
+        definition: The definition of the ResultWriter.
+        name: The name of the Map State, for error messages.
+
+    Returns:
+        The result writer.
+    """
+    _check_fields(definition, RESULT_WRITER_FIELDS, name)
+    writer_config = definition.get("WriterConfig", {})
+    _check_fields(writer_config, WRITER_CONFIG_FIELDS, name)
+    return ResultWriter(
+        parameters=definition.get("Parameters", {}),
+        resource=definition.get("Resource", ""),
+        output_type=writer_config.get("OutputType"),
+    )
+
+
+def _load_transitions(
+    state: AbstractState, state_definition: Dict[str, Any], resolve: _Resolve
+) -> None:
+    """Set the transitions of a loaded state.
+
+    Args:
+        state: The state.
+        state_definition: The definition of the state.
+        resolve: Returns the state with a given name.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when a required field is missing.
+    """
+    where = f'state "{state.name}"'
+    if (next_state_name := state_definition.get("Next")) is not None:
+        state.next_state = resolve(next_state_name)
+    if isinstance(state, ChoiceState):
+        state.choices = [
+            _load_choice(choice_definition, resolve, f"a choice of {where}")
+            for choice_definition in _required_field(state_definition, "Choices", where)
+        ]
+        if (default := state_definition.get("Default")) is not None:
+            state.default = resolve(default)
+    if isinstance(state, AbstractRetryCatchState):
+        for retrier_definition in state_definition.get("Retry", []):
+            _check_fields(retrier_definition, RETRIER_FIELDS, state.name)
+            state.add_retrier(
+                _required_field(
+                    retrier_definition, "ErrorEquals", f"a Retrier of {where}"
+                ),
+                interval_seconds=retrier_definition.get("IntervalSeconds"),
+                backoff_rate=retrier_definition.get("BackoffRate"),
+                max_attempts=retrier_definition.get("MaxAttempts"),
+            )
+        for catcher_definition in state_definition.get("Catch", []):
+            _check_fields(catcher_definition, CATCHER_FIELDS, state.name)
+            state.add_catcher(
+                _required_field(
+                    catcher_definition, "ErrorEquals", f"a Catcher of {where}"
+                ),
+                next_state=resolve(
+                    _required_field(catcher_definition, "Next", f"a Catcher of {where}")
+                ),
+            )
+
+
+def _load_data_test_expression(rule_definition: Dict[str, Any]) -> Dict[str, Any]:
+    """Load the variable and data-test expression of a Choice Rule.
+
+    Args:
+        rule_definition: The definition of the Choice Rule.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the Choice Rule isn't supported.
+
+    Returns:
+        The keyword arguments to create the Choice Rule with.
+    """
+    kwargs = {}
+    for field, value in rule_definition.items():
+        if field == "Variable":
+            kwargs["variable"] = value
+        elif field != "Next":
+            if field not in OPERATOR_TO_TYPE:
+                raise AWSStepFuncsValueError(f'Unsupported Choice Rule "{field}"')
+            kwargs[OPERATOR_TO_TYPE[field]] = value
+    return kwargs
+
+
+def _load_choice(
+    choice_definition: Dict[str, Any], resolve: _Resolve, where: str
+) -> AbstractChoice:
+    """Load a choice of a Choice State.
+
+    Args:
+        choice_definition: The definition of the choice.
+        resolve: Returns the state with a given name.
+        where: Which choice of which state it is, for error messages.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the choice has no Next.
+
+    Returns:
+        The choice.
+    """
+    next_state = resolve(_required_field(choice_definition, "Next", where))
+    if (and_definition := choice_definition.get("And")) is not None:
+        return AndChoice(
+            [
+                ChoiceRule(**_load_data_test_expression(rule_definition))
+                for rule_definition in and_definition
+            ],
+            next_state=next_state,
+        )
+    if (not_definition := choice_definition.get("Not")) is not None:
+        return NotChoice(
+            **_load_data_test_expression(not_definition), next_state=next_state
+        )
+    return VariableChoice(
+        **_load_data_test_expression(choice_definition), next_state=next_state
+    )
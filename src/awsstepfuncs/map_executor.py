@@ -0,0 +1,601 @@
+"""Concurrent execution of the iterations of Map States.
+
+Map State iterations run on a pool of threads by default, which suits mocks
+that wait on I/O (each mock already runs in its own process). Set
+`backend="process"` on the Map State to run iterations on a pool of
+processes instead, for CPU-bound iterations; the iterator is then sent to
+each worker process with the options of its states that aren't part of its
+definition (such as the reducers of nested Map States), so those and mocks
+must be picklable on platforms that don't fork. Iterations are sent to worker
+processes in chunks of `chunk_size` items, so that cheap iterations aren't
+dominated by the cost of sending each one.
+
+Set `backend="auto"` to pick the backend by measurement: the first
+`AUTO_PROBE_ITERATIONS` iterations run on threads while the CPU time they spent
+simulating the state machine, holding the interpreter, is measured against the
+wall time they took together. Mocks run in processes of their own, so the CPU
+time spent starting them and waiting on them is left out. When the threads
+kept the interpreter busy for at least `AUTO_CPU_BOUND_RATIO` of that time, the
+iterations are limited by the GIL and the remaining ones run on processes, in
+chunks sized from the CPU time of an iteration; otherwise they keep running on
+threads. The decision and the measurements are recorded in the metrics of the
+simulation as a `MapBackendDecision`, so that the backend and chunk size can
+then be pinned.
+
+At most `max_concurrency` iterations run at a time; 0 (no limit) runs up to
+`MAX_INLINE_CONCURRENCY` iterations at a time on threads, which is also the
+limit of inline Map States in AWS Step Functions, or one iteration per CPU on
+processes. Outputs are returned in the order of the items whatever order the
+iterations finish in, and only a bounded window of iterations is submitted
+ahead of the oldest unfinished one, so items can come from any iterable,
+such as a generator, and are only pulled from it as the window moves on.
+Memory use is then proportional to the concurrency rather than to the number
+of items, as long as the outputs are consumed as they come (see
+`StreamedOutput`).
+
+Iterations run one after another when recording, replaying, tracing,
+profiling, or returning the execution history of a simulation, as those
+describe a single ordered timeline.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import islice
+from time import perf_counter_ns, thread_time_ns
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from awsstepfuncs.errors import FailStateError, StateSimulationError
+from awsstepfuncs.metrics import MapBackendDecision, SimulationMetrics
+from awsstepfuncs.printer import Printer
+from awsstepfuncs.state_machine import StateMachine
+from awsstepfuncs.types import ResourceToMockFn
+
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.s3 import LocalS3
+    from awsstepfuncs.state import MapState
+
+MAP_BACKENDS = ("thread", "process", "auto")
+
+MAX_INLINE_CONCURRENCY = 40
+
+# How many iterations are submitted per worker ahead of the oldest unfinished
+# iteration, so that workers stay busy while it finishes
+WINDOW_PER_WORKER = 2
+
+# How many iterations the "auto" backend measures on threads before picking a
+# backend for the others
+AUTO_PROBE_ITERATIONS = 16
+
+# The share of the wall time of the measured iterations they must have spent
+# holding the interpreter for the "auto" backend to switch to processes
+AUTO_CPU_BOUND_RATIO = 0.5
+
+# How much CPU time in nanoseconds a chunk of iterations sent to a worker
+# process should take, and how many iterations a chunk holds at most
+AUTO_CHUNK_CPU_TIME = 5_000_000
+AUTO_MAX_CHUNK_SIZE = 64
+
+# The CPU time each thread spent starting mocks and waiting on them, in
+# nanoseconds, which the "auto" backend leaves out of the CPU time of
+# iterations since it isn't spent simulating the state machine
+_mock_cpu_times = threading.local()
+
+# The output of an iteration and how long it took in nanoseconds
+IterationResult = Tuple[Any, int]
+
+
+def iteration_concurrency(
+    map_state: MapState, n_items: Optional[int], backend: Optional[str] = None
+) -> int:
+    """Return how many iterations of a Map State can run at a time.
+
+    Args:
+        map_state: The Map State.
+        n_items: The number of items to iterate over, if known.
+        backend: The backend to run the iterations on, if not the backend of
+            the Map State ("auto" starts on threads).
+
+    Returns:
+        The number of iterations to run at a time, at least 1.
+    """
+    if (
+        map_state.recorder
+        or map_state.history is not None
+        or map_state.trace is not None
+        or map_state.profiler is not None
+    ):
+        return 1
+    backend = backend or map_state.backend
+    limit = map_state.max_concurrency or (
+        os.cpu_count() or 1 if backend == "process" else MAX_INLINE_CONCURRENCY
+    )
+    if n_items is not None:
+        limit = min(limit, n_items)
+    return max(1, limit)
+
+
+def record_mock_cpu_time(cpu_time: int) -> None:
+    """Record the CPU time the current thread spent on a mock call.
+
+    Args:
+        cpu_time: The CPU time in nanoseconds.
+    """
+    _mock_cpu_times.total = _mock_cpu_time() + cpu_time
+
+
+def _mock_cpu_time() -> int:
+    """Return the CPU time the current thread spent on mock calls so far.
+
+    Returns:
+        The CPU time in nanoseconds.
+    """
+    return getattr(_mock_cpu_times, "total", 0)
+
+
+def run_iterations(
+    map_state: MapState,
+    iterator: StateMachine,
+    items: Iterable[Any],
+    n_items: Optional[int],
+    resource_to_mock_fn: ResourceToMockFn,
+) -> Iterator[IterationResult]:
+    """Run the iterator of a Map State for each item.
+
+    The output printed by concurrent iterations is captured and printed in the
+    order of the items, so it reads the same as if they ran one by one.
+
+    Args:
+        map_state: The Map State.
+        iterator: The iterator of the Map State, ready to run.
+        items: The items to iterate over.
+        n_items: The number of items, if known.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+
+    Raises:
+        StateSimulationError: Raised with the error of the first iteration, in
+            the order of the items, that failed.
+
+    Yields:
+        The output of each iteration and how long it took, in the order of
+        the items.
+    """
+    concurrency = iteration_concurrency(map_state, n_items)
+    if concurrency == 1:
+        for item in items:
+            start = perf_counter_ns()
+            output = iterator._run(
+                item, resource_to_mock_fn=resource_to_mock_fn, raise_error=True
+            )
+            yield output, perf_counter_ns() - start
+    elif map_state.backend == "thread":
+        yield from _run_on_threads(
+            map_state, iterator, items, concurrency, resource_to_mock_fn
+        )
+    elif map_state.backend == "process":
+        yield from _run_on_processes(
+            map_state,
+            iterator,
+            items,
+            concurrency,
+            resource_to_mock_fn,
+            map_state.chunk_size,
+        )
+    else:
+        yield from _run_adaptively(
+            map_state, iterator, items, n_items, concurrency, resource_to_mock_fn
+        )
+
+
+def _run_on_threads(
+    map_state: MapState,
+    iterator: StateMachine,
+    items: Iterable[Any],
+    concurrency: int,
+    resource_to_mock_fn: ResourceToMockFn,
+    cpu_times: Optional[List[int]] = None,
+) -> Iterator[IterationResult]:
+    """Run iterations on a pool of threads.
+
+    Args:
+        map_state: The Map State.
+        iterator: The iterator of the Map State, ready to run.
+        items: The items to iterate over.
+        concurrency: How many iterations to run at a time.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+        cpu_times: If set, a list to append the CPU time of each iteration to,
+            in nanoseconds, without the CPU time of its mock calls.
+
+    Raises:
+        StateSimulationError: Raised with the error of the first iteration, in
+            the order of the items, that failed.
+
+    Yields:
+        The output of each iteration and how long it took, in order.
+    """
+
+    def run(
+        item: Any,
+    ) -> Tuple[Any, int, List[str], Optional[StateSimulationError], int]:
+        start, mock_start = thread_time_ns(), _mock_cpu_time()
+        result = _run_captured_iteration(iterator, resource_to_mock_fn, item)
+        mock_cpu_time = _mock_cpu_time() - mock_start
+        return (*result, thread_time_ns() - start - mock_cpu_time)
+
+    for output, duration, lines, error, cpu_time in _map_in_order(
+        ThreadPoolExecutor(max_workers=concurrency),
+        run,
+        items,
+        concurrency * WINDOW_PER_WORKER,
+    ):
+        map_state.print.write_lines(lines)
+        if cpu_times is not None:
+            cpu_times.append(cpu_time)
+        if error is not None:
+            raise error
+        yield output, duration
+
+
+def _run_on_processes(
+    map_state: MapState,
+    iterator: StateMachine,
+    items: Iterable[Any],
+    concurrency: int,
+    resource_to_mock_fn: ResourceToMockFn,
+    chunk_size: int,
+) -> Iterator[IterationResult]:
+    """Run iterations on a pool of processes, sent to them in chunks.
+
+    Args:
+        map_state: The Map State.
+        iterator: The iterator of the Map State, ready to run.
+        items: The items to iterate over.
+        concurrency: How many worker processes to run iterations on.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+        chunk_size: How many iterations to send to a worker process at a time.
+
+    Raises:
+        StateSimulationError: Raised with the error of the first iteration, in
+            the order of the items, that failed.
+
+    Yields:
+        The output of each iteration and how long it took, in order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(
+        max_workers=concurrency,
+        initializer=_init_process_worker,
+        initargs=(
+            iterator,
+            resource_to_mock_fn,
+            _printer_settings(map_state.print),
+            map_state.metrics is not None,
+            map_state.s3,
+        ),
+    )
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    for results in _map_in_order(
+        executor, _run_process_chunk, chunks, concurrency * WINDOW_PER_WORKER
+    ):
+        for output, duration, lines, packed_error, metrics in results:
+            if metrics is not None:
+                map_state.metrics.merge(metrics)  # type: ignore
+            map_state.print.write_lines(lines)
+            if packed_error is not None:
+                raise _unpack_error(*packed_error)
+            yield output, duration
+
+
+def _run_adaptively(
+    map_state: MapState,
+    iterator: StateMachine,
+    items: Iterable[Any],
+    n_items: Optional[int],
+    concurrency: int,
+    resource_to_mock_fn: ResourceToMockFn,
+) -> Iterator[IterationResult]:
+    """Measure the first iterations on threads, then pick a backend for the rest.
+
+    Args:
+        map_state: The Map State.
+        iterator: The iterator of the Map State, ready to run.
+        items: The items to iterate over.
+        n_items: The number of items, if known.
+        concurrency: How many iterations to run at a time on threads.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+
+    Yields:
+        The output of each iteration and how long it took, in order.
+    """
+    items = iter(items)
+    cpu_times: List[int] = []
+    start = perf_counter_ns()
+    # The outputs are only yielded once measured, so that the time spent
+    # consuming them isn't measured as well
+    probe_results = list(
+        _run_on_threads(
+            map_state,
+            iterator,
+            islice(items, AUTO_PROBE_ITERATIONS),
+            concurrency,
+            resource_to_mock_fn,
+            cpu_times,
+        )
+    )
+    decision = _decide_backend(
+        len(cpu_times), perf_counter_ns() - start, sum(cpu_times)
+    )
+    if map_state.metrics is not None:
+        map_state.metrics.record_backend(map_state.name, decision)
+    yield from probe_results
+
+    if decision.backend == "thread":
+        yield from _run_on_threads(
+            map_state, iterator, items, concurrency, resource_to_mock_fn
+        )
+    else:
+        yield from _run_on_processes(
+            map_state,
+            iterator,
+            items,
+            iteration_concurrency(
+                map_state,
+                None if n_items is None else n_items - len(cpu_times),
+                "process",
+            ),
+            resource_to_mock_fn,
+            decision.chunk_size,
+        )
+
+
+def _decide_backend(
+    probe_iterations: int, wall_time: int, cpu_time: int
+) -> MapBackendDecision:
+    """Pick the backend of the remaining iterations from the measured ones.
+
+    >>> decision = _decide_backend(16, 100_000_000, 1_600_000)
+    >>> decision.backend, decision.cpu_ratio
+    ('thread', 0.016)
+
+    Args:
+        probe_iterations: How many iterations were measured on threads.
+        wall_time: How long they took together, in nanoseconds.
+        cpu_time: How much CPU time they spent simulating the state machine,
+            in nanoseconds.
+
+    Returns:
+        The decision.
+    """
+    cpu_bound = (
+        probe_iterations == AUTO_PROBE_ITERATIONS
+        and (os.cpu_count() or 1) > 1
+        and cpu_time >= AUTO_CPU_BOUND_RATIO * wall_time
+    )
+    chunk_size = 1
+    if cpu_bound:
+        cpu_time_per_iteration = max(cpu_time // probe_iterations, 1)
+        chunk_size = max(
+            1, min(AUTO_CHUNK_CPU_TIME // cpu_time_per_iteration, AUTO_MAX_CHUNK_SIZE)
+        )
+    return MapBackendDecision(
+        "process" if cpu_bound else "thread",
+        probe_iterations,
+        wall_time,
+        cpu_time,
+        chunk_size,
+    )
+
+
+class StreamedOutput:
+    """The output of a Map State whose iterations run as it is iterated over.
+
+    Iterations are only run as the outputs are consumed, in the order of the
+    items, so the whole output never needs to be held in memory. It can be
+    iterated over once only, for example by the Map State after it. Execution
+    histories, recordings, and traces snapshot it as "<StreamedOutput>"
+    without consuming it.
+
+    >>> output = StreamedOutput(iter([1, 2]))
+    >>> output
+    <StreamedOutput>
+    >>> list(output), list(output)
+    ([1, 2], [])
+    """
+
+    __slots__ = ("_outputs",)
+
+    def __init__(self, outputs: Iterator[Any]):
+        """Initialize a streamed output.
+
+        Args:
+            outputs: The outputs of the iterations, run as they are consumed.
+        """
+        self._outputs = outputs
+
+    def __iter__(self) -> Iterator[Any]:
+        """Return the outputs of the iterations.
+
+        Returns:
+            The outputs not consumed yet.
+        """
+        return self._outputs
+
+    def __next__(self) -> Any:
+        """Run the next iteration.
+
+        Returns:
+            The output of the next iteration.
+        """
+        return next(self._outputs)
+
+    def __repr__(self) -> str:
+        """Return a representation which doesn't consume the outputs.
+
+        Returns:
+            The representation.
+        """
+        return f"<{self.__class__.__name__}>"
+
+
+def _run_captured_iteration(
+    iterator: StateMachine, resource_to_mock_fn: ResourceToMockFn, item: Any
+) -> Tuple[Any, int, List[str], Optional[StateSimulationError]]:
+    """Run one iteration, capturing what it prints.
+
+    Args:
+        iterator: The iterator of the Map State.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+        item: The item to run the iterator on.
+
+    Returns:
+        The output of the iteration, how long it took, the lines it printed,
+        and its error if it failed.
+    """
+    start = perf_counter_ns()
+    with iterator.print.capture() as lines:
+        try:
+            output = iterator._run(
+                item, resource_to_mock_fn=resource_to_mock_fn, raise_error=True
+            )
+        except StateSimulationError as exc:
+            return None, perf_counter_ns() - start, lines, exc
+    return output, perf_counter_ns() - start, lines, None
+
+
+def _map_in_order(
+    executor: Executor, fn: Callable[[Any], Any], items: Iterable[Any], window: int
+) -> Iterator[Any]:
+    """Run a function on each item on an executor, in order.
+
+    Args:
+        executor: The executor, which is shut down when done.
+        fn: The function to run.
+        items: The items to run the function on.
+        window: The maximum number of items submitted at a time.
+
+    Yields:
+        The result of each item, in the order of the items.
+    """
+    pending: Deque[Future] = deque()
+    try:
+        for item in items:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, item))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Shutting down with cancel_futures needs Python 3.9
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _printer_settings(printer: Printer) -> Tuple[bool, int, Optional[int]]:
+    """Return the settings to create the printer of a worker process with.
+
+    Args:
+        printer: The printer of the Map State.
+
+    Returns:
+        Whether to print colors, the verbosity, and the max payload length.
+    """
+    return printer.colorful, printer.verbosity, printer.max_payload_length
+
+
+# The iterator loaded by a worker process, its mocks, and whether to collect
+# metrics
+_worker_iterator: Optional[StateMachine] = None
+_worker_mocks: ResourceToMockFn = {}
+_worker_metrics = False
+
+
+def _init_process_worker(
+    iterator: StateMachine,
+    resource_to_mock_fn: ResourceToMockFn,
+    printer_settings: Tuple[bool, int, Optional[int]],
+    collect_metrics: bool,
+    s3: Optional[LocalS3],
+) -> None:
+    """Set up the iterator in a worker process.
+
+    Args:
+        iterator: The iterator, pickled along with the options of its states
+            that aren't part of its definition, such as reducers.
+        resource_to_mock_fn: A mapping of resource URIs to mock functions.
+        printer_settings: The settings of the printer of the Map State.
+        collect_metrics: Whether to collect metrics.
+        s3: The local S3 stand-in of the simulation, if any.
+    """
+    global _worker_iterator, _worker_metrics, _worker_mocks
+    colorful, verbosity, max_payload_length = printer_settings
+    _worker_iterator = iterator
+    _worker_iterator.print = Printer(
+        colorful,
+        verbosity=verbosity,  # type: ignore
+        max_payload_length=max_payload_length,
+    )
+    _worker_iterator.s3 = s3
+    _worker_mocks = resource_to_mock_fn
+    _worker_metrics = collect_metrics
+
+
+def _run_process_chunk(
+    items: List[Any],
+) -> List[
+    Tuple[Any, int, List[str], Optional[Tuple[str, str]], Optional[SimulationMetrics]]
+]:
+    """Run a chunk of iterations in a worker process.
+
+    Errors are sent back as their error name and cause, since not all of them
+    can be pickled.
+
+    Args:
+        items: The items to run the iterator on.
+
+    Returns:
+        For each item, the output of the iteration, how long it took, the
+        lines it printed, its error name and cause if it failed, and its
+        metrics if they are collected.
+    """
+    iterator: StateMachine = _worker_iterator  # type: ignore
+    results = []
+    for item in items:
+        iterator.metrics = SimulationMetrics() if _worker_metrics else None
+        output, duration, lines, error = _run_captured_iteration(
+            iterator, _worker_mocks, item
+        )
+        packed_error = None
+        if error is not None:
+            packed_error = (error.error_string, getattr(error, "cause", str(error)))
+        results.append((output, duration, lines, packed_error, iterator.metrics))
+    return results
+
+
+def _unpack_error(error_string: str, cause: str) -> StateSimulationError:
+    """Rebuild the error of an iteration that failed in a worker process.
+
+    Args:
+        error_string: The error name, such as "States.TaskFailed".
+        cause: The cause of the error.
+
+    Returns:
+        The error.
+    """
+    if (error_class := StateSimulationError.from_string(error_string)) is None:
+        return FailStateError(error=error_string, cause=cause)
+    return error_class(cause)
@@ -0,0 +1,371 @@
+"""Per-state latency metrics of simulations.
+
+When simulating with `metrics=`, every phase of every state is timed with
+`time.perf_counter_ns()` and recorded in a `LatencyHistogram`:
+
+- InputPath
+- Execute (for a Task State, this is the mock call)
+- Iteration (for a Map State, each run of its iterator)
+- ResultSelector
+- ResultPath
+- OutputPath
+- Total (the whole state, including error handling)
+
+Map States with the "auto" backend also record which backend they picked and
+the measurements it was picked from, as a `MapBackendDecision`.
+
+The same `SimulationMetrics` can be passed to many simulations to aggregate a
+batch of executions. Nothing is timed when simulating without metrics.
+"""
+from __future__ import annotations
+
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_TRACKABLE_BITS = 40  # About 18 minutes in nanoseconds
+BUCKET_COUNT = (MAX_TRACKABLE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+
+PHASES = (
+    "InputPath",
+    "Execute",
+    "Iteration",
+    "ResultSelector",
+    "ResultPath",
+    "OutputPath",
+    "Total",
+)
+
+
+class LatencyHistogram:
+    """A histogram of durations in nanoseconds with fixed log-linear buckets.
+
+    Like an HDR histogram, every power of two is split into 16 linear buckets,
+    so any recorded value is known within about 6% while the histogram has a
+    fixed size whatever the range of values. Recording is a few integer
+    operations and an array increment.
+
+    >>> histogram = LatencyHistogram()
+    >>> for duration in [100, 200, 300, 1000]:
+    ...     histogram.record(duration)
+    >>> histogram.count, histogram.min, histogram.max, histogram.mean
+    (4, 100, 1000, 400.0)
+    >>> histogram.percentile(50)
+    207
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        """Return the index of the bucket of a value.
+
+        Args:
+            value: A non-negative duration in nanoseconds.
+
+        Returns:
+            The index of the bucket, clamped to the last bucket.
+        """
+        if value < 2 * SUB_BUCKET_COUNT:
+            return max(value, 0)
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        index = (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+        return min(index, BUCKET_COUNT - 1)
+
+    @staticmethod
+    def bucket_upper_bound(index: int) -> int:
+        """Return the highest value that falls in a bucket.
+
+        >>> LatencyHistogram.bucket_upper_bound(LatencyHistogram.bucket_index(1000))
+        1023
+
+        Args:
+            index: The index of the bucket.
+
+        Returns:
+            The highest value of the bucket in nanoseconds.
+        """
+        if index < 2 * SUB_BUCKET_COUNT:
+            return index
+        shift = index // SUB_BUCKET_COUNT - 1
+        sub_bucket = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        """Record a duration.
+
+        Args:
+            value: The duration in nanoseconds.
+        """
+        self.counts[self.bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """Add the recorded durations of another histogram to this one.
+
+        Args:
+            other: The histogram to merge.
+        """
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    @property
+    def mean(self) -> float:
+        """Return the mean duration in nanoseconds.
+
+        Returns:
+            The mean duration, or 0 if nothing was recorded.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> int:
+        """Return an upper bound on a percentile of the recorded durations.
+
+        Args:
+            percentile: The percentile, between 0 and 100.
+
+        Returns:
+            The highest value of the bucket the percentile falls in (capped by
+            the maximum recorded duration), or 0 if nothing was recorded.
+        """
+        if not self.count:
+            return 0
+        target = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                if index == BUCKET_COUNT - 1:  # Values too large are clamped
+                    return self.max  # type: ignore
+                return min(self.bucket_upper_bound(index), self.max)  # type: ignore
+        return self.max  # type: ignore  # pragma: no cover
+
+    def buckets(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the non-empty buckets.
+
+        Yields:
+            Tuples of the highest value of the bucket and its count.
+        """
+        for index, count in enumerate(self.counts):
+            if count:
+                yield self.bucket_upper_bound(index), count
+
+
+class MapBackendDecision(NamedTuple):
+    """The backend picked by a Map State with the "auto" backend, and why.
+
+    >>> decision = MapBackendDecision("process", 16, 40_000_000, 36_000_000, 8)
+    >>> decision.cpu_ratio
+    0.9
+    """
+
+    # The backend the remaining iterations ran on: "thread" or "process"
+    backend: str
+    # How many iterations were measured on threads
+    probe_iterations: int
+    # How long they took together, in nanoseconds
+    wall_time: int
+    # How much CPU time they spent simulating the state machine (holding the
+    # interpreter, unlike their mocks), in nanoseconds
+    cpu_time: int
+    # How many iterations were sent to a worker process at a time
+    chunk_size: int
+
+    @property
+    def cpu_ratio(self) -> float:
+        """Return the share of the wall time spent holding the interpreter.
+
+        Returns:
+            The CPU time divided by the wall time.
+        """
+        return self.cpu_time / self.wall_time if self.wall_time else 0.0
+
+
+class SimulationMetrics:
+    """Latency histograms of every phase of every simulated state.
+
+    .. highlight:: python
+    .. code-block:: python
+
+        metrics = SimulationMetrics()
+        for state_input in inputs:
+            state_machine.simulate(state_input, metrics=metrics)
+        print(metrics.summary())
+        metrics.to_prometheus("metrics.prom")
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        # The latest decision of each Map State with the "auto" backend
+        self.map_backends: Dict[str, MapBackendDecision] = {}
+        # Concurrent Map State iterations record from many threads
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, without the lock.
+
+        Returns:
+            The histograms and the Map State backend decisions.
+        """
+        return {"histograms": self.histograms, "map_backends": self.map_backends}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore pickled metrics.
+
+        Args:
+            state: The histograms and the Map State backend decisions.
+        """
+        self.histograms = state["histograms"]
+        self.map_backends = state["map_backends"]
+        self._lock = threading.Lock()
+
+    def record(self, state_name: str, phase: str, duration: int) -> None:
+        """Record the duration of a phase of a state.
+
+        Args:
+            state_name: The name of the state.
+            phase: The phase, such as "InputPath".
+            duration: The duration in nanoseconds.
+        """
+        key = (state_name, phase)
+        with self._lock:
+            if (histogram := self.histograms.get(key)) is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(duration)
+
+    def record_backend(self, state_name: str, decision: MapBackendDecision) -> None:
+        """Record the backend picked by a Map State with the "auto" backend.
+
+        Args:
+            state_name: The name of the Map State.
+            decision: The decision.
+        """
+        with self._lock:
+            self.map_backends[state_name] = decision
+
+    def merge(self, other: SimulationMetrics) -> None:
+        """Add the histograms of other metrics to these ones.
+
+        Args:
+            other: The metrics to merge.
+        """
+        with self._lock:
+            for key, other_histogram in other.histograms.items():
+                if (histogram := self.histograms.get(key)) is None:
+                    histogram = self.histograms[key] = LatencyHistogram()
+                histogram.merge(other_histogram)
+            self.map_backends.update(other.map_backends)
+
+    def _sorted_histograms(self) -> List[Tuple[Tuple[str, str], LatencyHistogram]]:
+        """Sort the histograms by state name and then by phase order.
+
+        Returns:
+            The sorted keys and histograms.
+        """
+        return sorted(
+            self.histograms.items(),
+            key=lambda item: (item[0][0], PHASES.index(item[0][1])),
+        )
+
+    def summary(self) -> str:
+        """Summarize the metrics in a table with durations in milliseconds.
+
+        The backends picked by Map States with the "auto" backend are listed
+        after the table.
+
+        Returns:
+            The summary table.
+        """
+        header = ("State", "Phase", "Count", "Mean", "p50", "p90", "p99", "Max")
+        rows: List[Tuple[str, ...]] = [header]
+        for (state_name, phase), histogram in self._sorted_histograms():
+            rows.append(
+                (
+                    state_name,
+                    phase,
+                    str(histogram.count),
+                    *(
+                        f"{duration / 1e6:.3f}"
+                        for duration in (
+                            histogram.mean,
+                            histogram.percentile(50),
+                            histogram.percentile(90),
+                            histogram.percentile(99),
+                            histogram.max or 0,
+                        )
+                    ),
+                )
+            )
+        widths = [max(len(row[column]) for row in rows) for column in range(8)]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if column < 2 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            ).rstrip()
+            for row in rows
+        ]
+        for state_name, decision in sorted(self.map_backends.items()):
+            lines.append(
+                f"{state_name}: {decision.backend} backend, chunks of "
+                f"{decision.chunk_size} (CPU {decision.cpu_ratio:.0%} of "
+                f"{decision.wall_time / 1e6:.3f} ms over "
+                f"{decision.probe_iterations} iterations)"
+            )
+        return "\n".join(lines)
+
+    def to_prometheus(self, fp: Union[str, Path, TextIO]) -> None:
+        """Export the metrics in the Prometheus text format.
+
+        Each state and phase is a series of the
+        `awsstepfuncs_state_phase_duration_seconds` histogram, with a bucket
+        for each non-empty histogram bucket.
+
+        Args:
+            fp: A path or a text file object to write to.
+        """
+        if isinstance(fp, (str, Path)):
+            with Path(fp).open("w") as opened_fp:
+                self.to_prometheus(opened_fp)
+            return
+
+        name = "awsstepfuncs_state_phase_duration_seconds"
+        fp.write(f"# HELP {name} Duration of each phase of simulated states.\n")
+        fp.write(f"# TYPE {name} histogram\n")
+        for (state_name, phase), histogram in self._sorted_histograms():
+            escaped_name = (
+                state_name.replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n")
+            )
+            labels = f'state="{escaped_name}",phase="{phase}"'
+            cumulative_count = 0
+            for upper_bound, count in histogram.buckets():
+                cumulative_count += count
+                fp.write(
+                    f'{name}_bucket{{{labels},le="{upper_bound / 1e9:.9g}"}} {cumulative_count}\n'
+                )
+            fp.write(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}\n')
+            fp.write(f"{name}_sum{{{labels}}} {histogram.total / 1e9:.9g}\n")
+            fp.write(f"{name}_count{{{labels}}} {histogram.count}\n")
@@ -1,8 +1,10 @@
-from enum import Enum, auto
-from typing import Any, List, Optional
+import sys
+import threading
+from contextlib import contextmanager
+from enum import Enum, IntEnum, auto
+from typing import Any, Iterator, List, Optional, TextIO
 
-from colorama import Fore as ColoramaColor
-from colorama import Style as ColoramaStyle
+from awsstepfuncs import counters
 
 
 class Color(Enum):
@@ -36,20 +38,75 @@ class Style(Enum):
     BRIGHT = auto()
 
 
+class Verbosity(IntEnum):
+    """How much a simulation prints.
+
+    Each level includes the messages of the levels below it.
+    """
+
+    SILENT = 0
+    SUMMARY = 1  # Start and end of simulations and errors
+    TRANSITIONS = 2  # Which states are executed and how they transition
+    PAYLOADS = 3  # State data after every step of input and output processing
+
+
 class Printer:
-    """Print simulation messages to STDOUT."""
+    """Print simulation messages to STDOUT.
+
+    Messages are only formatted if their level is enabled, so a silent printer
+    costs nothing even when whole state payloads are passed to it. Output is
+    collected in a buffer and written to the stream in chunks; call `flush()`
+    when done.
+
+    >>> printer = Printer(verbosity=Verbosity.TRANSITIONS, max_payload_length=10)
+    >>> printer("Shown")
+    >>> printer("Hidden payload:", list(range(100)), level=Verbosity.PAYLOADS)
+    >>> printer.flush()
+    Shown
+    >>> printer.verbosity = Verbosity.PAYLOADS
+    >>> printer("Shown payload:", list(range(100)), level=Verbosity.PAYLOADS)
+    >>> printer.flush()
+    Shown payload: [0, 1, 2, ... (390 characters)
+    """
 
-    def __init__(self, colorful: bool = False):
+    def __init__(
+        self,
+        colorful: bool = False,
+        *,
+        verbosity: Verbosity = Verbosity.PAYLOADS,
+        max_payload_length: Optional[int] = None,
+        stream: Optional[TextIO] = None,
+        buffer_size: int = 64 * 1024,
+    ):
         """Initialize a Printer.
 
         Args:
             colorful: Whether or not to use colorful STDOUT. Defaults to False.
+            verbosity: The highest level of messages to print. Defaults to
+                printing everything.
+            max_payload_length: If set, truncate the payloads of messages at the
+                `PAYLOADS` level (any message argument after the first one) that
+                are longer than this many characters.
+            stream: Where to write to. Defaults to STDOUT at the time the
+                Printer is created.
+            buffer_size: How many characters to buffer before writing to the
+                stream.
         """
         self.colorful = colorful
+        self.verbosity = verbosity
+        self.max_payload_length = max_payload_length
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._buffered = 0
+        # Concurrent Map State iterations print from many threads
+        self._lock = threading.Lock()
+        self._captured = threading.local()
 
     def __call__(
         self,
         *messages: Any,
+        level: Verbosity = Verbosity.TRANSITIONS,
         color: Color = None,
         style: Style = None,
         emoji: str = None,
@@ -57,16 +114,102 @@ class Printer:
         """Print the message to STDOUT with an optional color.
 
         Args:
-            messages: The messages to print.
+            messages: The messages to print. They are only converted to strings
+                if the level is enabled.
+            level: The verbosity level of the message.
             color: The color to use.
             style: The style to use.
             emoji: The emoji to use at the beginning.
         """
+        if level > self.verbosity:
+            return
+        if counters.enabled:
+            counters.increment(counters.PRINTER_FORMAT)
+
         to_print = [str(message) for message in messages]
+        max_length = self.max_payload_length
+        if level == Verbosity.PAYLOADS and max_length is not None:
+            for index in range(1, len(to_print)):
+                if len(message := to_print[index]) > max_length:
+                    to_print[
+                        index
+                    ] = f"{message[:max_length]}... ({len(message)} characters)"
         if self.colorful:  # pragma: no cover
             self._make_colorful(to_print, color=color, style=style, emoji=emoji)
 
-        print(*to_print)
+        line = " ".join(to_print) + "\n"
+        if (captured := getattr(self._captured, "lines", None)) is not None:
+            captured.append(line)
+            return
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered < self.buffer_size:
+                return
+        self.flush()
+
+    @contextmanager
+    def capture(self) -> Iterator[List[str]]:
+        """Collect the lines printed by the current thread instead of printing them.
+
+        Concurrent Map State iterations capture their output so that it can
+        be printed in the order of the items, as if they ran one by one.
+
+        >>> printer = Printer()
+        >>> with printer.capture() as lines:
+        ...     printer("Captured")
+        >>> printer("Printed")
+        >>> printer.write_lines(lines)
+        >>> printer.flush()
+        Printed
+        Captured
+
+        Yields:
+            The list the lines are collected in.
+        """
+        previous = getattr(self._captured, "lines", None)
+        lines: List[str] = []
+        self._captured.lines = lines
+        try:
+            yield lines
+        finally:
+            self._captured.lines = previous
+
+    def write_lines(self, lines: List[str]) -> None:
+        """Print lines collected by `capture()`.
+
+        Args:
+            lines: The lines, each ending with a newline.
+        """
+        if (captured := getattr(self._captured, "lines", None)) is not None:
+            captured.extend(lines)
+            return
+        with self._lock:
+            self._buffer.extend(lines)
+            self._buffered += sum(len(line) for line in lines)
+            if self._buffered < self.buffer_size:
+                return
+        self.flush()
+
+    def enabled(self, level: Verbosity) -> bool:
+        """Whether messages of the given level are printed.
+
+        Args:
+            level: The verbosity level to check.
+
+        Returns:
+            Whether the level is enabled.
+        """
+        return level <= self.verbosity
+
+    def flush(self) -> None:
+        """Write the buffered output to the stream."""
+        with self._lock:
+            if self._buffer:
+                self.stream.write("".join(self._buffer))
+                self._buffer.clear()
+                self._buffered = 0
+        self.stream.flush()
 
     @staticmethod
     def _make_colorful(
@@ -87,6 +230,9 @@ class Printer:
             emoji: The emoji to use.
         """
         if color or style:
+            from colorama import Fore as ColoramaColor
+            from colorama import Style as ColoramaStyle
+
             if color:
                 color_value = getattr(ColoramaColor, color.name)
                 to_print[0] = color_value + to_print[0]
@@ -0,0 +1,270 @@
+"""Profiling of simulations scoped per state.
+
+When simulating with `profile=`, a separate `cProfile.Profile` runs for each
+state, so library functions (such as JSONPath parsing) are attributed to the
+state that called them. Nested states, such as the iterations of a Map State,
+are profiled separately from the state that runs them. States are profiled by
+qualified name: the names of the Map States they run in and their own name,
+joined by "/" (such as "Map/Task"), so that states of different iterators
+sharing a name are told apart.
+
+Mocks run in a separate process, so their time can't be profiled function by
+function; instead, the time spent waiting for each mock is measured and
+reported apart from the library overhead of the state.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import pstats
+from pathlib import Path
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.abstract_state import AbstractState
+
+
+class StateProfile:
+    """The profile of a state across all of its executions."""
+
+    def __init__(
+        self,
+        state_name: str,
+        state_type: str,
+        resource: Optional[str],
+        qualified_name: Optional[str] = None,
+    ):
+        """Initialize an empty state profile.
+
+        Args:
+            state_name: The name of the state.
+            state_type: The type of the state, such as "Task".
+            resource: The resource URI of the state, if it has one.
+            qualified_name: The names of the Map States the state runs in and
+                its own name, joined by "/". Defaults to the name of the state.
+        """
+        self.state_name = state_name
+        self.qualified_name = qualified_name or state_name
+        self.state_type = state_type
+        self.resource = resource
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.total_ns = 0
+        self.nested_ns = 0
+        self.mock_ns = 0
+
+    @property
+    def library_ns(self) -> int:
+        """Return the time spent in the library for the state itself.
+
+        Returns:
+            The total time minus the time spent in mocks and nested states.
+        """
+        return self.total_ns - self.nested_ns - self.mock_ns
+
+
+class SimulationProfiler:
+    """Profile simulations per state.
+
+    Pass the same profiler to many simulations to aggregate a batch of them:
+
+    .. highlight:: python
+    .. code-block:: python
+
+        profiler = SimulationProfiler()
+        for state_input in inputs:
+            state_machine.simulate(state_input, profile=profiler)
+        print(profiler.report())
+        profiler.to_pstats("simulation.pstats")
+        profiler.to_speedscope("simulation.speedscope.json")
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty profiler."""
+        # The profile of each state by qualified name
+        self.states: Dict[str, StateProfile] = {}
+        self._stack: List[Tuple[StateProfile, int]] = []
+        self._frames: List[str] = []
+        self._frame_ids: Dict[str, int] = {}
+        self._events: List[Tuple[str, int, int]] = []
+
+    def _add_event(self, event_type: str, frame_name: str, at: int) -> None:
+        """Add an event of the timeline exported to speedscope.
+
+        Args:
+            event_type: "O" to open a frame, "C" to close it.
+            frame_name: The name of the frame.
+            at: When the event happened in nanoseconds.
+        """
+        if (frame_id := self._frame_ids.get(frame_name)) is None:
+            frame_id = self._frame_ids[frame_name] = len(self._frames)
+            self._frames.append(frame_name)
+        self._events.append((event_type, frame_id, at))
+
+    def enter_state(self, state: AbstractState) -> None:
+        """Start profiling a state, pausing the profile of its parent state.
+
+        Args:
+            state: The state about to be simulated.
+        """
+        qualified_name = state.name
+        if self._stack:
+            parent_profile = self._stack[-1][0]
+            parent_profile.profile.disable()
+            qualified_name = f"{parent_profile.qualified_name}/{state.name}"
+        if (state_profile := self.states.get(qualified_name)) is None:
+            state_profile = self.states[qualified_name] = StateProfile(
+                state.name,
+                state.state_type,  # type: ignore
+                getattr(state, "resource", None),
+                qualified_name,
+            )
+        start = perf_counter_ns()
+        self._add_event("O", f"{state.name} ({state_profile.state_type})", start)
+        self._stack.append((state_profile, start))
+        state_profile.profile.enable()
+
+    def exit_state(self, state: AbstractState) -> None:
+        """Stop profiling a state, resuming the profile of its parent state.
+
+        Args:
+            state: The state that was simulated.
+        """
+        state_profile, start = self._stack.pop()
+        state_profile.profile.disable()
+        end = perf_counter_ns()
+        self._add_event("C", f"{state.name} ({state_profile.state_type})", end)
+        state_profile.calls += 1
+        state_profile.total_ns += end - start
+        if self._stack:
+            parent_profile = self._stack[-1][0]
+            parent_profile.nested_ns += end - start
+            parent_profile.profile.enable()
+
+    def time_mock(self, resource: str, run_mock: Callable[[], Any]) -> Any:
+        """Run the mock of the current state, timing it separately.
+
+        Args:
+            resource: The resource URI of the mock.
+            run_mock: Runs the mock and returns its output.
+
+        Returns:
+            The output of the mock.
+        """
+        start = perf_counter_ns()
+        self._add_event("O", f"Mock {resource}", start)
+        try:
+            return run_mock()
+        finally:
+            end = perf_counter_ns()
+            self._add_event("C", f"Mock {resource}", end)
+            self._stack[-1][0].mock_ns += end - start
+
+    def report(self) -> str:
+        """Break the simulation time down by state in a table.
+
+        Times are in milliseconds. The library time of a state excludes the
+        time spent in its mocks and in nested states.
+
+        Returns:
+            The report, with the most expensive states first.
+        """
+        header = ("State", "Type", "Resource", "Calls", "Total", "Library", "Mocks")
+        rows: List[Tuple[str, ...]] = [header]
+        for state_profile in sorted(
+            self.states.values(), key=lambda profile: profile.total_ns, reverse=True
+        ):
+            rows.append(
+                (
+                    state_profile.qualified_name,
+                    state_profile.state_type,
+                    state_profile.resource or "",
+                    str(state_profile.calls),
+                    *(
+                        f"{duration / 1e6:.3f}"
+                        for duration in (
+                            state_profile.total_ns,
+                            state_profile.library_ns,
+                            state_profile.mock_ns,
+                        )
+                    ),
+                )
+            )
+        widths = [max(len(row[column]) for row in rows) for column in range(7)]
+        return "\n".join(
+            "  ".join(
+                cell.ljust(width) if column < 3 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            ).rstrip()
+            for row in rows
+        )
+
+    def stats(self, state_name: Optional[str] = None) -> pstats.Stats:
+        """Return the profile statistics of a state or of all states.
+
+        Args:
+            state_name: The qualified name of the state. If omitted, the
+                profiles of all states are combined.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when no state with that name was
+                profiled.
+
+        Returns:
+            The profile statistics.
+        """
+        if state_name is not None:
+            if state_name not in self.states:
+                raise AWSStepFuncsValueError(f"No profile for state {state_name!r}")
+            return pstats.Stats(self.states[state_name].profile)
+        stats = pstats.Stats()
+        for state_profile in self.states.values():
+            stats.add(state_profile.profile)
+        return stats
+
+    def to_pstats(
+        self, path: Union[str, Path], *, state_name: Optional[str] = None
+    ) -> None:
+        """Export the profile statistics to a file readable by `pstats`.
+
+        Args:
+            path: The path to write to.
+            state_name: The qualified name of the state. If omitted, the
+                profiles of all states are combined.
+        """
+        self.stats(state_name).dump_stats(str(path))
+
+    def to_speedscope(self, path: Union[str, Path]) -> None:
+        """Export the timeline of states and mocks to a speedscope file.
+
+        Open the file on https://www.speedscope.app to see every state and
+        mock of the profiled simulations as a flame chart.
+
+        Args:
+            path: The path to write to.
+        """
+        start = self._events[0][2] if self._events else 0
+        events = [
+            {"type": event_type, "frame": frame_id, "at": at - start}
+            for event_type, frame_id, at in self._events
+        ]
+        speedscope = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name} for name in self._frames]},
+            "profiles": [
+                {
+                    "type": "evented",
+                    "name": "awsstepfuncs simulation",
+                    "unit": "nanoseconds",
+                    "startValue": 0,
+                    "endValue": events[-1]["at"] if events else 0,
+                    "events": events,
+                }
+            ],
+            "exporter": "awsstepfuncs",
+        }
+        with Path(path).open("w") as fp:
+            json.dump(speedscope, fp)
@@ -0,0 +1,424 @@
+"""Record and replay simulated executions.
+
+A recording is a stream of length-prefixed JSON records, one per state
+transition and one per mock invocation, terminated by an end-of-execution
+record. Each record is written as soon as it happens, so very long executions
+never need to be held in memory, and replaying reads the log back one record at
+a time.
+
+Transitions only store digests of the state input and output whereas mock
+invocations store the full mock input and output so that they can be fed back
+during a replay without calling the mocks.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+from awsstepfuncs.errors import AWSStepFuncsValueError, ReplayDivergenceError
+from awsstepfuncs.serialization import json_default, snapshot_default
+
+RECORD_LENGTH = struct.Struct(">I")
+
+Record = Dict[str, Any]
+
+
+def serialize(data: Any, *, strict: bool = False) -> str:
+    """Serialize some JSON-like data to a canonical snapshot.
+
+    Iterators are snapshotted as a marker without consuming them (see
+    `awsstepfuncs.serialization.snapshot_default()`), unless strict is set.
+
+    >>> serialize({"b": 1, "a": [2, 3]})
+    '{"a":[2,3],"b":1}'
+    >>> serialize({"a": {1, 2}})
+    Traceback (most recent call last):
+        ...
+    awsstepfuncs.errors.AWSStepFuncsValueError: set is not JSON serializable
+    >>> serialize(iter([]))
+    '"<list_iterator>"'
+    >>> serialize(iter([]), strict=True)
+    Traceback (most recent call last):
+        ...
+    awsstepfuncs.errors.AWSStepFuncsValueError: list_iterator is not JSON serializable
+
+    Args:
+        data: The data to serialize.
+        strict: Whether to raise on iterators instead of snapshotting them as
+            a marker, for snapshots that are loaded back as data.
+
+    Returns:
+        Minified JSON with sorted keys.
+    """
+    return json.dumps(
+        data,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=json_default if strict else snapshot_default,
+    )
+
+
+def snapshot_digest(snapshot: str) -> str:
+    """Compute a compact digest of a snapshot made with `serialize()`.
+
+    Args:
+        snapshot: The serialized data.
+
+    Returns:
+        A hex digest of the snapshot.
+    """
+    return hashlib.blake2b(snapshot.encode(), digest_size=8).hexdigest()
+
+
+def digest(data: Any) -> str:
+    """Compute a compact digest of some JSON-like data.
+
+    >>> digest({"b": 1, "a": 2}) == digest({"a": 2, "b": 1})
+    True
+
+    Args:
+        data: The data to digest.
+
+    Returns:
+        A hex digest which is stable across key order.
+    """
+    return snapshot_digest(serialize(data))
+
+
+def write_record(fp: BinaryIO, record: Record) -> None:
+    """Append a length-prefixed record to a binary stream.
+
+    Args:
+        fp: The binary stream to append to.
+        record: The record to write.
+    """
+    payload = json.dumps(record, separators=(",", ":"), default=json_default).encode()
+    fp.write(RECORD_LENGTH.pack(len(payload)))
+    fp.write(payload)
+
+
+def read_records(fp: BinaryIO) -> Iterator[Record]:
+    """Read length-prefixed records from a binary stream one at a time.
+
+    >>> from io import BytesIO
+    >>> fp = BytesIO()
+    >>> write_record(fp, {"type": "end"})
+    >>> _ = fp.seek(0)
+    >>> list(read_records(fp))
+    [{'type': 'end'}]
+
+    Args:
+        fp: The binary stream to read from.
+
+    Yields:
+        Each record in the stream.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the stream ends in the middle of a
+            record.
+    """
+    while header := fp.read(RECORD_LENGTH.size):
+        if len(header) != RECORD_LENGTH.size:
+            raise AWSStepFuncsValueError("Truncated record header in recording")
+        (length,) = RECORD_LENGTH.unpack(header)
+        payload = fp.read(length)
+        if len(payload) != length:
+            raise AWSStepFuncsValueError("Truncated record in recording")
+        yield json.loads(payload)
+
+
+def transition_record(
+    state_name: str,
+    state_input_snapshot: str,
+    state_output: Any,
+    next_state_name: Optional[str],
+) -> Record:
+    """Build the record of a single state transition.
+
+    Args:
+        state_name: The name of the state that was executed.
+        state_input_snapshot: The serialized input to the state.
+        state_output: The output of the state.
+        next_state_name: The name of the state transitioned to, if any.
+
+    Returns:
+        The transition record.
+    """
+    return {
+        "type": "transition",
+        "state": state_name,
+        "input": snapshot_digest(state_input_snapshot),
+        "output": digest(state_output),
+        "next": next_state_name,
+    }
+
+
+class AbstractExecutionLog(ABC):
+    """Hooks that a simulation calls on transitions and mock invocations.
+
+    Nested state machines (such as Map State iterators) share the log of their
+    parent, so `start_execution()` and `end_execution()` calls are nested.
+    """
+
+    def start_execution(self) -> None:
+        """Handle the start of an execution."""
+
+    @abstractmethod
+    def record_transition(
+        self,
+        state_name: str,
+        state_input_snapshot: str,
+        state_output: Any,
+        next_state_name: Optional[str],
+    ) -> None:
+        """Handle a state transition.
+
+        Args:
+            state_name: The name of the state that was executed.
+            state_input_snapshot: The input to the state serialized with
+                `serialize()` before the state was executed.
+            state_output: The output of the state.
+            next_state_name: The name of the state transitioned to, if any.
+
+        Raises:
+            NotImplementedError: Raised when child classes do not implement this
+                method.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def invoke_mock(
+        self, resource: str, mock_input: Any, run_mock: Callable[[], Any]
+    ) -> Any:
+        """Handle a mock invocation.
+
+        Args:
+            resource: The resource URI of the mock.
+            mock_input: The event passed to the mock.
+            run_mock: Runs the mock and returns its output.
+
+        Raises:
+            NotImplementedError: Raised when child classes do not implement this
+                method.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def end_execution(self, execution_output: Any) -> None:
+        """Handle the end of an execution.
+
+        Args:
+            execution_output: The final output of the execution.
+
+        Raises:
+            NotImplementedError: Raised when child classes do not implement this
+                method.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the log."""
+
+
+class ExecutionRecorder(AbstractExecutionLog):
+    """Record transitions and mock invocations of a simulation to a file."""
+
+    def __init__(self, path: Union[str, Path]):
+        """Initialize an execution recorder, truncating any existing recording.
+
+        Args:
+            path: The path to write the recording to.
+        """
+        self.path = Path(path)
+        self._fp = self.path.open("wb")
+
+    def record_transition(
+        self,
+        state_name: str,
+        state_input_snapshot: str,
+        state_output: Any,
+        next_state_name: Optional[str],
+    ) -> None:
+        """Record a state transition.
+
+        Args:
+            state_name: The name of the state that was executed.
+            state_input_snapshot: The input to the state serialized with
+                `serialize()` before the state was executed.
+            state_output: The output of the state.
+            next_state_name: The name of the state transitioned to, if any.
+        """
+        write_record(
+            self._fp,
+            transition_record(
+                state_name, state_input_snapshot, state_output, next_state_name
+            ),
+        )
+
+    def invoke_mock(
+        self, resource: str, mock_input: Any, run_mock: Callable[[], Any]
+    ) -> Any:
+        """Run the mock and record its input and output.
+
+        Args:
+            resource: The resource URI of the mock.
+            mock_input: The event passed to the mock.
+            run_mock: Runs the mock and returns its output.
+
+        Returns:
+            The output of the mock.
+        """
+        mock_output = run_mock()
+        write_record(
+            self._fp,
+            {
+                "type": "mock",
+                "resource": resource,
+                "input": mock_input,
+                "output": mock_output,
+            },
+        )
+        return mock_output
+
+    def end_execution(self, execution_output: Any) -> None:
+        """Record the end of an execution.
+
+        Args:
+            execution_output: The final output of the execution.
+        """
+        write_record(self._fp, {"type": "end", "output": digest(execution_output)})
+        self._fp.flush()
+
+    def close(self) -> None:
+        """Close the recording."""
+        self._fp.close()
+
+
+class ExecutionReplayer(AbstractExecutionLog):
+    """Replay a recorded simulation, checking that it still behaves the same.
+
+    Recorded mock outputs are fed back instead of calling the mocks, and the
+    simulation stops at the first transition that doesn't match the recording.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """Initialize an execution replayer.
+
+        Args:
+            path: The path to read the recording from.
+        """
+        self.path = Path(path)
+        self._fp = self.path.open("rb")
+        self._records = read_records(self._fp)
+        self._position = 0
+        self._depth = 0
+
+    def start_execution(self) -> None:
+        """Handle the start of a (possibly nested) execution."""
+        self._depth += 1
+
+    def _next_record(self, actual: Record) -> Record:
+        """Read the next record, checking that it has the same type.
+
+        Args:
+            actual: The record that the current simulation produced.
+
+        Raises:
+            ReplayDivergenceError: Raised when the recording has ended or when
+                the next record is of a different type.
+
+        Returns:
+            The next recorded record.
+        """
+        self._position += 1
+        expected = next(self._records, None)
+        if expected is None or expected["type"] != actual["type"]:
+            raise ReplayDivergenceError(
+                position=self._position, expected=expected, actual=actual
+            )
+        return expected
+
+    def record_transition(
+        self,
+        state_name: str,
+        state_input_snapshot: str,
+        state_output: Any,
+        next_state_name: Optional[str],
+    ) -> None:
+        """Check a state transition against the recording.
+
+        Args:
+            state_name: The name of the state that was executed.
+            state_input_snapshot: The input to the state serialized with
+                `serialize()` before the state was executed.
+            state_output: The output of the state.
+            next_state_name: The name of the state transitioned to, if any.
+
+        Raises:
+            ReplayDivergenceError: Raised when the transition doesn't match.
+        """
+        actual = transition_record(
+            state_name, state_input_snapshot, state_output, next_state_name
+        )
+        if (expected := self._next_record(actual)) != actual:
+            raise ReplayDivergenceError(
+                position=self._position, expected=expected, actual=actual
+            )
+
+    def invoke_mock(
+        self, resource: str, mock_input: Any, run_mock: Callable[[], Any]
+    ) -> Any:
+        """Return the recorded mock output without running the mock.
+
+        Args:
+            resource: The resource URI of the mock.
+            mock_input: The event passed to the mock.
+            run_mock: Runs the mock and returns its output (unused).
+
+        Raises:
+            ReplayDivergenceError: Raised when the mock resource or input doesn't
+                match the recording.
+
+        Returns:
+            The recorded output of the mock.
+        """
+        actual = {"type": "mock", "resource": resource, "input": mock_input}
+        expected = self._next_record(actual)
+        if expected["resource"] != resource or digest(expected["input"]) != digest(
+            mock_input
+        ):
+            raise ReplayDivergenceError(
+                position=self._position,
+                expected={key: expected[key] for key in actual},
+                actual=actual,
+            )
+        return expected["output"]
+
+    def end_execution(self, execution_output: Any) -> None:
+        """Check that the recorded execution ended with the same output.
+
+        Args:
+            execution_output: The final output of the execution.
+
+        Raises:
+            ReplayDivergenceError: Raised when the output doesn't match or when
+                the outermost execution ends with records left in the recording.
+        """
+        self._depth -= 1
+        actual = {"type": "end", "output": digest(execution_output)}
+        if (expected := self._next_record(actual)) != actual:
+            raise ReplayDivergenceError(
+                position=self._position, expected=expected, actual=actual
+            )
+        if self._depth == 0 and (unused := next(self._records, None)) is not None:
+            raise ReplayDivergenceError(
+                position=self._position + 1, expected=unused, actual=None
+            )
+
+    def close(self) -> None:
+        """Close the recording."""
+        self._fp.close()
@@ -0,0 +1,194 @@
+"""Reducers combining the outputs of Map State iterations.
+
+A Map State simulated with a `reducer` outputs the reduction of the outputs of
+its iterations instead of the list of them. Outputs are combined one by one
+as iterations finish (in the order of the items, whichever thread or process
+ran them), so no list of outputs is ever built.
+
+Built-in reducers can be passed by name:
+
+- "count": The number of items
+- "sum": The sum of the outputs
+- "min", "max": The smallest or largest output, or None if there are no items
+- "merge": The outputs (objects) merged into one, later outputs overriding
+  earlier ones
+
+`top_k()` builds a reducer keeping the largest outputs, and any associative
+function can be turned into a reducer with `Reducer`.
+
+>>> Reducer.from_name("sum").reduce([1, 2, 3])
+6
+>>> top_k(2, key=lambda output: output["score"]).reduce(
+...     [{"score": 1}, {"score": 3}, {"score": 2}]
+... )
+[{'score': 3}, {'score': 2}]
+"""
+from __future__ import annotations
+
+import copy
+import heapq
+import itertools
+import operator
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from awsstepfuncs.errors import AWSStepFuncsValueError, StateSimulationError
+
+
+class _NoInitial:
+    """The type of `NO_INITIAL`, which stays the same object when unpickled."""
+
+    __slots__ = ()
+
+    def __reduce__(self) -> str:
+        """Pickle the marker by name.
+
+        Returns:
+            The name of the marker in this module.
+        """
+        return "NO_INITIAL"
+
+
+# Marks reducers without an initial value, which start from the first output
+NO_INITIAL = _NoInitial()
+
+
+class Reducer:
+    """Combine outputs one by one with an associative function.
+
+    >>> Reducer(lambda total, output: total * output, initial=1).reduce([2, 3])
+    6
+    >>> Reducer(max).reduce([])
+    """
+
+    __slots__ = ("combine", "initial", "finish")
+
+    def __init__(
+        self,
+        combine: Callable[[Any, Any], Any],
+        *,
+        initial: Any = NO_INITIAL,
+        finish: Optional[Callable[[Any], Any]] = None,
+    ):
+        """Initialize a reducer.
+
+        Args:
+            combine: The function taking the reduction so far and an output,
+                returning the new reduction. It may update the reduction in
+                place, as every reduction starts from a copy of `initial`.
+            initial: The reduction of no outputs. If not set, the reduction
+                starts from the first output, and is None if there are none.
+            finish: A function to apply to the reduction once all outputs are
+                combined.
+        """
+        self.combine = combine
+        self.initial = initial
+        self.finish = finish
+
+    @classmethod
+    def from_name(cls, name: str) -> Reducer:
+        """Return a built-in reducer.
+
+        Args:
+            name: The name of the reducer, one of `REDUCER_NAMES`.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the name is unknown.
+
+        Returns:
+            The reducer.
+        """
+        try:
+            return _BUILT_IN_REDUCERS[name]()
+        except KeyError:
+            raise AWSStepFuncsValueError(
+                f"reducer must be one of: {', '.join(REDUCER_NAMES)}"
+            ) from None
+
+    def reduce(self, outputs: Iterable[Any]) -> Any:
+        """Combine outputs, consuming them one by one.
+
+        Args:
+            outputs: The outputs to combine.
+
+        Raises:
+            StateSimulationError: Raised when an output can't be combined.
+
+        Returns:
+            The reduction of the outputs.
+        """
+        outputs = iter(outputs)
+        if self.initial is NO_INITIAL:
+            if (reduction := next(outputs, NO_INITIAL)) is NO_INITIAL:
+                return None
+        else:
+            reduction = copy.copy(self.initial)
+        for output in outputs:
+            try:
+                reduction = self.combine(reduction, output)
+            except Exception as exc:
+                raise StateSimulationError(f"Failed to reduce output: {exc}") from exc
+        return reduction if self.finish is None else self.finish(reduction)
+
+
+def top_k(k: int, *, key: Optional[Callable[[Any], Any]] = None) -> Reducer:
+    """Build a reducer keeping the k largest outputs, largest first.
+
+    Ties are kept in the order of the items.
+
+    Args:
+        k: How many outputs to keep.
+        key: A function computing the value to compare outputs by.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when k is not positive.
+
+    Returns:
+        The reducer.
+    """
+    if k <= 0:
+        raise AWSStepFuncsValueError("k must be a positive integer")
+    # Heap entries are (key, negated arrival, output), so that the smallest
+    # entry is the one to drop and outputs themselves are never compared
+    arrivals = itertools.count()
+
+    def combine(heap: List[Any], output: Any) -> List[Any]:
+        entry = (output if key is None else key(output), -next(arrivals), output)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heappushpop(heap, entry)
+        return heap
+
+    def finish(heap: List[Any]) -> List[Any]:
+        return [output for *_, output in sorted(heap, reverse=True)]
+
+    return Reducer(combine, initial=[], finish=finish)
+
+
+def _count(count: int, _: Any) -> int:
+    """Count one more output.
+
+    Args:
+        count: The number of outputs so far.
+        _: The output.
+
+    Returns:
+        The new number of outputs.
+    """
+    return count + 1
+
+
+def _merge(merged: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+    merged.update(output)
+    return merged
+
+
+_BUILT_IN_REDUCERS: Dict[str, Callable[[], Reducer]] = {
+    "count": lambda: Reducer(_count, initial=0),
+    "sum": lambda: Reducer(operator.add, initial=0),
+    "min": lambda: Reducer(min),
+    "max": lambda: Reducer(max),
+    "merge": lambda: Reducer(_merge, initial={}),
+}
+
+REDUCER_NAMES = tuple(_BUILT_IN_REDUCERS)
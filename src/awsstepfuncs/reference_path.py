@@ -1,7 +1,8 @@
+import sys
+from functools import lru_cache
 from typing import Any
 
-from jsonpath_rw import parse as parse_jsonpath
-
+from awsstepfuncs import counters
 from awsstepfuncs.errors import AWSStepFuncsValueError
 
 
@@ -15,6 +16,8 @@ class ReferencePath:
     More on JSONPath: https://github.com/json-path/JsonPath
     """
 
+    __slots__ = ("reference_path",)
+
     def __init__(self, reference_path: str, /):
         """Initialize a Reference Path.
 
@@ -28,7 +31,7 @@ class ReferencePath:
         Raises:
             AWSStepFuncsValueError: Raised when the Reference Path is malformed.
         """
-        self.reference_path = reference_path or "$"
+        self.reference_path = sys.intern(reference_path or "$")
         try:
             self._validate()
         except AWSStepFuncsValueError:
@@ -81,7 +84,7 @@ class ReferencePath:
                 )
 
     def apply(self, data: dict) -> Any:
-        """Parse then apply a Reference Path on some data.
+        """Apply a Reference Path on some data, parsing it on first use.
 
         Args:
             data: The data to use the Reference Path expression on.
@@ -89,7 +92,31 @@ class ReferencePath:
         Returns:
             The queried data.
         """
-        parsed_reference_path = parse_jsonpath(self.reference_path)
+        if counters.enabled:
+            counters.increment(counters.REFERENCE_PATH_APPLY)
+        parsed_reference_path = _parse_jsonpath(self.reference_path)
         if matches := [match.value for match in parsed_reference_path.find(data)]:
             assert len(matches) == 1, "There should only be one match possible"
             return matches[0]
+
+
+@lru_cache(maxsize=1024)
+def _parse_jsonpath(reference_path: str) -> Any:
+    """Parse a JSONPath, once per distinct path.
+
+    Parsing builds a parser each time, which costs far more than applying the
+    parsed path, so parsed paths are cached.
+
+    Args:
+        reference_path: The JSONPath.
+
+    Returns:
+        The parsed JSONPath.
+    """
+    if counters.enabled:
+        counters.increment(counters.JSONPATH_PARSE)
+    # jsonpath_rw builds its parser tables on import, which compiling state
+    # machines doesn't need
+    from jsonpath_rw import parse as parse_jsonpath
+
+    return parse_jsonpath(reference_path)
@@ -0,0 +1,221 @@
+"""Map State outputs spilled to disk.
+
+A Map State simulated with an `output_memory_limit` keeps the outputs of its
+iterations in memory until their size (serialized to JSON) exceeds the limit.
+Further outputs are appended to a temporary file of length-prefixed records,
+and the offset of each record to a temporary index file. The Map State then
+outputs a `SpilledOutput`, a read-only sequence reading spilled outputs back
+from the memory-mapped files, so states after it can iterate over or index
+into millions of outputs without loading them all:
+
+>>> store = ResultStore(memory_limit=8)
+>>> for output in [{"a": 1}, {"b": 2}, {"c": 3}]:
+...     store.append(output)
+>>> output = store.finish()
+>>> output
+<SpilledOutput of 3 outputs, 2 spilled>
+>>> output[2], list(output)
+({'c': 3}, [{'a': 1}, {'b': 2}, {'c': 3}])
+>>> output.close()
+
+The outputs are a plain list when they all fit in memory, and spilled outputs
+are pickled (such as when a mock returns them) as a list.
+"""
+from __future__ import annotations
+
+import mmap
+import struct
+import tempfile
+from collections.abc import Sequence
+from typing import IO, Any, Iterator, List, Optional, Tuple, Union
+
+from awsstepfuncs.serialization import get_json_backend
+
+# Each record is its length followed by the output serialized to JSON, and
+# the index holds the offset of each record
+RECORD_LENGTH = struct.Struct("<I")
+INDEX_OFFSET = struct.Struct("<Q")
+
+
+class ResultStore:
+    """Collect outputs in memory up to a byte budget, then on disk."""
+
+    __slots__ = (
+        "memory_limit",
+        "_in_memory",
+        "_memory_used",
+        "_data",
+        "_index",
+        "_data_size",
+        "_n_spilled",
+    )
+
+    def __init__(self, memory_limit: int):
+        """Initialize a result store.
+
+        Args:
+            memory_limit: How many bytes of outputs, serialized to JSON, to keep
+                in memory before spilling to disk.
+        """
+        self.memory_limit = memory_limit
+        self._in_memory: List[Any] = []
+        self._memory_used = 0
+        self._data: Optional[IO[bytes]] = None
+        self._index: Optional[IO[bytes]] = None
+        self._data_size = 0
+        self._n_spilled = 0
+
+    def append(self, output: Any) -> None:
+        """Add the next output.
+
+        Args:
+            output: The JSON-serializable output.
+        """
+        record = get_json_backend().dumps(output)
+        if self._data is None and self._memory_used + len(record) <= self.memory_limit:
+            self._in_memory.append(output)
+            self._memory_used += len(record)
+            return
+        if self._data is None:
+            self._data = tempfile.TemporaryFile(prefix="awsstepfuncs-map-")
+            self._index = tempfile.TemporaryFile(prefix="awsstepfuncs-map-index-")
+        self._index.write(INDEX_OFFSET.pack(self._data_size))  # type: ignore
+        self._data.write(RECORD_LENGTH.pack(len(record)))
+        self._data.write(record)
+        self._data_size += RECORD_LENGTH.size + len(record)
+        self._n_spilled += 1
+
+    def finish(self) -> Union[List[Any], SpilledOutput]:
+        """Return all the outputs added.
+
+        Returns:
+            The outputs, as a list if none were spilled.
+        """
+        if self._data is None:
+            return self._in_memory
+        self._data.flush()
+        self._index.flush()  # type: ignore
+        return SpilledOutput(
+            self._in_memory, self._data, self._index, self._n_spilled  # type: ignore
+        )
+
+
+class SpilledOutput(Sequence):
+    """The outputs of a Map State, partly spilled to disk."""
+
+    __slots__ = ("_in_memory", "_files", "_data", "_index", "_n_spilled")
+
+    def __init__(
+        self, in_memory: List[Any], data: IO[bytes], index: IO[bytes], n_spilled: int
+    ):
+        """Initialize spilled outputs.
+
+        Args:
+            in_memory: The outputs kept in memory, which come first.
+            data: The file of the records of the spilled outputs.
+            index: The file of the offsets of the records.
+            n_spilled: The number of spilled outputs.
+        """
+        self._in_memory = in_memory
+        self._files = (data, index)
+        self._data = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+        self._n_spilled = n_spilled
+
+    def __len__(self) -> int:
+        """Return the number of outputs.
+
+        Returns:
+            The number of outputs.
+        """
+        return len(self._in_memory) + self._n_spilled
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:  # type: ignore
+        """Return an output, reading it back from disk if it was spilled.
+
+        Args:
+            index: The index of the output, or a slice of outputs.
+
+        Raises:
+            IndexError: Raised when the index is out of range.
+
+        Returns:
+            The output, or a list of the outputs of a slice.
+        """
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SpilledOutput index out of range")
+        if index < len(self._in_memory):
+            return self._in_memory[index]
+        (offset,) = INDEX_OFFSET.unpack_from(
+            self._index, (index - len(self._in_memory)) * INDEX_OFFSET.size
+        )
+        return self._read_record(offset)[0]
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the outputs, reading the spilled ones sequentially.
+
+        Yields:
+            Each output, in order.
+        """
+        yield from self._in_memory
+        offset = 0
+        for _ in range(self._n_spilled):
+            output, offset = self._read_record(offset)
+            yield output
+
+    def __repr__(self) -> str:
+        """Return a representation which doesn't read the outputs.
+
+        Returns:
+            The representation.
+        """
+        return (
+            f"<{self.__class__.__name__} of {len(self)} outputs, "
+            f"{self._n_spilled} spilled>"
+        )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the outputs as a list, as the memory-mapped files can't be.
+
+        Mocks run in processes of their own and send their results back
+        pickled, so they can return the outputs they were given.
+
+        Returns:
+            How to rebuild the outputs as a list.
+        """
+        return (list, (list(self),))
+
+    def __json__(self) -> List[Any]:
+        """Read all the outputs back, such as to serialize them.
+
+        Returns:
+            The outputs as a list.
+        """
+        return list(self)
+
+    def close(self) -> None:
+        """Release the files, after which spilled outputs can't be read."""
+        self._data.close()
+        self._index.close()
+        for file in self._files:
+            file.close()
+
+    def _read_record(self, offset: int) -> Tuple[Any, int]:
+        """Read the record at an offset of the data file.
+
+        Args:
+            offset: The offset of the record.
+
+        Returns:
+            The output of the record and the offset of the next record.
+        """
+        (length,) = RECORD_LENGTH.unpack_from(self._data, offset)
+        start = offset + RECORD_LENGTH.size
+        return (
+            get_json_backend().loads(self._data[start : start + length]),
+            start + length,
+        )
@@ -0,0 +1,542 @@
+"""Map State item readers and result writers, simulated on a local directory.
+
+Map States can read their items from Amazon S3 with an `ItemReader` instead of
+from their input, and write the results of their iterations to Amazon S3 with
+a `ResultWriter` instead of outputting them. When simulating, a local
+directory stands in for Amazon S3 (pass it as `s3_directory`): each of its
+subdirectories is a bucket, and each file in a bucket is an object whose key
+is its path relative to the bucket.
+
+Items are streamed from objects: JSON arrays and JSON lines are parsed one
+item at a time and CSV files one row at a time, so objects much larger than
+the available memory can be read. Objects of at least `mmap_threshold` bytes
+are memory-mapped rather than read through a buffer.
+
+Results are written as AWS Step Functions does: to shards named
+`SUCCEEDED_<n>.json` under `<Prefix>/<map run ID>/`, described by a
+`manifest.json` next to them, and the Map State outputs where the manifest
+is.
+"""
+from __future__ import annotations
+
+import csv
+import datetime
+import itertools
+import mmap
+import uuid
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from awsstepfuncs.errors import (
+    AWSStepFuncsValueError,
+    ItemReaderFailedError,
+    ResultWriterFailedError,
+)
+from awsstepfuncs.reference_path import ReferencePath
+from awsstepfuncs.serialization import get_json_backend, iter_json_array
+
+S3_GET_OBJECT = "arn:aws:states:::s3:getObject"
+S3_LIST_OBJECTS = "arn:aws:states:::s3:listObjectsV2"
+S3_PUT_OBJECT = "arn:aws:states:::s3:putObject"
+
+INPUT_TYPES = ("JSON", "JSONL", "CSV")
+CSV_HEADER_LOCATIONS = ("FIRST_ROW", "GIVEN")
+OUTPUT_TYPES = ("JSON", "JSONL")
+
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# How many results each shard written by a ResultWriter holds at most
+RESULTS_PER_SHARD = 10_000
+
+
+class LocalS3:
+    """A local directory standing in for Amazon S3."""
+
+    __slots__ = ("directory", "mmap_threshold")
+
+    def __init__(
+        self, directory: Union[str, Path], *, mmap_threshold: int = MMAP_THRESHOLD
+    ):
+        """Initialize a local S3 stand-in.
+
+        Args:
+            directory: The directory whose subdirectories are the buckets.
+            mmap_threshold: Objects of at least this many bytes are
+                memory-mapped when read.
+        """
+        self.directory = Path(directory)
+        self.mmap_threshold = mmap_threshold
+
+    def bucket_path(self, bucket: str) -> Path:
+        """Return the path of a bucket.
+
+        Args:
+            bucket: The bucket.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the bucket name is invalid.
+
+        Returns:
+            The path of the bucket.
+        """
+        if bucket in ("", ".", "..") or "/" in bucket:
+            raise AWSStepFuncsValueError(f'Invalid S3 bucket "{bucket}"')
+        return self.directory.resolve() / bucket
+
+    def path(self, bucket: str, key: str) -> Path:
+        """Return the path of an object.
+
+        Args:
+            bucket: The bucket of the object.
+            key: The key of the object.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the object would be outside of
+                the bucket.
+
+        Returns:
+            The path of the object.
+        """
+        bucket_path = self.bucket_path(bucket)
+        path = (bucket_path / key).resolve()
+        if bucket_path not in path.parents:
+            raise AWSStepFuncsValueError(f'Invalid S3 object "{bucket}/{key}"')
+        return path
+
+    @contextmanager
+    def open_object(
+        self, bucket: str, key: str
+    ) -> Iterator[Union[IO[bytes], mmap.mmap]]:
+        """Open an object for reading.
+
+        Args:
+            bucket: The bucket of the object.
+            key: The key of the object.
+
+        Yields:
+            The object as a binary file, or memory-mapped if it is large.
+        """
+        with open(self.path(bucket, key), "rb") as fp:
+            size = fp.seek(0, 2)
+            fp.seek(0)
+            if size < self.mmap_threshold or size == 0:
+                yield fp
+            else:
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+
+    def list_objects(self, bucket: str, prefix: str = "") -> Iterator[Dict[str, Any]]:
+        """List the objects of a bucket, in the order of their keys.
+
+        Args:
+            bucket: The bucket.
+            prefix: Only list the objects whose key starts with this prefix.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the bucket doesn't exist.
+
+        Yields:
+            The Key, Size, LastModified, and StorageClass of each object, like
+            the Contents of a ListObjectsV2 response.
+        """
+        bucket_path = self.bucket_path(bucket)
+        if not bucket_path.is_dir():
+            raise AWSStepFuncsValueError(f'Unknown S3 bucket "{bucket}"')
+        for path in sorted(bucket_path.rglob("*")):
+            key = path.relative_to(bucket_path).as_posix()
+            if path.is_file() and key.startswith(prefix):
+                stat = path.stat()
+                yield {
+                    "Key": key,
+                    "Size": stat.st_size,
+                    "LastModified": datetime.datetime.fromtimestamp(
+                        stat.st_mtime, datetime.timezone.utc
+                    ).isoformat(),
+                    "StorageClass": "STANDARD",
+                }
+
+    @contextmanager
+    def create_object(self, bucket: str, key: str) -> Iterator[IO[bytes]]:
+        """Create (or replace) an object.
+
+        Args:
+            bucket: The bucket of the object.
+            key: The key of the object.
+
+        Yields:
+            The object as a binary file to write to.
+        """
+        path = self.path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fp:
+            yield fp
+
+
+def _resolve_parameters(parameters: Dict[str, Any], state_input: Any) -> Dict[str, Any]:
+    """Resolve the parameters of an item reader or result writer.
+
+    Args:
+        parameters: The parameters, where the values of keys ending with ".$"
+            are Reference Paths.
+        state_input: The input to apply Reference Paths on.
+
+    Returns:
+        The resolved parameters.
+    """
+    resolved = {}
+    for key, value in parameters.items():
+        if key.endswith(".$"):
+            resolved[key[:-2]] = ReferencePath(value).apply(state_input)
+        else:
+            resolved[key] = value
+    return resolved
+
+
+class ItemReader:
+    """Read the items of a Map State from Amazon S3.
+
+    Read the rows of a CSV object:
+
+    >>> item_reader = ItemReader(
+    ...     parameters={"Bucket": "my-bucket", "Key.$": "$.key"}, input_type="CSV"
+    ... )
+    >>> item_reader.compile()["ReaderConfig"]
+    {'InputType': 'CSV', 'CSVHeaderLocation': 'FIRST_ROW'}
+
+    Or list the objects of a bucket:
+
+    >>> item_reader = ItemReader(
+    ...     resource=S3_LIST_OBJECTS,
+    ...     parameters={"Bucket": "my-bucket", "Prefix": "images/"},
+    ... )
+    """
+
+    __slots__ = (
+        "resource",
+        "parameters",
+        "input_type",
+        "csv_header_location",
+        "csv_headers",
+        "max_items",
+    )
+
+    def __init__(
+        self,
+        *,
+        parameters: Dict[str, Any],
+        resource: str = S3_GET_OBJECT,
+        input_type: Optional[str] = None,
+        csv_header_location: Optional[str] = None,
+        csv_headers: Optional[List[str]] = None,
+        max_items: Optional[int] = None,
+    ):
+        """Initialize an item reader.
+
+        Args:
+            parameters: The Bucket, and the Key of the object to read or the
+                Prefix of the objects to list. Keys ending with ".$" are
+                Reference Paths on the effective input of the Map State.
+            resource: `S3_GET_OBJECT` to read the items from an object, or
+                `S3_LIST_OBJECTS` to iterate over the objects of a bucket.
+            input_type: How to parse the object: "JSON" (an array), "JSONL",
+                or "CSV". Required when reading an object.
+            csv_header_location: "FIRST_ROW" (the default) to take the column
+                names from the first row of CSV objects, or "GIVEN" to pass
+                them as csv_headers.
+            csv_headers: The column names of CSV objects without a header row.
+            max_items: If set, read at most this many items.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the configuration is invalid.
+        """
+        if resource not in (S3_GET_OBJECT, S3_LIST_OBJECTS):
+            raise AWSStepFuncsValueError(
+                f'Unsupported ItemReader resource "{resource}"'
+            )
+        if resource == S3_GET_OBJECT and input_type not in INPUT_TYPES:
+            raise AWSStepFuncsValueError(
+                f"input_type must be one of: {', '.join(INPUT_TYPES)}"
+            )
+        if input_type == "CSV":
+            csv_header_location = csv_header_location or "FIRST_ROW"
+            if csv_header_location not in CSV_HEADER_LOCATIONS:
+                raise AWSStepFuncsValueError(
+                    "csv_header_location must be one of: "
+                    + ", ".join(CSV_HEADER_LOCATIONS)
+                )
+            if (csv_header_location == "GIVEN") != (csv_headers is not None):
+                raise AWSStepFuncsValueError(
+                    'csv_headers must be set when csv_header_location is "GIVEN"'
+                )
+        if max_items is not None and max_items < 0:
+            raise AWSStepFuncsValueError("max_items must not be negative")
+        self.resource = resource
+        self.parameters = parameters
+        self.input_type = input_type
+        self.csv_header_location = csv_header_location
+        self.csv_headers = csv_headers
+        self.max_items = max_items
+
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the item reader to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled item reader in Amazon States
+            Language.
+        """
+        reader_config: Dict[str, Any] = {}
+        if self.input_type is not None:
+            reader_config["InputType"] = self.input_type
+        if self.csv_header_location is not None:
+            reader_config["CSVHeaderLocation"] = self.csv_header_location
+        if self.csv_headers is not None:
+            reader_config["CSVHeaders"] = self.csv_headers
+        if self.max_items is not None:
+            reader_config["MaxItems"] = self.max_items
+        compiled: Dict[str, Any] = {"Resource": self.resource}
+        if reader_config:
+            compiled["ReaderConfig"] = reader_config
+        compiled["Parameters"] = self.parameters
+        return compiled
+
+    def read(self, s3: LocalS3, state_input: Any) -> Iterator[Any]:
+        """Stream the items from the local S3 stand-in.
+
+        Args:
+            s3: The local S3 stand-in.
+            state_input: The effective input of the Map State.
+
+        Raises:
+            ItemReaderFailedError: Raised when the object can't be found or
+                parsed.
+
+        Yields:
+            Each item.
+        """
+        parameters = _resolve_parameters(self.parameters, state_input)
+        try:
+            items = self._read(s3, parameters)
+            for index, item in enumerate(items):
+                if index == self.max_items:
+                    break
+                yield item
+        except (AWSStepFuncsValueError, OSError, UnicodeDecodeError, ValueError) as exc:
+            raise ItemReaderFailedError(str(exc)) from exc
+
+    def _read(self, s3: LocalS3, parameters: Dict[str, Any]) -> Iterator[Any]:
+        """Stream the items, whatever errors are raised.
+
+        Args:
+            s3: The local S3 stand-in.
+            parameters: The resolved parameters.
+
+        Yields:
+            Each item.
+        """
+        bucket = parameters.get("Bucket", "")
+        if self.resource == S3_LIST_OBJECTS:
+            yield from s3.list_objects(bucket, parameters.get("Prefix", ""))
+            return
+        with s3.open_object(bucket, parameters.get("Key", "")) as fp:
+            if self.input_type == "JSON":
+                yield from iter_json_array(fp.read)
+            elif self.input_type == "JSONL":
+                loads = get_json_backend().loads
+                for line in iter(fp.readline, b""):
+                    if line.strip():
+                        yield loads(line)
+            else:
+                rows = csv.reader(line.decode() for line in iter(fp.readline, b""))
+                headers = self.csv_headers
+                if headers is None:
+                    headers = next(rows, [])
+                for row in rows:
+                    yield dict(zip(headers, row))
+
+
+class ResultWriter:
+    """Write the results of the iterations of a Map State to Amazon S3.
+
+    >>> ResultWriter(parameters={"Bucket": "my-bucket", "Prefix": "runs"}).compile()
+    {'Resource': 'arn:aws:states:::s3:putObject', 'Parameters': {'Bucket': 'my-bucket', 'Prefix': 'runs'}}
+    """
+
+    __slots__ = ("resource", "parameters", "output_type", "results_per_shard")
+
+    def __init__(
+        self,
+        *,
+        parameters: Dict[str, Any],
+        resource: str = S3_PUT_OBJECT,
+        output_type: Optional[str] = None,
+        results_per_shard: int = RESULTS_PER_SHARD,
+    ):
+        """Initialize a result writer.
+
+        Args:
+            parameters: The Bucket and Prefix to write the results to. Keys
+                ending with ".$" are Reference Paths on the effective input of
+                the Map State.
+            resource: The resource writing the results, `S3_PUT_OBJECT`.
+            output_type: How to write the shards: "JSON" (an array, the
+                default) or "JSONL".
+            results_per_shard: How many results each shard holds at most when
+                simulating.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the configuration is invalid.
+        """
+        if resource != S3_PUT_OBJECT:
+            raise AWSStepFuncsValueError(
+                f'Unsupported ResultWriter resource "{resource}"'
+            )
+        if output_type is not None and output_type not in OUTPUT_TYPES:
+            raise AWSStepFuncsValueError(
+                f"output_type must be one of: {', '.join(OUTPUT_TYPES)}"
+            )
+        if results_per_shard <= 0:
+            raise AWSStepFuncsValueError("results_per_shard must be positive")
+        self.resource = resource
+        self.parameters = parameters
+        self.output_type = output_type
+        self.results_per_shard = results_per_shard
+
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
+        """Compile the result writer to Amazon States Language.
+
+        Returns:
+            A dictionary representing the compiled result writer in Amazon
+            States Language.
+        """
+        compiled: Dict[str, Any] = {"Resource": self.resource}
+        if self.output_type is not None:
+            compiled["WriterConfig"] = {"OutputType": self.output_type}
+        compiled["Parameters"] = self.parameters
+        return compiled
+
+    def write(
+        self,
+        s3: LocalS3,
+        state_input: Any,
+        map_run_arn: str,
+        results: Iterable[Tuple[Any, Any]],
+    ) -> Dict[str, Any]:
+        """Write results to the local S3 stand-in as they come.
+
+        Args:
+            s3: The local S3 stand-in.
+            state_input: The effective input of the Map State.
+            map_run_arn: The ARN of the Map Run, whose ID names the directory
+                of the results.
+            results: The item and output of each iteration.
+
+        Raises:
+            ResultWriterFailedError: Raised when the results can't be written.
+
+        Returns:
+            The output of the Map State: its Map Run ARN and where the
+            manifest of the results is.
+        """
+        parameters = _resolve_parameters(self.parameters, state_input)
+        bucket = parameters.get("Bucket", "")
+        prefix = parameters.get("Prefix", "")
+        directory = f"{prefix.rstrip('/')}/" if prefix else ""
+        directory += map_run_arn.rsplit("/", 1)[-1]
+        shards = self._write_shards(s3, bucket, directory, map_run_arn, results)
+        manifest = {
+            "DestinationBucket": bucket,
+            "MapRunArn": map_run_arn,
+            "ResultFiles": {"FAILED": [], "PENDING": [], "SUCCEEDED": shards},
+        }
+        manifest_key = f"{directory}/manifest.json"
+        with _reporting_write_errors(), s3.create_object(bucket, manifest_key) as fp:
+            fp.write(get_json_backend().dumps(manifest))
+        return {
+            "MapRunArn": map_run_arn,
+            "ResultWriterDetails": {"Bucket": bucket, "Key": manifest_key},
+        }
+
+    def _write_shards(
+        self,
+        s3: LocalS3,
+        bucket: str,
+        directory: str,
+        map_run_arn: str,
+        results: Iterable[Tuple[Any, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Write results to shards of at most `results_per_shard` results.
+
+        Args:
+            s3: The local S3 stand-in.
+            bucket: The bucket to write to.
+            directory: The key prefix of the shards.
+            map_run_arn: The ARN of the Map Run.
+            results: The item and output of each iteration.
+
+        Raises:
+            ResultWriterFailedError: Raised when a shard can't be written.
+
+        Returns:
+            The Key and Size of each shard.
+        """
+        dumps = get_json_backend().dumps
+        jsonl = self.output_type == "JSONL"
+        numbered_results = enumerate(results)
+        shards: List[Dict[str, Any]] = []
+        while (first := next(numbered_results, None)) is not None:
+            key = f"{directory}/SUCCEEDED_{len(shards)}.json"
+            shard_results = itertools.islice(
+                numbered_results, self.results_per_shard - 1
+            )
+            # Only the writes are reported as failures of the result writer:
+            # errors of the iterations producing the results are left alone
+            with ExitStack() as shard:
+                with _reporting_write_errors():
+                    fp = shard.enter_context(s3.create_object(bucket, key))
+                    fp.write(b"" if jsonl else b"[")
+                for index, (item, output) in itertools.chain([first], shard_results):
+                    record = {
+                        "ExecutionArn": f"{map_run_arn}:{index}",
+                        "Input": dumps(item).decode(),
+                        "Output": dumps(output).decode(),
+                        "Status": "SUCCEEDED",
+                    }
+                    with _reporting_write_errors():
+                        if not jsonl and fp.tell() > 1:
+                            fp.write(b",")
+                        fp.write(dumps(record) + (b"\n" if jsonl else b""))
+                with _reporting_write_errors():
+                    fp.write(b"" if jsonl else b"]")
+                    shards.append({"Key": key, "Size": fp.tell()})
+                    shard.close()
+        return shards
+
+
+@contextmanager
+def _reporting_write_errors() -> Iterator[None]:
+    """Report errors writing to the local S3 stand-in as result writer failures.
+
+    Raises:
+        ResultWriterFailedError: Raised when the local S3 stand-in can't be
+            written to.
+
+    Yields:
+        Nothing: the writes run in the block.
+    """
+    try:
+        yield
+    except (AWSStepFuncsValueError, OSError) as exc:
+        raise ResultWriterFailedError(str(exc)) from exc
+
+
+def new_map_run_arn(state_name: str) -> str:
+    """Return the ARN of a new simulated Map Run.
+
+    Args:
+        state_name: The name of the Map State.
+
+    Returns:
+        The ARN, ending with a new Map Run ID.
+    """
+    return f"arn:aws:states:local:000000000000:mapRun:{state_name}/{uuid.uuid4()}"
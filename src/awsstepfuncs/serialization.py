@@ -0,0 +1,318 @@
+"""Canonical JSON serialization of state machine definitions.
+
+The canonical form of a definition is minified JSON encoded as UTF-8 with the
+keys of every object sorted, so the same definition always serializes to the
+same bytes, whatever order its states were added or traversed in. Hashing the
+canonical form tells whether a definition changed since it was last deployed.
+
+Serializing (and parsing, when loading definitions) is pluggable: orjson is
+used if it is installed, and the standard library `json` module otherwise:
+
+>>> from awsstepfuncs.serialization import StdlibJSONBackend, set_json_backend
+>>> set_json_backend(StdlibJSONBackend())
+>>> get_json_backend().dumps({"b": [1, "é"], "a": None})
+b'{"a":null,"b":[1,"\\xc3\\xa9"]}'
+>>> set_json_backend("auto")
+
+Large JSON arrays, such as the items of a Map State, can be parsed one element
+at a time with `iter_json_array()` instead of loading them whole.
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from typing import Any, Callable, Optional, Union
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+
+
+class AbstractJSONBackend(ABC):
+    """Serialize data to canonical JSON and parse JSON.
+
+    Backends must produce minified JSON encoded as UTF-8, with sorted keys and
+    without escaping non-ASCII characters. Backends may still disagree on the
+    formatting of some floats (such as `1e16`), so only compare hashes computed
+    with the same backend.
+    """
+
+    name: str
+
+    @abstractmethod
+    def dumps(self, data: Any) -> bytes:
+        """Serialize data to canonical JSON.
+
+        Args:
+            data: The JSON-serializable data.
+
+        Returns:
+            The canonical JSON.
+        """
+
+    @abstractmethod
+    def loads(self, document: Union[str, bytes]) -> Any:
+        """Parse a JSON document.
+
+        Args:
+            document: The JSON document.
+
+        Returns:
+            The parsed data.
+        """
+
+
+class StdlibJSONBackend(AbstractJSONBackend):
+    """Serialize with the `json` module of the standard library."""
+
+    name = "json"
+
+    def dumps(self, data: Any) -> bytes:
+        """Serialize data to canonical JSON.
+
+        Args:
+            data: The JSON-serializable data.
+
+        Returns:
+            The canonical JSON.
+        """
+        import json
+
+        return json.dumps(
+            data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode()
+
+    def loads(self, document: Union[str, bytes]) -> Any:
+        """Parse a JSON document.
+
+        Args:
+            document: The JSON document.
+
+        Returns:
+            The parsed data.
+        """
+        import json
+
+        return json.loads(document)
+
+
+class OrjsonBackend(AbstractJSONBackend):
+    """Serialize with orjson, which is several times faster than `json`."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        """Initialize the orjson backend.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when orjson is not installed.
+        """
+        try:
+            import orjson
+        except ImportError:
+            raise AWSStepFuncsValueError("orjson is not installed") from None
+        self._orjson = orjson
+
+    def dumps(self, data: Any) -> bytes:
+        """Serialize data to canonical JSON.
+
+        Args:
+            data: The JSON-serializable data.
+
+        Returns:
+            The canonical JSON.
+        """
+        return self._orjson.dumps(data, option=self._orjson.OPT_SORT_KEYS)
+
+    def loads(self, document: Union[str, bytes]) -> Any:
+        """Parse a JSON document.
+
+        Args:
+            document: The JSON document.
+
+        Returns:
+            The parsed data.
+        """
+        return self._orjson.loads(document)
+
+
+def json_default(value: Any) -> Any:
+    """Convert a value that `json` can't serialize on its own, for `json.dumps()`.
+
+    Values that stand in for JSON data without holding it, such as lazily
+    parsed documents, convert themselves with a `__json__()` method:
+
+    >>> import json
+    >>> class Pair:
+    ...     def __json__(self):
+    ...         return [1, 2]
+    >>> json.dumps({"pair": Pair()}, default=json_default)
+    '{"pair": [1, 2]}'
+    >>> json.dumps({1, 2}, default=json_default)
+    Traceback (most recent call last):
+        ...
+    awsstepfuncs.errors.AWSStepFuncsValueError: set is not JSON serializable
+
+    Args:
+        value: The value.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the value isn't JSON-like data.
+
+    Returns:
+        The value as JSON-serializable data.
+    """
+    if (to_json := getattr(value, "__json__", None)) is not None:
+        return to_json()
+    raise AWSStepFuncsValueError(f"{type(value).__name__} is not JSON serializable")
+
+
+def snapshot_default(value: Any) -> Any:
+    """Convert a value like `json_default()`, without consuming iterators.
+
+    Iterators, such as generators in the state input or the `StreamedOutput`
+    of a Map State, can only be consumed once, by the states after them. They
+    are snapshotted as a marker naming their type instead:
+
+    >>> import json
+    >>> json.dumps({"items": iter([1, 2])}, default=snapshot_default)
+    '{"items": "<list_iterator>"}'
+
+    Args:
+        value: The value.
+
+    Returns:
+        The value as JSON-serializable data, or a marker for iterators.
+    """
+    if isinstance(value, Iterator):
+        return f"<{type(value).__name__}>"
+    return json_default(value)
+
+
+_backend: Optional[AbstractJSONBackend] = None
+
+# How many bytes `iter_json_array()` reads at a time
+CHUNK_SIZE = 1 << 16
+
+_JSON_WHITESPACE = " \t\n\r"
+_JSON_DELIMITERS = _JSON_WHITESPACE + ",]"
+
+
+def set_json_backend(backend: Union[str, AbstractJSONBackend]) -> None:
+    """Set the backend used to serialize canonical JSON and parse definitions.
+
+    Args:
+        backend: A backend, or the name of one: "json", "orjson", or "auto" to
+            use orjson if it is installed.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the backend name is unknown.
+    """
+    global _backend
+    if isinstance(backend, AbstractJSONBackend):
+        _backend = backend
+    elif backend == "auto":
+        _backend = None
+    elif backend == "json":
+        _backend = StdlibJSONBackend()
+    elif backend == "orjson":
+        _backend = OrjsonBackend()
+    else:
+        raise AWSStepFuncsValueError(f"Unknown JSON backend {backend!r}")
+
+
+def get_json_backend() -> AbstractJSONBackend:
+    """Return the backend used to serialize canonical JSON and parse definitions.
+
+    Returns:
+        The backend set with `set_json_backend()`, or else orjson if it is
+        installed, or else the standard library `json` module.
+    """
+    global _backend
+    if _backend is None:
+        try:
+            _backend = OrjsonBackend()
+        except AWSStepFuncsValueError:
+            _backend = StdlibJSONBackend()
+    return _backend
+
+
+def iter_json_array(  # noqa: CCR001
+    read: Callable[[int], bytes], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Any]:
+    """Parse the elements of a JSON array one by one as it is read.
+
+    Only the element being parsed is held in memory, so arrays much larger than
+    the available memory can be iterated over.
+
+    >>> import io
+    >>> document = io.BytesIO('[1, {"a": [2.5]}, "é", null]'.encode())
+    >>> list(iter_json_array(document.read, chunk_size=2))
+    [1, {'a': [2.5]}, 'é', None]
+
+    Args:
+        read: A function reading up to a number of bytes of UTF-8 encoded JSON,
+            such as the `read` method of a binary file or of an `mmap`.
+        chunk_size: How many bytes to read at a time.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when the JSON isn't an array.
+
+    Yields:
+        Each element of the array.
+    """
+    import codecs
+    import json
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    at_end = False
+
+    def read_more() -> None:
+        nonlocal buffer, position, at_end
+        chunk = read(chunk_size)
+        at_end = not chunk
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=at_end)
+        position = 0
+
+    def next_char() -> str:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _JSON_WHITESPACE:
+                position += 1
+            if position < len(buffer) or at_end:
+                return buffer[position : position + 1]
+            read_more()
+
+    if next_char() != "[":
+        raise AWSStepFuncsValueError("Expected a JSON array")
+    position += 1
+    if next_char() == "]":
+        position += 1
+    else:
+        while True:
+            next_char()
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError as exc:
+                    if at_end:
+                        raise AWSStepFuncsValueError(f"Invalid JSON: {exc}") from None
+                    read_more()
+                    continue
+                # A number cut at the end of the buffer (such as "1." of "1.5")
+                # may still parse, so the element must be followed by a
+                # delimiter
+                if at_end or (end < len(buffer) and buffer[end] in _JSON_DELIMITERS):
+                    break
+                read_more()
+            position = end
+            yield element
+            separator = next_char()
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise AWSStepFuncsValueError("Expected , or ] in JSON array")
+    if next_char():
+        raise AWSStepFuncsValueError("Unexpected data after the JSON array")
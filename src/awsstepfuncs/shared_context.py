@@ -0,0 +1,435 @@
+"""Read-only data shared with the processes running Map State iterations.
+
+Mocks run in processes of their own, and so do Map State iterations on the
+"process" backend, so any data they use is pickled and copied into every
+process that needs it: once per worker for data captured by mocks, and once
+per item for data in the items. Register large read-only data (lookup tables,
+configuration blobs, arrays) in a `SharedContext` instead. It is copied once
+into shared memory (see `multiprocessing.shared_memory`), and only a small
+handle naming it is pickled, which other processes map without copying:
+
+- `share_bytes()` shares a blob, read back as a read-only `memoryview`.
+- `share_table()` shares a mapping of keys to JSON-serializable values,
+  serialized into a blob with a sorted index of offsets. Looking up a key
+  binary-searches the index and parses only the value of that key.
+- `share_array()` shares an array supporting the buffer protocol, such as a
+  NumPy array or an `array.array`, read back as a memoryview or a NumPy array
+  over the shared memory.
+
+>>> import pickle
+>>> with SharedContext() as context:
+...     rates = context.share_table({"EUR": 1.08, "GBP": 1.27})
+...     rates["GBP"], len(pickle.loads(pickle.dumps(rates)))
+(1.27, 2)
+
+The shared memory is released when the context is closed, so the context must
+outlive the simulations using it.
+"""
+from __future__ import annotations
+
+import struct
+from collections.abc import Mapping
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.serialization import get_json_backend
+
+# A shared table is its number of keys, then an entry per key sorted by key,
+# then the keys and values serialized to JSON one after another
+TABLE_LENGTH = struct.Struct("<Q")
+# The offset of the key (followed by the value), and their lengths
+TABLE_ENTRY = struct.Struct("<QII")
+
+# The blocks mapped by handles from other processes, by name: they stay mapped
+# for the life of the process, so that views outlive the handles they came from
+# and unpickling the same handle again (e.g. once per item) doesn't remap it
+_attached: Dict[str, SharedMemory] = {}
+# The blocks created by contexts in this process (or before it was forked),
+# which stay registered with the resource tracker until they are unlinked
+_created: Set[str] = set()
+
+
+class SharedContext:
+    """Read-only data in shared memory, released when the context is closed."""
+
+    __slots__ = ("_memories",)
+
+    def __init__(self) -> None:
+        """Initialize an empty shared context."""
+        self._memories: List[SharedMemory] = []
+
+    def __enter__(self) -> SharedContext:
+        """Return the context, which is closed on exit.
+
+        Returns:
+            The context.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the context."""
+        self.close()
+
+    def share_bytes(self, data: bytes) -> SharedBytes:
+        """Copy a blob into shared memory.
+
+        Args:
+            data: The blob, or any bytes-like object.
+
+        Returns:
+            The handle of the shared blob.
+        """
+        data = memoryview(data).cast("B")
+        memory = self._allocate(len(data))
+        _buffer_of(memory)[: len(data)] = data
+        return SharedBytes(memory.name, len(data), memory=memory)
+
+    def share_table(self, table: Mapping[str, Any]) -> SharedTable:
+        """Serialize a lookup table into shared memory.
+
+        Args:
+            table: The table, whose keys are strings and whose values are
+                JSON-serializable.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when a key isn't a string.
+
+        Returns:
+            The handle of the shared table.
+        """
+        dumps = get_json_backend().dumps
+        entries: List[Tuple[bytes, bytes]] = []
+        for key, value in table.items():
+            if not isinstance(key, str):
+                raise AWSStepFuncsValueError("Shared table keys must be strings")
+            entries.append((key.encode(), dumps(value)))
+        entries.sort()
+
+        offset = TABLE_LENGTH.size + len(entries) * TABLE_ENTRY.size
+        memory = self._allocate(
+            offset + sum(len(key) + len(value) for key, value in entries)
+        )
+        buffer = _buffer_of(memory)
+        TABLE_LENGTH.pack_into(buffer, 0, len(entries))
+        for position, (key, value) in enumerate(entries):
+            TABLE_ENTRY.pack_into(
+                buffer,
+                TABLE_LENGTH.size + position * TABLE_ENTRY.size,
+                offset,
+                len(key),
+                len(value),
+            )
+            buffer[offset : offset + len(key)] = key
+            offset += len(key)
+            buffer[offset : offset + len(value)] = value
+            offset += len(value)
+        return SharedTable(memory.name, memory=memory)
+
+    def share_array(self, array: Any) -> SharedArray:
+        """Copy an array into shared memory.
+
+        Args:
+            array: The array, which must support the buffer protocol (such as
+                a NumPy array or an `array.array`) and be C-contiguous.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the array doesn't support the
+                buffer protocol or isn't C-contiguous.
+
+        Returns:
+            The handle of the shared array.
+        """
+        try:
+            view = memoryview(array)
+        except TypeError:
+            raise AWSStepFuncsValueError(
+                "Shared arrays must support the buffer protocol"
+            ) from None
+        if not view.c_contiguous:
+            raise AWSStepFuncsValueError("Shared arrays must be C-contiguous")
+        memory = self._allocate(view.nbytes)
+        _buffer_of(memory)[: view.nbytes] = view.cast("B")
+        return SharedArray(
+            memory.name, view.format, view.shape or (), view.nbytes, memory=memory
+        )
+
+    def close(self) -> None:
+        """Release the shared memory, after which the handles can't be read."""
+        for memory in self._memories:
+            try:
+                memory.close()
+            except BufferError:
+                # Views of the memory are still in use, and it is unmapped once
+                # they are gone
+                pass
+            memory.unlink()
+            _created.discard(memory.name)
+        self._memories.clear()
+
+    def _allocate(self, size: int) -> SharedMemory:
+        """Allocate a block of shared memory owned by the context.
+
+        Args:
+            size: The size of the block in bytes.
+
+        Returns:
+            The block.
+        """
+        # Blocks can't be empty
+        memory = SharedMemory(create=True, size=max(size, 1))
+        self._memories.append(memory)
+        _created.add(memory.name)
+        return memory
+
+
+def _buffer_of(memory: SharedMemory) -> memoryview:
+    """Return the memory of a mapped block.
+
+    Args:
+        memory: The block.
+
+    Returns:
+        The memory of the block.
+    """
+    buffer = memory.buf
+    assert buffer is not None, "The block should be mapped"
+    return buffer
+
+
+class _SharedBlock:
+    """The handle of a block of shared memory, mapped when first read."""
+
+    __slots__ = ("name", "_memory")
+
+    def __init__(self, name: str, *, memory: Optional[SharedMemory] = None):
+        """Initialize a handle.
+
+        Args:
+            name: The name of the block.
+            memory: The block, if already mapped.
+        """
+        self.name = name
+        self._memory = memory
+
+    @property
+    def _buffer(self) -> memoryview:
+        """The memory of the block, mapped on first access."""
+        if self._memory is None:
+            if (memory := _attached.get(self.name)) is None:
+                memory = _attached[self.name] = SharedMemory(name=self.name)
+                # Before Python 3.13, attaching also registers the block with
+                # the resource tracker, which would unlink it (and warn about a
+                # leak) when this process exits, although the context owns it
+                if self.name not in _created:
+                    resource_tracker.unregister(
+                        memory._name, "shared_memory"  # type: ignore
+                    )
+            self._memory = memory
+        return _buffer_of(self._memory)
+
+
+class SharedBytes(_SharedBlock):
+    """The handle of a blob in shared memory."""
+
+    __slots__ = ("size",)
+
+    def __init__(self, name: str, size: int, *, memory: Optional[SharedMemory] = None):
+        """Initialize the handle of a blob.
+
+        Args:
+            name: The name of the block.
+            size: The size of the blob in bytes.
+            memory: The block, if already mapped.
+        """
+        super().__init__(name, memory=memory)
+        self.size = size
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the handle only.
+
+        Returns:
+            How to rebuild the handle.
+        """
+        return (self.__class__, (self.name, self.size))
+
+    def __len__(self) -> int:
+        """Return the size of the blob.
+
+        Returns:
+            The size of the blob in bytes.
+        """
+        return self.size
+
+    @property
+    def buffer(self) -> memoryview:
+        """The blob, read-only and without copying it."""
+        return self._buffer[: self.size].toreadonly()
+
+
+class SharedTable(_SharedBlock, Mapping):
+    """The handle of a lookup table in shared memory."""
+
+    __slots__ = ()
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the handle only.
+
+        Returns:
+            How to rebuild the handle.
+        """
+        return (self.__class__, (self.name,))
+
+    def __getitem__(self, key: str) -> Any:
+        """Parse the value of a key.
+
+        Args:
+            key: The key.
+
+        Raises:
+            KeyError: Raised when the key isn't in the table.
+
+        Returns:
+            The value.
+        """
+        if (position := self._find(key)) is None:
+            raise KeyError(key)
+        offset, key_length, value_length = self._entry(position)
+        start = offset + key_length
+        return get_json_backend().loads(
+            bytes(self._buffer[start : start + value_length])
+        )
+
+    def __contains__(self, key: object) -> bool:
+        """Whether a key is in the table, without parsing its value.
+
+        Args:
+            key: The key.
+
+        Returns:
+            Whether the key is in the table.
+        """
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys.
+
+        Yields:
+            Each key, sorted by their UTF-8 encoding.
+        """
+        for position in range(len(self)):
+            offset, key_length, _ = self._entry(position)
+            yield bytes(self._buffer[offset : offset + key_length]).decode()
+
+    def __len__(self) -> int:
+        """Return the number of keys.
+
+        Returns:
+            The number of keys.
+        """
+        return TABLE_LENGTH.unpack_from(self._buffer)[0]
+
+    def __repr__(self) -> str:
+        """Return a representation which doesn't parse the table.
+
+        Returns:
+            The representation.
+        """
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+    def _entry(self, position: int) -> Tuple[int, int, int]:
+        """Read an entry of the index.
+
+        Args:
+            position: The position of the entry.
+
+        Returns:
+            The offset of the key, and the lengths of the key and the value.
+        """
+        return TABLE_ENTRY.unpack_from(
+            self._buffer, TABLE_LENGTH.size + position * TABLE_ENTRY.size
+        )
+
+    def _find(self, key: str) -> Optional[int]:
+        """Binary-search the index for a key.
+
+        Args:
+            key: The key.
+
+        Returns:
+            The position of the entry of the key, or None if it's missing.
+        """
+        encoded_key = key.encode()
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            offset, key_length, _ = self._entry(middle)
+            middle_key = bytes(self._buffer[offset : offset + key_length])
+            if middle_key == encoded_key:
+                return middle
+            if middle_key < encoded_key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+class SharedArray(_SharedBlock):
+    """The handle of an array in shared memory."""
+
+    __slots__ = ("format", "shape", "nbytes")
+
+    def __init__(
+        self,
+        name: str,
+        format: str,  # noqa: A002
+        shape: Tuple[int, ...],
+        nbytes: int,
+        *,
+        memory: Optional[SharedMemory] = None,
+    ):
+        """Initialize the handle of an array.
+
+        Args:
+            name: The name of the block.
+            format: The format of the elements, as in the `struct` module.
+            shape: The shape of the array.
+            nbytes: The size of the array in bytes.
+            memory: The block, if already mapped.
+        """
+        super().__init__(name, memory=memory)
+        self.format = format
+        self.shape = shape
+        self.nbytes = nbytes
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Pickle the handle only.
+
+        Returns:
+            How to rebuild the handle.
+        """
+        return (self.__class__, (self.name, self.format, self.shape, self.nbytes))
+
+    @property
+    def view(self) -> memoryview:
+        """The array as a read-only memoryview of its format and shape."""
+        view = self._buffer[: self.nbytes].toreadonly()
+        return view.cast(self.format, self.shape)  # type: ignore
+
+    def numpy(self) -> Any:
+        """Return the array as a read-only NumPy array, without copying it.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when NumPy is not installed.
+
+        Returns:
+            The NumPy array.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise AWSStepFuncsValueError("numpy is not installed") from None
+        return numpy.frombuffer(
+            self._buffer[: self.nbytes].toreadonly(), dtype=numpy.dtype(self.format)
+        ).reshape(self.shape)
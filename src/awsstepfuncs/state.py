@@ -18,16 +18,15 @@ There are two interesting methods common for many classes:
 from __future__ import annotations
 
 import json
+import sys
+import threading
 import time
 from abc import ABC
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping, Sized
 from datetime import datetime
 from json.decoder import JSONDecodeError
-from typing import Any, Callable, Dict, List, Optional
-
-import dateutil.parser
-import pause
-from lambda_local.context import Context as LambdaContext
-from lambda_local.main import call as lambda_call
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Union
 
 from awsstepfuncs.abstract_state import (
     AbstractInputPathOutputPathState,
@@ -44,17 +43,32 @@ from awsstepfuncs.errors import (
     StateSimulationError,
     TaskFailedError,
 )
-from awsstepfuncs.printer import Color, Style
+from awsstepfuncs.map_executor import (
+    MAP_BACKENDS,
+    StreamedOutput,
+    record_mock_cpu_time,
+    run_iterations,
+)
+from awsstepfuncs.printer import Color, Style, Verbosity
+from awsstepfuncs.reducers import Reducer
 from awsstepfuncs.reference_path import ReferencePath
+from awsstepfuncs.result_store import ResultStore
 from awsstepfuncs.state_machine import StateMachine
+from awsstepfuncs.trace import TraceEventType
 from awsstepfuncs.types import ResourceToMockFn
 
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.item_batcher import ItemBatcher
+    from awsstepfuncs.s3 import ItemReader, ResultWriter
+
 MAX_STATE_NAME_LENGTH = 128
 
 
 class TerminalStateMixin(ABC):
     """A mixin for blocking rshift for terminal states."""
 
+    __slots__ = ()
+
     def __rshift__(self, _: AbstractState, /) -> AbstractState:
         """Overload >> operator to set state execution order.
 
@@ -76,6 +90,8 @@ class TerminalStateMixin(ABC):
 class FailState(TerminalStateMixin, AbstractState):
     """The Fail State terminates the machine and marks it as a failure."""
 
+    __slots__ = ("error", "cause")
+
     state_type = "Fail"
 
     def __init__(self, *args: Any, error: str, cause: str, **kwargs: Any):
@@ -131,6 +147,8 @@ class SucceedState(TerminalStateMixin, AbstractInputPathOutputPathState):
     The Succeed State's output is the same as its input.
     """
 
+    __slots__ = ()
+
     state_type = "Succeed"
 
     def _execute(self, state_input: Any, resource_to_mock_fn: ResourceToMockFn) -> Any:
@@ -150,8 +168,18 @@ class SucceedState(TerminalStateMixin, AbstractInputPathOutputPathState):
 class ChoiceState(TerminalStateMixin, AbstractInputPathOutputPathState):
     """A Choice State adds branching logic to a state machine."""
 
+    __slots__ = ("choices", "default", "_chosen")
+
     state_type = "Choice"
 
+    # The next state is set when simulating but it isn't compiled
+    _untracked_attributes = AbstractInputPathOutputPathState._untracked_attributes | {
+        "next_state",
+        "_chosen",
+    }
+
+    _chosen: threading.local
+
     def __init__(
         self,
         *args: Any,
@@ -168,21 +196,45 @@ class ChoiceState(TerminalStateMixin, AbstractInputPathOutputPathState):
                 evaluate to true.
             kwargs: Kwargs to pass to parent classes.
         """
+        # Set before initializing parent classes, which set next_state
+        object.__setattr__(self, "_chosen", threading.local())
         super().__init__(*args, **kwargs)
         self.choices = choices
         self.default = default
 
-    def compile(self) -> Dict[str, Any]:  # noqa: A003 pragma: no cover
+    @property  # type: ignore
+    def next_state(self) -> Optional[AbstractState]:
+        """Return the state chosen by the last simulation in this thread.
+
+        The choice is kept per thread since iterations of a Map State can
+        run concurrently through the same Choice State.
+
+        Returns:
+            The next state, or None if no simulation chose one yet.
+        """
+        return getattr(self._chosen, "next_state", None)
+
+    @next_state.setter
+    def next_state(self, next_state: Optional[AbstractState]) -> None:
+        """Set the state chosen by a simulation in this thread.
+
+        Args:
+            next_state: The next state.
+        """
+        self._chosen.next_state = next_state
+
+    def compile(self) -> Dict[str, Any]:  # noqa: A003
         """Compile the state to Amazon States Language.
 
         Returns:
             A dictionary representing the compiled state in Amazon States
             Language.
         """
-        # TODO
         compiled = super().compile()
-        compiled.pop("End")  # Not correct for Choice State
-        return compiled  # pragma: no cover
+        compiled["Choices"] = [choice.compile() for choice in self.choices]
+        if default := self.default:
+            compiled["Default"] = default.name
+        return compiled
 
     def _execute(self, state_input: Any, resource_to_mock_fn: ResourceToMockFn) -> Any:
         """Execute the Choice State.
@@ -235,6 +287,8 @@ class WaitState(AbstractNextOrEndState):
     Refs: https://states-language.net/#wait-state
     """
 
+    __slots__ = ("seconds", "timestamp", "seconds_path", "timestamp_path")
+
     state_type = "Wait"
 
     def __init__(
@@ -344,6 +398,8 @@ class WaitState(AbstractNextOrEndState):
 
         elif (timestamp_path := self.timestamp_path) is not None:
             timestamp = timestamp_path.apply(state_input)
+            import dateutil.parser
+
             dt = dateutil.parser.parse(timestamp)
             self._wait_for_timestamp(dt)
 
@@ -356,6 +412,8 @@ class WaitState(AbstractNextOrEndState):
 
     def _wait_for_timestamp(self, timestamp: datetime) -> None:
         self.print(f"Waiting until {timestamp.isoformat()}", style=Style.DIM)
+        import pause
+
         pause.until(timestamp)
 
 
@@ -368,6 +426,8 @@ class PassState(AbstractParametersState):
     Path.
     """
 
+    __slots__ = ("result",)
+
     state_type = "Pass"
 
     def __init__(self, *args: Any, result: Any = None, **kwargs: Any):
@@ -414,6 +474,8 @@ class PassState(AbstractParametersState):
 class TaskState(AbstractRetryCatchState):
     """The Task State executes the work identified by the Resource field."""
 
+    __slots__ = ("resource", "timeout_seconds")
+
     state_type = "Task"
 
     def __init__(
@@ -434,7 +496,7 @@ class TaskState(AbstractRetryCatchState):
             kwargs: Kwargs to pass to parent classes.
         """
         super().__init__(*args, **kwargs)
-        self.resource = resource
+        self.resource = sys.intern(resource)
         self.timeout_seconds = timeout_seconds
 
     def compile(self) -> Dict[str, Any]:  # noqa: A003
@@ -470,17 +532,44 @@ class TaskState(AbstractRetryCatchState):
             The output of the state from executing the mock function given the
             state's input.
         """
-        mock_fn = resource_to_mock_fn[self.resource]
-        state_output = self._run_lambda_function(mock_fn, state_input)
+
+        def run_mock() -> Any:
+            mock_fn = resource_to_mock_fn[self.resource]
+            if self.profiler is not None:
+                return self.profiler.time_mock(
+                    self.resource,
+                    lambda: self._run_lambda_function(mock_fn, state_input),
+                )
+            return self._run_lambda_function(mock_fn, state_input)
+
+        if self.recorder:
+            state_output = self.recorder.invoke_mock(
+                self.resource, state_input, run_mock
+            )
+        else:
+            state_output = run_mock()
+        if self.trace is not None:
+            self.trace.emit(
+                TraceEventType.MOCK_INVOKED, self.name, self.resource, state_output
+            )
         if isinstance(state_output, dict) and (error := state_output.get("errorType")):
             raise TaskFailedError(error)
         else:
             return state_output
 
     def _run_lambda_function(self, lambda_fn: Callable, event: Any) -> Any:
-        output = lambda_call(
-            lambda_fn, event, LambdaContext(self.timeout_seconds or 60)
-        )[0]
+        # Starting the mock process costs CPU time which isn't spent simulating
+        start = time.thread_time_ns()
+        try:
+            # lambda_local is slow to import and only needed to simulate
+            from lambda_local.context import Context as LambdaContext
+            from lambda_local.main import call as lambda_call
+
+            output = lambda_call(
+                lambda_fn, event, LambdaContext(self.timeout_seconds or 60)
+            )[0]
+        finally:
+            record_mock_cpu_time(time.thread_time_ns() - start)
         try:
             return json.loads(output)
         except (TypeError, JSONDecodeError):
@@ -490,20 +579,61 @@ class TaskState(AbstractRetryCatchState):
 class ParallelState(AbstractRetryCatchState):
     """The Parallel State causes parallel execution of branches."""
 
+    __slots__ = ()
+
     state_type = "Parallel"
 
 
+# Guards building the iterators of Map States passed as functions
+_iterator_lock = threading.RLock()
+
+
 class MapState(AbstractRetryCatchState):
     """The Map State processes all the elements of an array."""
 
+    __slots__ = (
+        "_iterator",
+        "_iterator_factory",
+        "items_path",
+        "max_concurrency",
+        "item_reader",
+        "item_batcher",
+        "result_writer",
+        "backend",
+        "chunk_size",
+        "stream_output",
+        "reducer",
+        "output_memory_limit",
+    )
+
     state_type = "Map"
 
+    # Building the iterator on first access doesn't change the compiled state,
+    # and the other simulation options aren't compiled
+    _untracked_attributes = AbstractRetryCatchState._untracked_attributes | {
+        "_iterator",
+        "_iterator_factory",
+        "backend",
+        "chunk_size",
+        "stream_output",
+        "reducer",
+        "output_memory_limit",
+    }
+
     def __init__(
         self,
         *args: Any,
-        iterator: StateMachine,
+        iterator: Union[StateMachine, Callable[[], StateMachine]],
         items_path: str = "$",
         max_concurrency: int,
+        item_reader: Optional[ItemReader] = None,
+        item_batcher: Optional[ItemBatcher] = None,
+        result_writer: Optional[ResultWriter] = None,
+        backend: str = "thread",
+        chunk_size: int = 1,
+        stream_output: bool = False,
+        reducer: Optional[Union[str, Reducer]] = None,
+        output_memory_limit: Optional[int] = None,
         **kwargs: Any,
     ):
         """Initialize a Map State.
@@ -511,17 +641,118 @@ class MapState(AbstractRetryCatchState):
         Args:
             args: Args to pass to parent classes.
             iterator: The state machine which will process each element of the
-                array.
+                array, or a function returning it which is called the first
+                time the iterator is needed.
             items_path: A Reference Path identifying where in the effective
                 input the array field is found.
             max_concurrency: The upper bound on how many invocations of the
-                Iterator may run in parallel.
+                Iterator may run in parallel. 0 means no limit.
+            item_reader: If set, read the items from Amazon S3 instead of from
+                the effective input (see `awsstepfuncs.s3`).
+            item_batcher: If set, run the iterator once per batch of items
+                instead of once per item (see `awsstepfuncs.item_batcher`).
+            result_writer: If set, write the results of the iterations to
+                Amazon S3 and output where they are instead of the results.
+            backend: What to run iterations on when simulating: "thread",
+                "process", or "auto" to pick one of them by measuring the
+                first iterations (see `awsstepfuncs.map_executor`).
+            chunk_size: How many iterations to send to a worker process at a
+                time on the "process" backend.
+            stream_output: Whether to output a `StreamedOutput` when
+                simulating, which runs the iterations as the next states
+                consume it, instead of a list.
+            reducer: A reducer (or the name of a built-in one) combining the
+                outputs of the iterations into the output of the state when
+                simulating, instead of a list (see `awsstepfuncs.reducers`).
+            output_memory_limit: If set, how many bytes of outputs (serialized
+                to JSON) to keep in memory when simulating; further outputs
+                are spilled to disk (see `awsstepfuncs.result_store`).
             kwargs: Kwargs to pass to parent classes.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when the backend or reducer is
+                unknown, chunk_size isn't positive, max_concurrency or
+                output_memory_limit is negative,
+                or more than one of stream_output, reducer,
+                output_memory_limit, and result_writer are set.
         """
+        if backend not in MAP_BACKENDS:
+            raise AWSStepFuncsValueError(
+                f"backend must be one of: {', '.join(MAP_BACKENDS)}"
+            )
+        if chunk_size <= 0:
+            raise AWSStepFuncsValueError("chunk_size must be positive")
+        if max_concurrency < 0:
+            raise AWSStepFuncsValueError("max_concurrency must not be negative")
+        if output_memory_limit is not None and output_memory_limit < 0:
+            raise AWSStepFuncsValueError("output_memory_limit must not be negative")
+        if (
+            stream_output
+            + (reducer is not None)
+            + (output_memory_limit is not None)
+            + (result_writer is not None)
+            > 1
+        ):
+            raise AWSStepFuncsValueError(
+                "stream_output, reducer, output_memory_limit, and result_writer "
+                "can't be used together"
+            )
+        if isinstance(reducer, str):
+            reducer = Reducer.from_name(reducer)
         super().__init__(*args, **kwargs)
-        self.iterator = iterator
+        self._iterator: Optional[StateMachine] = None
+        self._iterator_factory: Optional[Callable[[], StateMachine]] = None
+        if isinstance(iterator, StateMachine):
+            self.iterator = iterator
+        else:
+            self._iterator_factory = iterator
         self.items_path = items_path
         self.max_concurrency = max_concurrency
+        self.item_reader = item_reader
+        self.item_batcher = item_batcher
+        self.result_writer = result_writer
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.stream_output = stream_output
+        self.reducer = reducer
+        self.output_memory_limit = output_memory_limit
+
+    @property
+    def iterator(self) -> StateMachine:
+        """Return the iterator, building it first if it was passed as a function.
+
+        Returns:
+            The state machine which processes each element of the array.
+        """
+        if self._iterator is None:
+            # Concurrent iterations of a parent Map State may get here at once
+            with _iterator_lock:
+                if self._iterator is None:
+                    self._iterator = self._iterator_factory()  # type: ignore
+                    self._iterator_factory = None
+        return self._iterator
+
+    @iterator.setter
+    def iterator(self, iterator: StateMachine) -> None:
+        """Replace the iterator.
+
+        Args:
+            iterator: The state machine which will process each element of the
+                array.
+        """
+        self._iterator = iterator
+        self._iterator_factory = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, with its iterator built.
+
+        The function building the iterator may not be picklable.
+
+        Returns:
+            The attributes of the state.
+        """
+        self.iterator
+        return super().__getstate__()
 
     def compile(self) -> Dict[str, Any]:  # noqa: A003
         """Compile the state to Amazon States Language.
@@ -533,36 +764,183 @@ class MapState(AbstractRetryCatchState):
         compiled = super().compile()
         compiled["ItemsPath"] = self.items_path
         compiled["MaxConcurrency"] = self.max_concurrency
+        if self.item_reader is not None:
+            compiled["ItemReader"] = self.item_reader.compile()
+        if self.item_batcher is not None:
+            compiled["ItemBatcher"] = self.item_batcher.compile()
+        if self.result_writer is not None:
+            compiled["ResultWriter"] = self.result_writer.compile()
+        compiled["Iterator"] = self.iterator.compile()
+        return compiled
+
+    def compile_cached(self) -> Dict[str, Any]:
+        """Compile the state, reusing the last compilation if nothing changed.
+
+        The iterator is compiled again every time, which is cheap since its
+        states are cached, so that changes to the iterator's states are
+        picked up.
+
+        Returns:
+            A dictionary representing the compiled state in Amazon States
+            Language.
+        """
+        compiled = dict(super().compile_cached())
         compiled["Iterator"] = self.iterator.compile()
         return compiled
 
     def _execute(self, state_input: Any, resource_to_mock_fn: ResourceToMockFn) -> Any:
         """Execute the Map State.
 
+        The items can be any array-like iterable, such as a generator in the
+        state input; they are pulled from it as iterations can start. With an
+        item reader, they are streamed from the local S3 stand-in instead.
+        With an item batcher, they are grouped into batches as they come, and
+        the iterator runs once per batch.
+
         Args:
             state_input: The input state data.
             resource_to_mock_fn: A mapping of resource URIs to mock functions to
                 use if the state performs a task.
 
         Raises:
-            StateSimulationError: Raised when items_path does not evaluate to a
-                list.
+            AWSStepFuncsValueError: Raised when reading items from or writing
+                results to Amazon S3 without an S3 stand-in directory.
+            StateSimulationError: Raised when items_path does not evaluate to an
+                array, an item doesn't fit in a batch, or with the error of the
+                first iteration that failed.
+                When streaming the output, the error is raised in the state
+                consuming it.
 
         Returns:
             The output of the state by running the iterator state machine for
-            all items.
+            all items (or batches), in the order of the items, or their
+            reduction, or where the result writer wrote them.
         """
-        items = ReferencePath(self.items_path).apply(state_input)
-        self.print(
-            f"Items after applying items_path of {self.items_path}: {items}",
-            style=Style.DIM,
+        if (self.item_reader or self.result_writer) and self.s3 is None:
+            raise AWSStepFuncsValueError(
+                f'Map State "{self.name}" uses Amazon S3, simulate it with s3_directory'
+            )
+        if self.item_reader is not None:
+            items = self.item_reader.read(self.s3, state_input)  # type: ignore
+        else:
+            items = ReferencePath(self.items_path).apply(state_input)
+            if self.trace is not None:
+                self.trace.emit(
+                    TraceEventType.PATH_APPLIED, self.name, "ItemsPath", items
+                )
+            self.print(
+                f"Items after applying items_path of {self.items_path}:",
+                items,
+                level=Verbosity.PAYLOADS,
+                style=Style.DIM,
+            )
+            if not isinstance(items, Iterable) or isinstance(
+                items, (str, bytes, Mapping)
+            ):
+                raise StateSimulationError("items_path must yield an array")
+        if self.item_batcher is not None:
+            items = self.item_batcher.batch(items)
+
+        iterator = self.iterator
+        iterator.print = self.print
+        iterator.recorder = self.recorder
+        iterator.history = self.history
+        iterator.trace = self.trace
+        iterator.metrics = self.metrics
+        iterator.profiler = self.profiler
+        iterator.s3 = self.s3
+        if self.result_writer is not None:
+            return self._write_results(
+                state_input, iterator, items, resource_to_mock_fn
+            )
+        outputs = self._run_iterations(iterator, items, resource_to_mock_fn)
+        if self.reducer is not None:
+            return self.reducer.reduce(outputs)
+        if self.stream_output:
+            return StreamedOutput(self._flush_after(outputs))
+        if self.output_memory_limit is not None:
+            store = ResultStore(self.output_memory_limit)
+            for output in outputs:
+                store.append(output)
+            return store.finish()
+        return list(outputs)
+
+    def _flush_after(self, outputs: Iterator[Any]) -> Iterator[Any]:
+        """Flush the printer once the outputs are consumed.
+
+        Streamed iterations can run after the simulation has ended and
+        flushed the printer, when the Map State is the last state.
+
+        Args:
+            outputs: The outputs of the iterations.
+
+        Yields:
+            The outputs.
+        """
+        try:
+            yield from outputs
+        finally:
+            self.print.flush()
+
+    def _write_results(
+        self,
+        state_input: Any,
+        iterator: StateMachine,
+        items: Iterable,
+        resource_to_mock_fn: ResourceToMockFn,
+    ) -> Dict[str, Any]:
+        """Run the iterator for each item, writing the results as they come.
+
+        Args:
+            state_input: The input state data.
+            iterator: The iterator, ready to run.
+            items: The items to run the iterator on.
+            resource_to_mock_fn: A mapping of resource URIs to mock functions to
+                use if the state performs a task.
+
+        Returns:
+            The Map Run ARN and where the results were written.
+        """
+        from awsstepfuncs.s3 import new_map_run_arn
+
+        # Items wait here until their iteration is done, which is at most as
+        # many items as the executor runs ahead
+        pending_items: Deque[Any] = deque()
+
+        def remember(items: Iterable) -> Iterator[Any]:
+            for item in items:
+                pending_items.append(item)
+                yield item
+
+        outputs = self._run_iterations(iterator, remember(items), resource_to_mock_fn)
+        return self.result_writer.write(  # type: ignore
+            self.s3,  # type: ignore
+            state_input,
+            new_map_run_arn(self.name),
+            ((pending_items.popleft(), output) for output in outputs),
         )
-        if not isinstance(items, list):
-            raise StateSimulationError("items_path must yield a list")
 
-        state_output = []
-        for item in items:
-            state_output.append(
-                self.iterator.simulate(item, resource_to_mock_fn=resource_to_mock_fn)
-            )
-        return state_output
+    def _run_iterations(
+        self,
+        iterator: StateMachine,
+        items: Iterable,
+        resource_to_mock_fn: ResourceToMockFn,
+    ) -> Iterator[Any]:
+        """Run the iterator for each item.
+
+        Args:
+            iterator: The iterator, ready to run.
+            items: The items to run the iterator on.
+            resource_to_mock_fn: A mapping of resource URIs to mock functions to
+                use if the state performs a task.
+
+        Yields:
+            The output of each iteration, in the order of the items.
+        """
+        n_items = len(items) if isinstance(items, Sized) else None
+        for output, duration in run_iterations(
+            self, iterator, items, n_items, resource_to_mock_fn
+        ):
+            if self.metrics is not None:
+                self.metrics.record(self.name, "Iteration", duration)
+            yield output
@@ -1,14 +1,49 @@
 from __future__ import annotations
 
+import gzip
+import hashlib
+import io
 import json
 from pathlib import Path
-from typing import Any, Dict, Optional, Set, Tuple, Union
-
-from awsstepfuncs.abstract_state import AbstractRetryCatchState, AbstractState, Catcher
+from time import perf_counter_ns
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from awsstepfuncs.abstract_state import (
+    SIMULATION_ATTRIBUTES,
+    AbstractRetryCatchState,
+    AbstractState,
+    Catcher,
+)
 from awsstepfuncs.errors import AWSStepFuncsValueError, StateSimulationError
-from awsstepfuncs.printer import Color, Printer, Style
+from awsstepfuncs.history import ExecutionHistory, HistoryEventType
+from awsstepfuncs.metrics import SimulationMetrics
+from awsstepfuncs.printer import Color, Printer, Style, Verbosity
+from awsstepfuncs.recording import (
+    AbstractExecutionLog,
+    ExecutionRecorder,
+    ExecutionReplayer,
+    serialize,
+)
+from awsstepfuncs.serialization import get_json_backend
+from awsstepfuncs.trace import AbstractTraceSink, JsonLinesSink, TraceEventType
 from awsstepfuncs.types import ResourceToMockFn
-from awsstepfuncs.visualization import Visualization
+
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.profiling import SimulationProfiler
+    from awsstepfuncs.s3 import LocalS3
+    from awsstepfuncs.validation import ValidationIssue
+    from awsstepfuncs.visualization import Visualization
 
 CompiledState = Dict[str, Union[str, bool, Dict[str, str], None]]
 
@@ -47,6 +82,87 @@ class StateMachine:
         self.comment = comment
         self.version = version
         self.print: Printer  # Used for simulations
+        self.recorder: Optional[AbstractExecutionLog] = None  # Used for simulations
+        self.history: Optional[ExecutionHistory] = None  # Used for simulations
+        self.trace: Optional[AbstractTraceSink] = None  # Used for simulations
+        self.metrics: Optional[SimulationMetrics] = None  # Used for simulations
+        self.profiler: Optional[SimulationProfiler] = None  # Used for simulations
+        self.s3: Optional[LocalS3] = None  # Used for simulations
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, without what is set for simulations.
+
+        Returns:
+            The attributes of the state machine.
+        """
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in SIMULATION_ATTRIBUTES
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore a pickled state machine, ready to be simulated again.
+
+        Args:
+            state: The attributes of the state machine.
+        """
+        self.__dict__.update(state)
+        for name in SIMULATION_ATTRIBUTES - {"print"}:
+            setattr(self, name, None)
+
+    @classmethod
+    def from_dict(cls, definition: Dict[str, Any]) -> StateMachine:
+        """Load a state machine from its Amazon States Language definition.
+
+        This is the inverse of `compile()`:
+
+        >>> from awsstepfuncs import PassState
+        >>> state_machine = StateMachine(start_state=PassState("Pass", result=1))
+        >>> StateMachine.from_dict(state_machine.compile()).compile() == state_machine.compile()
+        True
+
+        The iterators of Map States are only loaded when first needed.
+
+        Args:
+            definition: The parsed definition.
+
+        Returns:
+            The state machine.
+        """
+        from awsstepfuncs.loader import load_state_machine
+
+        return load_state_machine(definition)
+
+    @classmethod
+    def from_json(cls, source: Union[str, Path, IO]) -> StateMachine:
+        """Load a state machine from an Amazon States Language JSON file.
+
+        The file is parsed with the JSON backend (see
+        `awsstepfuncs.serialization.set_json_backend()`).
+
+        Args:
+            source: The path of the file, or a text or binary file object.
+
+        Returns:
+            The state machine.
+        """
+        from awsstepfuncs.loader import load_state_machine_json
+
+        return load_state_machine_json(source)
+
+    def validate(self) -> List[ValidationIssue]:
+        """Validate the compiled state machine against the Amazon States Language.
+
+        Every issue is collected instead of stopping at the first one (see
+        `awsstepfuncs.validation`).
+
+        Returns:
+            The issues found; empty if the state machine is valid.
+        """
+        from awsstepfuncs.validation import validate_definition
+
+        return validate_definition(self.compile())
 
     @property
     def all_states(self) -> Set[AbstractState]:
@@ -55,23 +171,42 @@ class StateMachine:
         Returns:
             A set of all possible states in the state machine.
         """
-        return self._all_states_recursive(self.start_state)
+        return set(self._reachable_states(self.start_state))
 
-    def _all_states_recursive(self, start_state: AbstractState) -> Set[AbstractState]:
-        """Return all states from the given starting state.
+    @staticmethod
+    def _reachable_states(start_state: AbstractState) -> List[AbstractState]:
+        """Return all states reachable from the given starting state.
+
+        States are reachable through Next, Catchers, and the Choices and
+        Default of Choice States. Loops back to a previous state are allowed.
 
         Args:
             start_state: The starting state.
 
         Returns:
-            All possible states from the given starting state.
+            All possible states from the given starting state, in a stable
+            depth-first order that follows Next first.
         """
-        all_states = set()
-        for state in start_state:
-            all_states.add(state)
+        visited: Set[AbstractState] = set()
+        all_states: List[AbstractState] = []
+        to_visit = [start_state]
+        while to_visit:
+            state = to_visit.pop()
+            if state in visited:
+                continue
+            visited.add(state)
+            all_states.append(state)
+            # Push in reverse order since the last state pushed is visited first
             if isinstance(state, AbstractRetryCatchState):
-                for catcher in state.catchers:
-                    all_states |= self._all_states_recursive(catcher.next_state)
+                to_visit.extend(
+                    catcher.next_state for catcher in reversed(state.catchers)
+                )
+            if hasattr(state, "choices"):
+                if default := state.default:  # type: ignore
+                    to_visit.append(default)
+                to_visit.extend(choice.next_state for choice in reversed(state.choices))  # type: ignore
+            if state.next_state is not None:
+                to_visit.append(state.next_state)
         return all_states
 
     def _has_unique_names(self) -> bool:
@@ -82,18 +217,25 @@ class StateMachine:
         Returns:
             Whether all states have unique names.
         """
-        all_state_names = [state.name for state in self.all_states]
-        return len(all_state_names) == len(set(all_state_names))
+        all_states = self._reachable_states(self.start_state)
+        return len(all_states) == len({state.name for state in all_states})
 
     def compile(self) -> Dict[str, Any]:  # noqa: A003
         """Compile a state machine to Amazon States Language.
 
+        Each state is only compiled again if it changed since the last time
+        (see `AbstractState.compile_cached()`), so the compiled states are
+        shared between calls and must not be mutated.
+
         Returns:
             A dictionary of the compiled state in Amazon States Language.
         """
         compiled = {
             "StartAt": self.start_state.name,
-            "States": {state.name: state.compile() for state in self.all_states},
+            "States": {
+                state.name: state.compile_cached()
+                for state in self._reachable_states(self.start_state)
+            },
         }
 
         if comment := self.comment:
@@ -104,15 +246,107 @@ class StateMachine:
 
         return compiled
 
-    def to_json(self, filename: Union[str, Path]) -> None:
+    def _iter_canonical_json(self) -> Iterator[bytes]:
+        """Serialize the state machine to canonical JSON piece by piece.
+
+        Yields:
+            Consecutive pieces of the canonical JSON.
+        """
+        dumps = get_json_backend().dumps
+        fields = {"StartAt": self.start_state.name, "States": None}
+        if comment := self.comment:
+            fields["Comment"] = comment
+        if version := self.version:
+            fields["Version"] = version
+
+        yield b"{"
+        for index, key in enumerate(sorted(fields)):
+            if index:
+                yield b","
+            yield dumps(key) + b":"
+            if key != "States":
+                yield dumps(fields[key])
+                continue
+            yield b"{"
+            states = sorted(self.all_states, key=lambda state: state.name)
+            for state_index, state in enumerate(states):
+                if state_index:
+                    yield b","
+                yield dumps(state.name) + b":" + dumps(state.compile_cached())
+            yield b"}"
+        yield b"}"
+
+    def definition_hash(self) -> str:
+        """Compute a digest of the canonical JSON of the state machine.
+
+        The canonical JSON is hashed as it is serialized, without being written
+        out. The digest is the SHA-256 of the output of
+        `to_json(..., canonical=True)`, so it can be compared with the hash of
+        the last deployed definition to skip deploying unchanged state machines.
+
+        >>> from awsstepfuncs import PassState
+        >>> state_machine = StateMachine(start_state=PassState("Pass"))
+        >>> len(state_machine.definition_hash())
+        64
+        >>> state_machine.definition_hash() == StateMachine(
+        ...     start_state=PassState("Pass")
+        ... ).definition_hash()
+        True
+
+        Returns:
+            The hex digest of the canonical JSON.
+        """
+        definition_hash = hashlib.sha256()
+        for piece in self._iter_canonical_json():
+            definition_hash.update(piece)
+        return definition_hash.hexdigest()
+
+    def to_json(
+        self, filename: Union[str, Path, IO], *, canonical: bool = False
+    ) -> None:
         """Compile to Amazon States Language and then output to JSON.
 
+        States are compiled and written one at a time, so the whole document is
+        never held in memory.
+
         Args:
-            filename: The name of the file to write the JSON to.
+            filename: The name of the file to write the JSON to, gzipped if it
+                ends with ".gz", or a text or binary file object to write to
+                (such as one opened with `gzip.open()`).
+            canonical: Whether to write canonical JSON, which is minified with
+                sorted states and keys so that the same definition is always
+                written the same way (see `awsstepfuncs.serialization`).
         """
-        filename = Path(filename)
-        with filename.open("w") as fp:
-            json.dump(self.compile(), fp)
+        if isinstance(filename, (str, Path)):
+            filename = Path(filename)
+            opener = gzip.open if filename.suffix == ".gz" else open
+            mode = "wb" if canonical else "wt"
+            with opener(filename, mode) as opened_fp:  # type: ignore
+                self.to_json(opened_fp, canonical=canonical)  # type: ignore
+            return
+
+        fp = filename
+        if canonical:
+            is_text = isinstance(fp, io.TextIOBase)
+            for piece in self._iter_canonical_json():
+                fp.write(piece.decode() if is_text else piece)  # type: ignore
+            return
+
+        if not isinstance(fp, io.TextIOBase):
+            fp = io.TextIOWrapper(fp, encoding="utf-8")  # type: ignore
+        fp.write(f'{{"StartAt": {json.dumps(self.start_state.name)}, "States": {{')
+        for index, state in enumerate(self._reachable_states(self.start_state)):
+            if index:
+                fp.write(", ")
+            fp.write(f"{json.dumps(state.name)}: {json.dumps(state.compile_cached())}")
+        fp.write("}")
+        if comment := self.comment:
+            fp.write(f', "Comment": {json.dumps(comment)}')
+        if version := self.version:
+            fp.write(f', "Version": {json.dumps(version)}')
+        fp.write("}")
+        if fp is not filename:
+            fp.detach()  # type: ignore  # Leave the binary file open
 
     def simulate(  # noqa: CCR001
         self,
@@ -123,6 +357,17 @@ class StateMachine:
         show_visualization: bool = False,
         visualization_output_path: str = "state_machine.gif",
         colorful: bool = False,
+        verbosity: Verbosity = Verbosity.PAYLOADS,
+        max_payload_length: Optional[int] = None,
+        record_to: Optional[Union[str, Path]] = None,
+        replay_from: Optional[Union[str, Path]] = None,
+        return_history: bool = False,
+        max_history_events: Optional[int] = None,
+        trace_to: Optional[Union[str, Path, AbstractTraceSink]] = None,
+        metrics: Optional[SimulationMetrics] = None,
+        profile: Union[bool, SimulationProfiler] = False,
+        s3_directory: Optional[Union[str, Path]] = None,
+        input_document: Optional[Union[str, Path, IO[bytes]]] = None,
     ) -> Any:
         """Simulate the state machine by executing all of the states.
 
@@ -136,10 +381,65 @@ class StateMachine:
             visualization_output_path: If show_visualization is set to `True`,
                 what path to save the visualization GIF to.
             colorful: Whether to make the simulation STDOUT messages ✨pop✨.
+            verbosity: How much to print to STDOUT, from nothing at all
+                (`Verbosity.SILENT`) to the state data after every step
+                (`Verbosity.PAYLOADS`, the default).
+            max_payload_length: If set, truncate printed state data longer than
+                this many characters.
+            record_to: If set, the path to record every state transition and
+                mock invocation to, so that the simulation can be replayed.
+            replay_from: If set, the path of a recording to replay. Recorded
+                mock outputs are used instead of calling the mocks, and the
+                simulation stops with a `ReplayDivergenceError` at the first
+                transition that doesn't match the recording.
+            return_history: Whether to return an `ExecutionHistory` of the
+                simulation instead of the final output. The final output is
+                available as its `output` attribute.
+            max_history_events: If return_history is set, only keep the last
+                `max_history_events` events in the history.
+            trace_to: If set, a trace sink to emit the events of the simulation
+                to, or the path of a JSON lines file to write them to. A sink is
+                flushed but not closed at the end of the simulation.
+            metrics: If set, time every phase of every state into these
+                metrics. Pass the same metrics to many simulations to aggregate
+                them.
+            profile: Whether to profile every state separately. Pass the same
+                `SimulationProfiler` to many simulations to aggregate them.
+                After the simulation, the profiler is available as the
+                `profiler` attribute of the state machine.
+            s3_directory: If set, a directory standing in for Amazon S3, which
+                Map States read their items from and write their results to
+                (see `awsstepfuncs.s3`).
+            input_document: If set, the path of a JSON document, or a binary
+                file to read it from, to pass to the first state instead of
+                state_input. The document is parsed lazily as states access it
+                (see `awsstepfuncs.lazy_json`), so a Map State can stream the
+                items of an array of a document too large to load. Setting
+                record_to, replay_from, return_history, or trace_to a path
+                loads the document whole, as they serialize the state data.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when both record_to and replay_from
+                are set, or both state_input and input_document.
 
         Returns:
-            The final output state from simulating the state machine.
+            The final output state from simulating the state machine, or its
+            execution history if return_history is set.
         """
+        if record_to and replay_from:
+            raise AWSStepFuncsValueError(
+                "Cannot both record and replay the same simulation"
+            )
+
+        if input_document is not None:
+            if state_input is not None:
+                raise AWSStepFuncsValueError(
+                    "Cannot pass both state_input and input_document"
+                )
+            from awsstepfuncs.lazy_json import open_document
+
+            state_input = open_document(input_document)
+
         if state_input is None:
             state_input = {}
 
@@ -148,49 +448,229 @@ class StateMachine:
 
         visualization = None
         if show_visualization:
+            from awsstepfuncs.visualization import Visualization
+
             visualization = Visualization(
                 start_state=self.start_state, output_path=visualization_output_path
             )
 
-        self.print = Printer(colorful=colorful)
+        self.print = Printer(
+            colorful=colorful,
+            verbosity=verbosity,
+            max_payload_length=max_payload_length,
+        )
+        self.recorder = None
+        if record_to:
+            self.recorder = ExecutionRecorder(record_to)
+        elif replay_from:
+            self.recorder = ExecutionReplayer(replay_from)
+        self.history = (
+            ExecutionHistory(max_events=max_history_events) if return_history else None
+        )
+        self.trace = (
+            JsonLinesSink(trace_to) if isinstance(trace_to, (str, Path)) else trace_to
+        )
+        self.metrics = metrics
+        if profile is True:
+            from awsstepfuncs.profiling import SimulationProfiler
+
+            profile = SimulationProfiler()
+        self.profiler = profile or None
+        self.s3 = None
+        if s3_directory is not None:
+            from awsstepfuncs.s3 import LocalS3
+
+            self.s3 = LocalS3(s3_directory)
+
+        try:
+            state_output = self._run(
+                state_input,
+                resource_to_mock_fn=resource_to_mock_fn,
+                visualization=visualization,
+            )
+        finally:
+            self.print.flush()
+            if self.recorder:
+                self.recorder.close()
+            if isinstance(trace_to, (str, Path)):
+                self.trace.close()  # type: ignore
+            elif self.trace is not None:
+                self.trace.flush()
+
+        if visualization:
+            visualization.render()
+
+        if self.history is not None:
+            return self.history
+        return state_output
+
+    def _run(
+        self,
+        state_input: Any,
+        *,
+        resource_to_mock_fn: ResourceToMockFn,
+        visualization: Optional[Visualization] = None,
+        start_state: Optional[AbstractState] = None,
+        raise_error: bool = False,
+    ) -> Any:
+        """Run the states of the state machine one after another.
 
+        `self.print`, `self.recorder`, `self.history`, `self.trace`,
+        `self.metrics`, `self.profiler`, and `self.s3` must be set before
+        running, either by `simulate()` or by a parent state (such as a Map
+        State) so that nested state machines share them.
+
+        Args:
+            state_input: Data to pass to the first state.
+            resource_to_mock_fn: A dictionary mapping Resource URI to a mock
+                function to use in the simulation.
+            visualization: The visualization to highlight states on, if any.
+            start_state: The state to start running from. Defaults to the start
+                state of the state machine.
+            raise_error: Whether to raise the error of the last state if it
+                failed without a catcher, such as when running the iterator of
+                a Map State, instead of returning an empty output.
+
+        Raises:
+            StateSimulationError: Raised when raise_error is set and the
+                execution failed.
+
+        Returns:
+            The final output state from running the state machine.
+        """
         current_data = state_input
-        current_state: Optional[AbstractState] = self.start_state
+        current_state: Optional[AbstractState] = start_state or self.start_state
         self.print(
-            "Starting simulation of state machine", color=Color.YELLOW, emoji="✨"
+            "Starting simulation of state machine",
+            level=Verbosity.SUMMARY,
+            color=Color.YELLOW,
+            emoji="✨",
         )
+        if self.recorder:
+            self.recorder.start_execution()
+        if self.history is not None:
+            self.history.start_execution(current_data)
+        if self.trace is not None:
+            self.trace.emit(TraceEventType.EXECUTION_STARTED, payload=current_data)
+        error: Optional[StateSimulationError] = None
 
         while current_state is not None:
             self.print(
-                f"Executing {current_state}",
+                "Executing",
+                current_state,
                 color=Color.BLUE,
                 style=Style.BRIGHT,
                 emoji="👷",
             )
-            self.print("State input:", current_data, style=Style.DIM)
+            self.print(
+                "State input:",
+                current_data,
+                level=Verbosity.PAYLOADS,
+                style=Style.DIM,
+            )
             if visualization:
                 visualization.highlight_state(current_state)
 
             current_state.print = self.print
-            next_state, next_data = self._simulate_state(
-                current_state,
-                state_input=current_data,
-                resource_to_mock_fn=resource_to_mock_fn,
-            )
+            current_state.recorder = self.recorder
+            current_state.history = self.history
+            current_state.trace = self.trace
+            current_state.metrics = self.metrics
+            current_state.profiler = self.profiler
+            current_state.s3 = self.s3
+            if self.recorder:
+                state_input_snapshot = serialize(current_data)
+            if self.history is not None:
+                self.history.add_event(
+                    HistoryEventType.STATE_ENTERED, current_state, current_data
+                )
+            if self.trace is not None:
+                self.trace.emit(
+                    TraceEventType.STATE_ENTERED,
+                    current_state.name,
+                    current_state.state_type,  # type: ignore
+                    current_data,
+                )
+            if self.metrics is not None:
+                start = perf_counter_ns()
+            if self.profiler is not None:
+                self.profiler.enter_state(current_state)
+            try:
+                next_state, next_data, error = self._simulate_state(
+                    current_state,
+                    state_input=current_data,
+                    resource_to_mock_fn=resource_to_mock_fn,
+                )
+            finally:
+                if self.profiler is not None:
+                    self.profiler.exit_state(current_state)
+            if self.metrics is not None:
+                self.metrics.record(
+                    current_state.name, "Total", perf_counter_ns() - start
+                )
 
             if visualization and next_state:
                 visualization.highlight_state_transition(current_state, next_state)
 
+            if self.history is not None:
+                if error:
+                    self.history.add_event(
+                        HistoryEventType.STATE_FAILED,
+                        current_state,
+                        ExecutionHistory.error_details(error),
+                    )
+                self.history.add_event(
+                    HistoryEventType.STATE_EXITED, current_state, next_data
+                )
+            if self.trace is not None:
+                self.trace.emit(
+                    TraceEventType.STATE_EXITED,
+                    current_state.name,
+                    current_state.state_type,  # type: ignore
+                    next_data,
+                )
+
+            if self.recorder:
+                self.recorder.record_transition(
+                    current_state.name,
+                    state_input_snapshot,
+                    next_data,
+                    next_state.name if next_state else None,
+                )
+
             current_state, current_data = next_state, next_data
-            self.print("State output:", current_data, style=Style.DIM)
+            self.print(
+                "State output:",
+                current_data,
+                level=Verbosity.PAYLOADS,
+                style=Style.DIM,
+            )
 
-        if visualization:
-            visualization.render()
+        if self.recorder:
+            self.recorder.end_execution(current_data)
+        if self.history is not None:
+            # The execution failed if the last state failed without a catcher
+            self.history.end_execution(current_data, error)
+        if self.trace is not None:
+            if error:
+                self.trace.emit(
+                    TraceEventType.EXECUTION_FAILED,
+                    payload=ExecutionHistory.error_details(error),
+                )
+            else:
+                self.trace.emit(
+                    TraceEventType.EXECUTION_SUCCEEDED, payload=current_data
+                )
 
         self.print(
-            "Terminating simulation of state machine", color=Color.YELLOW, emoji="😴"
+            "Terminating simulation of state machine",
+            level=Verbosity.SUMMARY,
+            color=Color.YELLOW,
+            emoji="😴",
         )
 
+        if raise_error and error is not None:
+            raise error
         return current_data
 
     def _simulate_state(
@@ -199,7 +679,7 @@ class StateMachine:
         *,
         state_input: Any,
         resource_to_mock_fn: ResourceToMockFn,
-    ) -> Tuple[Optional[AbstractState], Any]:
+    ) -> Tuple[Optional[AbstractState], Any, Optional[StateSimulationError]]:
         """Simulate a state, while handling input and output data and errors.
 
         Args:
@@ -209,7 +689,8 @@ class StateMachine:
                 function to use in the simulation.
 
         Returns:
-            The next state and the output data.
+            The next state, the output data, and the error raised by the state
+            if it failed.
         """
         try:
             state_output = (
@@ -219,12 +700,13 @@ class StateMachine:
         except StateSimulationError as exc:
             self.print(
                 f"{exc.__class__.__name__} encountered in state",
+                level=Verbosity.SUMMARY,
                 color=Color.RED,
                 emoji="❌",
             )
-            return self._check_for_retriers_and_catchers(state, error=exc)
+            return (*self._check_for_retriers_and_catchers(state, error=exc), exc)
         else:
-            return state.next_state, state_output
+            return state.next_state, state_output, None
 
     def _check_for_retriers_and_catchers(
         self, state: AbstractState, error: StateSimulationError
@@ -267,8 +749,16 @@ class StateMachine:
         if isinstance(state, AbstractRetryCatchState):
             for catcher in state.catchers:
                 if self._catcher_matches(catcher, error):
+                    if self.trace is not None:
+                        self.trace.emit(
+                            TraceEventType.CATCHER_MATCHED,
+                            state.name,
+                            catcher.next_state.name,
+                            ExecutionHistory.error_details(error),
+                        )
                     self.print(
-                        f"Found catcher, transitioning to {catcher.next_state}",
+                        "Found catcher, transitioning to",
+                        catcher.next_state,
                         color=Color.GREEN,
                         emoji="➡️",
                     )
@@ -0,0 +1,212 @@
+"""Synthetic state machines and payloads for benchmarks and stress tests.
+
+Everything is generated from a seed, so the same arguments always give the
+same workload:
+
+>>> from awsstepfuncs.synthetic import generate_payload, generate_state_machine
+>>> state_machine = generate_state_machine(42, n_states=50, map_depth=1)
+>>> state_machine.compile() == generate_state_machine(42, n_states=50, map_depth=1).compile()
+True
+>>> len(state_machine.compile()["States"])
+50
+
+Generated state machines are valid and can be simulated with payloads
+generated for the same Map nesting depth:
+
+- Every state is reachable: each state transitions to the one after it, and
+  the last state is a Succeed State.
+- Choice States branch forward on the "route" number of the payload and can
+  loop back to an earlier state when the payload has a "loop" field, which
+  generated payloads never have, so simulations always terminate.
+- Map States iterate over the "items" of the payload and put their results in
+  "results", and their iterators are generated state machines themselves.
+- Task States use `SYNTHETIC_RESOURCE`, which `identity_mock` can mock.
+"""
+from __future__ import annotations
+
+import random
+import string
+from typing import Any, Dict, List
+
+from awsstepfuncs.abstract_state import AbstractRetryCatchState, AbstractState
+from awsstepfuncs.choice import VariableChoice
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.state import ChoiceState, MapState, PassState, SucceedState, TaskState
+from awsstepfuncs.state_machine import StateMachine
+
+SYNTHETIC_RESOURCE = "arn:aws:lambda:us-east-1:123456789012:function:Synthetic"
+
+
+def identity_mock(event: Any, context: Any) -> Any:
+    """Mock `SYNTHETIC_RESOURCE` by returning the event unchanged.
+
+    Args:
+        event: The event passed to the mock.
+        context: The Lambda context.
+
+    Returns:
+        The event.
+    """
+    return event
+
+
+def generate_state_machine(
+    seed: int,
+    *,
+    n_states: int = 100,
+    choice_ratio: float = 0.2,
+    choice_branching: int = 2,
+    back_edge_ratio: float = 0.1,
+    task_ratio: float = 0.0,
+    map_ratio: float = 0.05,
+    map_depth: int = 0,
+    map_iterator_states: int = 5,
+    catcher_density: float = 0.1,
+) -> StateMachine:
+    """Generate a random but valid state machine.
+
+    Args:
+        seed: The seed of the random generator.
+        n_states: The number of states of the state machine, not counting the
+            states of Map State iterators.
+        choice_ratio: The probability that a state is a Choice State.
+        choice_branching: How many choices each Choice State has, besides its
+            default and any back-edge.
+        back_edge_ratio: The probability that a Choice State can loop back to
+            an earlier state.
+        task_ratio: The probability that a state is a Task State. Each Task
+            State runs a mock when simulated, which is slow.
+        map_ratio: The probability that a state is a Map State, if map_depth
+            allows it.
+        map_depth: How deeply Map States can be nested.
+        map_iterator_states: The number of states of each Map State iterator.
+        catcher_density: The probability that a Task or Map State has a
+            catch-all catcher transitioning to a later state.
+
+    Raises:
+        AWSStepFuncsValueError: Raised when n_states is not positive or the
+            state type ratios don't add up to at most 1.
+
+    Returns:
+        The generated state machine.
+    """
+    if n_states < 1 or map_iterator_states < 1:
+        raise AWSStepFuncsValueError("State machines must have at least one state")
+    if choice_ratio + task_ratio + map_ratio > 1:
+        raise AWSStepFuncsValueError(
+            "choice_ratio, task_ratio, and map_ratio must add up to at most 1"
+        )
+
+    rng = random.Random(seed)
+
+    def generate(prefix: str, n_states: int, map_depth: int) -> StateMachine:
+        states: List[AbstractState] = []
+        for index in range(n_states - 1):
+            name = f"{prefix}{index}"
+            roll = rng.random()
+            if roll < choice_ratio:
+                states.append(ChoiceState(f"{name} Choice", choices=[]))
+            elif roll < choice_ratio + task_ratio:
+                states.append(TaskState(f"{name} Task", resource=SYNTHETIC_RESOURCE))
+            elif roll < choice_ratio + task_ratio + map_ratio and map_depth:
+                iterator = generate(f"{name}.", map_iterator_states, map_depth - 1)
+                states.append(
+                    MapState(
+                        f"{name} Map",
+                        iterator=iterator,
+                        items_path="$.items",
+                        result_path="$.results",
+                        max_concurrency=0,
+                    )
+                )
+            else:
+                states.append(PassState(f"{name} Pass"))
+        states.append(SucceedState(f"{prefix}{n_states - 1} Succeed"))
+
+        for index, state in enumerate(states[:-1]):
+            following_state = states[index + 1]
+            if isinstance(state, ChoiceState):
+                if rng.random() < back_edge_ratio:
+                    state.choices.append(
+                        VariableChoice(
+                            variable="$.loop",
+                            is_present=True,
+                            next_state=states[rng.randrange(index + 1)],
+                        )
+                    )
+                for branch in range(choice_branching):
+                    state.choices.append(
+                        VariableChoice(
+                            variable="$.route",
+                            numeric_less_than=(branch + 1) / (choice_branching + 1),
+                            next_state=states[rng.randrange(index + 1, n_states)],
+                        )
+                    )
+                state.default = following_state
+            else:
+                state >> following_state
+
+            if (
+                isinstance(state, AbstractRetryCatchState)
+                and rng.random() < catcher_density
+            ):
+                state.add_catcher(
+                    ["States.ALL"],
+                    next_state=states[rng.randrange(index + 1, n_states)],
+                )
+
+        return StateMachine(start_state=states[0])
+
+    return generate("", n_states, map_depth)
+
+
+def generate_payload(
+    seed: int,
+    *,
+    n_keys: int = 5,
+    depth: int = 2,
+    n_items: int = 10,
+    map_depth: int = 0,
+) -> Dict[str, Any]:
+    """Generate a random payload for generated state machines.
+
+    >>> payload = generate_payload(42, n_keys=2, depth=1, n_items=3, map_depth=1)
+    >>> sorted(payload), len(payload["items"]), sorted(payload["items"][0])
+    (['data', 'items', 'route'], 3, ['data', 'route'])
+    >>> len(payload["data"])
+    2
+
+    Args:
+        seed: The seed of the random generator.
+        n_keys: How many keys each nested object of the "data" field has.
+        depth: How deeply the "data" field is nested.
+        n_items: How many items each list of Map State items has.
+        map_depth: How deeply lists of Map State items are nested; this should
+            match the map_depth of the generated state machine. Note that there
+            are n_items to the power of map_depth innermost items.
+
+    Returns:
+        The generated payload.
+    """
+    rng = random.Random(seed)
+
+    def generate_data(depth: int) -> Any:
+        if not depth:
+            return rng.choice(
+                [
+                    rng.randrange(1_000_000),
+                    rng.random(),
+                    "".join(rng.choices(string.ascii_letters, k=8)),
+                    rng.random() < 0.5,
+                    None,
+                ]
+            )
+        return {f"key{key}": generate_data(depth - 1) for key in range(n_keys)}
+
+    def generate(map_depth: int) -> Dict[str, Any]:
+        payload = {"route": rng.random(), "data": generate_data(depth)}
+        if map_depth:
+            payload["items"] = [generate(map_depth - 1) for _ in range(n_items)]
+        return payload
+
+    return generate(map_depth)
@@ -0,0 +1,267 @@
+"""Machine-readable traces of simulations.
+
+While a simulation runs, it emits typed events to a trace sink: the start and
+end of executions, states being entered and exited, the results of path
+processing (InputPath, ResultSelector, ResultPath, OutputPath, and ItemsPath),
+matched catchers, and mock invocations.
+
+Events are plain tuples (`TraceEvent`) until a sink serializes them, and
+nothing at all is allocated when a simulation is not traced.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Iterator
+from enum import Enum
+from pathlib import Path
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, TextIO, Union
+
+from awsstepfuncs.errors import AWSStepFuncsValueError
+from awsstepfuncs.serialization import snapshot_default
+
+
+class TraceEventType(Enum):
+    """All the different types of trace events."""
+
+    EXECUTION_STARTED = "ExecutionStarted"
+    EXECUTION_SUCCEEDED = "ExecutionSucceeded"
+    EXECUTION_FAILED = "ExecutionFailed"
+    STATE_ENTERED = "StateEntered"
+    STATE_EXITED = "StateExited"
+    PATH_APPLIED = "PathApplied"
+    CATCHER_MATCHED = "CatcherMatched"
+    MOCK_INVOKED = "MockInvoked"
+
+
+class TraceEvent(NamedTuple):
+    """An event of a simulation.
+
+    What `detail` and `payload` hold depends on the event type:
+
+    ====================  ==========================  ========================
+    Event type            detail                      payload
+    ====================  ==========================  ========================
+    EXECUTION_STARTED     None                        Execution input
+    EXECUTION_SUCCEEDED   None                        Execution output
+    EXECUTION_FAILED      None                        (error, cause)
+    STATE_ENTERED         State type                  State input
+    STATE_EXITED          State type                  State output
+    PATH_APPLIED          Field name, eg. InputPath   Data after the field
+    CATCHER_MATCHED       Name of the next state      (error, cause)
+    MOCK_INVOKED          Resource URI                Mock output
+    ====================  ==========================  ========================
+    """
+
+    timestamp: float
+    event_type: TraceEventType
+    state_name: Optional[str]
+    detail: Optional[str]
+    payload: Any
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the event to a JSON-serializable dictionary.
+
+        >>> TraceEvent(0.0, TraceEventType.STATE_ENTERED, "Pass", "Pass", {}).to_dict()
+        {'timestamp': 0.0, 'type': 'StateEntered', 'state': 'Pass', 'detail': 'Pass', 'payload': {}}
+
+        Returns:
+            The event as a dictionary.
+        """
+        return {
+            "timestamp": self.timestamp,
+            "type": self.event_type.value,
+            "state": self.state_name,
+            "detail": self.detail,
+            "payload": self.payload,
+        }
+
+
+class AbstractTraceSink(ABC):
+    """A destination for the trace events of simulations.
+
+    Subclasses implement `write()` to handle each event.
+    """
+
+    def emit(
+        self,
+        event_type: TraceEventType,
+        state_name: Optional[str] = None,
+        detail: Optional[str] = None,
+        payload: Any = None,
+    ) -> None:
+        """Emit a trace event to the sink.
+
+        Args:
+            event_type: The type of the event.
+            state_name: The name of the state of the event, if any.
+            detail: Extra information about the event, if any.
+            payload: The data of the event, if any.
+        """
+        self.write(TraceEvent(time.time(), event_type, state_name, detail, payload))
+
+    @abstractmethod
+    def write(self, event: TraceEvent) -> None:
+        """Handle a trace event.
+
+        Sinks that keep events after this returns must snapshot the payload,
+        since the simulation may mutate it afterwards.
+
+        Args:
+            event: The trace event.
+        """
+
+    def flush(self) -> None:
+        """Flush any buffered events."""
+
+    def close(self) -> None:
+        """Flush and release any resource held by the sink."""
+        self.flush()
+
+
+class NullSink(AbstractTraceSink):
+    """A trace sink that discards all events."""
+
+    def emit(
+        self,
+        event_type: TraceEventType,
+        state_name: Optional[str] = None,
+        detail: Optional[str] = None,
+        payload: Any = None,
+    ) -> None:
+        """Discard the event without creating it.
+
+        Args:
+            event_type: The type of the event.
+            state_name: The name of the state of the event, if any.
+            detail: Extra information about the event, if any.
+            payload: The data of the event, if any.
+        """
+
+    def write(self, event: TraceEvent) -> None:
+        """Discard the event.
+
+        Args:
+            event: The trace event.
+        """
+
+
+class RingBufferSink(AbstractTraceSink):
+    """Keep the latest trace events in memory.
+
+    >>> sink = RingBufferSink(max_events=2)
+    >>> for state_name in ["First", "Second", "Third"]:
+    ...     sink.emit(TraceEventType.STATE_ENTERED, state_name, "Pass", {})
+    >>> [event.state_name for event in sink]
+    ['Second', 'Third']
+    """
+
+    def __init__(self, max_events: int = 10_000):
+        """Initialize a ring buffer sink.
+
+        Args:
+            max_events: How many of the latest events to keep.
+
+        Raises:
+            AWSStepFuncsValueError: Raised when max_events is not positive.
+        """
+        if max_events <= 0:
+            raise AWSStepFuncsValueError("max_events must be a positive integer")
+        self.events: Deque[TraceEvent] = deque(maxlen=max_events)
+
+    def write(self, event: TraceEvent) -> None:
+        """Keep the event with a snapshot of its payload.
+
+        Args:
+            event: The trace event.
+        """
+        self.events.append(event._replace(payload=_copy_payload(event.payload)))
+
+    def __len__(self) -> int:
+        """Return the number of events kept.
+
+        Returns:
+            The number of events kept.
+        """
+        return len(self.events)
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        """Iterate over the kept events from the oldest one.
+
+        Returns:
+            An iterator over the kept events.
+        """
+        return iter(self.events)
+
+
+def _copy_payload(payload: Any) -> Any:
+    """Deep copy a payload, snapshotting iterators without consuming them.
+
+    >>> _copy_payload({"items": iter([1]), "run": [1, 2]})
+    {'items': '<list_iterator>', 'run': [1, 2]}
+
+    Args:
+        payload: The payload.
+
+    Returns:
+        The copy.
+    """
+    if isinstance(payload, Iterator):
+        return snapshot_default(payload)
+    if isinstance(payload, dict):
+        return {key: _copy_payload(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [_copy_payload(value) for value in payload]
+    return copy.deepcopy(payload)
+
+
+class JsonLinesSink(AbstractTraceSink):
+    """Write trace events to a JSON lines file.
+
+    Each event is serialized as soon as it is written and serialized events are
+    buffered, so the file is written in chunks.
+    """
+
+    def __init__(self, fp: Union[str, Path, TextIO], *, buffer_size: int = 64 * 1024):
+        """Initialize a JSON lines sink.
+
+        Args:
+            fp: A path or a text file object to write to. A path is opened (and
+                truncated) right away and closed by `close()`.
+            buffer_size: How many characters to buffer before writing to the
+                file.
+        """
+        self._owns_fp = isinstance(fp, (str, Path))
+        self.fp: TextIO = Path(fp).open("w") if isinstance(fp, (str, Path)) else fp
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._buffered = 0
+
+    def write(self, event: TraceEvent) -> None:
+        """Serialize the event and buffer it.
+
+        Args:
+            event: The trace event.
+        """
+        line = json.dumps(event.to_dict(), default=snapshot_default) + "\n"
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered events to the file."""
+        if self._buffer:
+            self.fp.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self.fp.flush()
+
+    def close(self) -> None:
+        """Flush the buffered events and close the file if the sink opened it."""
+        self.flush()
+        if self._owns_fp:
+            self.fp.close()
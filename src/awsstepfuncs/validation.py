@@ -0,0 +1,404 @@
+"""Validation of Amazon States Language definitions.
+
+The validator checks a definition against the rules of the Amazon States
+Language in a single pass over its states, collecting every problem instead of
+stopping at the first one, then checks that every state is reachable from
+StartAt with one walk over the transitions collected during that pass:
+
+>>> issues = validate_definition(
+...     {
+...         "StartAt": "Start",
+...         "States": {
+...             "Start": {"Type": "Pass", "Next": "Missing"},
+...             "Orphan": {"Type": "Wait"},
+...         },
+...     }
+... )
+>>> for issue in issues:
+...     print(issue)
+Start: Next refers to unknown state "Missing"
+Orphan: Wait States must have Next or End
+Orphan: Wait States must have exactly one of Seconds, Timestamp, SecondsPath, TimestampPath
+Orphan: State is not reachable from StartAt
+
+Definitions can be raw dictionaries (parsed ASL) or state machines built in
+Python, which are compiled first. Use `validate_many()` to validate a large
+number of definitions, for example every definition of a repository in CI,
+across a pool of processes.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from awsstepfuncs.serialization import get_json_backend
+
+if TYPE_CHECKING:  # pragma: no cover
+    from awsstepfuncs.state_machine import StateMachine
+
+Definition = Union[Dict[str, Any], "StateMachine", str, Path]
+
+# The field defining a transition, such as "Next", and the name of its target
+_Transition = Tuple[str, Any]
+
+STATE_MACHINE_FIELDS = frozenset(
+    {"StartAt", "States", "Comment", "Version", "TimeoutSeconds"}
+)
+BRANCH_FIELDS = frozenset({"StartAt", "States", "Comment", "ProcessorConfig"})
+
+_IO = {"Type", "Comment", "InputPath", "OutputPath"}
+_NEXT_OR_END = {"Next", "End"}
+_RESULT = {"ResultPath", "Parameters", "ResultSelector", "Retry", "Catch"}
+
+# The fields allowed in each type of state
+STATE_FIELDS: Dict[str, frozenset] = {
+    "Pass": frozenset(_IO | _NEXT_OR_END | {"ResultPath", "Parameters", "Result"}),
+    "Task": frozenset(
+        _IO
+        | _NEXT_OR_END
+        | _RESULT
+        | {
+            "Resource",
+            "TimeoutSeconds",
+            "TimeoutSecondsPath",
+            "HeartbeatSeconds",
+            "HeartbeatSecondsPath",
+            "Credentials",
+        }
+    ),
+    "Choice": frozenset(_IO | {"Choices", "Default"}),
+    "Wait": frozenset(
+        _IO | _NEXT_OR_END | {"Seconds", "Timestamp", "SecondsPath", "TimestampPath"}
+    ),
+    "Succeed": frozenset(_IO),
+    "Fail": frozenset({"Type", "Comment", "Error", "Cause", "ErrorPath", "CausePath"}),
+    "Parallel": frozenset(_IO | _NEXT_OR_END | _RESULT | {"Branches"}),
+    "Map": frozenset(
+        _IO
+        | _NEXT_OR_END
+        | _RESULT
+        | {
+            "Iterator",
+            "ItemProcessor",
+            "ItemsPath",
+            "ItemReader",
+            "ItemSelector",
+            "ItemBatcher",
+            "ResultWriter",
+            "MaxConcurrency",
+            "MaxConcurrencyPath",
+            "ToleratedFailurePercentage",
+            "ToleratedFailureCount",
+            "Label",
+        }
+    ),
+}
+
+# States that end the execution (or branch) and can't have Next or End
+TERMINAL_STATE_TYPES = frozenset({"Choice", "Succeed", "Fail"})
+
+WAIT_FIELDS = ("Seconds", "Timestamp", "SecondsPath", "TimestampPath")
+
+
+class ValidationIssue:
+    """A problem found in a definition."""
+
+    __slots__ = ("state_path", "message")
+
+    def __init__(self, state_path: Tuple[str, ...], message: str):
+        """Initialize a validation issue.
+
+        Args:
+            state_path: The names of the state with the problem, starting with
+                the Map or Parallel States it is nested in. Empty if the
+                problem is with the state machine itself.
+            message: A description of the problem.
+        """
+        self.state_path = state_path
+        self.message = message
+
+    def __str__(self) -> str:
+        """Return a human-readable description of the issue.
+
+        Returns:
+            The state path and the message.
+        """
+        if not self.state_path:
+            return self.message
+        return f"{' > '.join(self.state_path)}: {self.message}"
+
+    def __repr__(self) -> str:
+        """Return a string representation of the issue.
+
+        Returns:
+            A string representing the issue.
+        """
+        return f"{self.__class__.__name__}({self.state_path!r}, {self.message!r})"
+
+    def __eq__(self, other: object) -> bool:
+        """Compare issues by state path and message.
+
+        Args:
+            other: The object to compare with.
+
+        Returns:
+            Whether both issues are the same.
+        """
+        if not isinstance(other, ValidationIssue):
+            return NotImplemented
+        return (self.state_path, self.message) == (other.state_path, other.message)
+
+
+class _Validator:
+    """Validate a definition, accumulating the issues found."""
+
+    def __init__(self) -> None:
+        """Initialize a validator without issues."""
+        self.issues: List[ValidationIssue] = []
+        self.state_names: Set[str] = set()
+
+    def report(self, state_path: Tuple[str, ...], message: str) -> None:
+        """Record an issue.
+
+        Args:
+            state_path: The names of the state with the problem.
+            message: A description of the problem.
+        """
+        self.issues.append(ValidationIssue(state_path, message))
+
+    def validate_machine(
+        self,
+        definition: Any,
+        parent_path: Tuple[str, ...],
+        allowed_fields: frozenset,
+    ) -> None:
+        """Validate a state machine, or a nested one such as a Map iterator.
+
+        Args:
+            definition: The definition of the state machine.
+            parent_path: The names of the states the state machine is nested in.
+            allowed_fields: The fields allowed at the top of the definition.
+        """
+        if not isinstance(definition, dict):
+            self.report(parent_path, "State machine definitions must be objects")
+            return
+        for field in sorted(definition.keys() - allowed_fields):
+            self.report(parent_path, f'Unknown field "{field}"')
+        states = definition.get("States")
+        if not isinstance(states, dict) or not states:
+            self.report(parent_path, "States must be a non-empty object")
+            return
+        start_at: Any = definition.get("StartAt")
+        if start_at not in states:
+            self.report(parent_path, f'StartAt refers to unknown state "{start_at}"')
+
+        transitions: Dict[str, List[_Transition]] = {}
+        for name, state in states.items():
+            state_path = (*parent_path, name)
+            if name in self.state_names:
+                self.report(state_path, "State names must be unique")
+            self.state_names.add(name)
+            if not isinstance(state, dict):
+                self.report(state_path, "States must be objects")
+                continue
+            targets = transitions[name] = []
+            self.validate_state(state, state_path, targets)
+            for field, target in targets:
+                if target not in states:
+                    self.report(
+                        state_path, f'{field} refers to unknown state "{target}"'
+                    )
+
+        if start_at in states:
+            reachable = {start_at}
+            to_visit = [start_at]
+            while to_visit:
+                for _, target in transitions.get(to_visit.pop(), []):
+                    if target in states and target not in reachable:
+                        reachable.add(target)
+                        to_visit.append(target)
+            for name in states:
+                if name not in reachable:
+                    self.report(
+                        (*parent_path, name), "State is not reachable from StartAt"
+                    )
+
+    def validate_state(
+        self,
+        state: Dict[str, Any],
+        state_path: Tuple[str, ...],
+        targets: List[_Transition],
+    ) -> None:
+        """Validate a state, collecting its transitions.
+
+        Args:
+            state: The definition of the state.
+            state_path: The names of the state, starting with the states it is
+                nested in.
+            targets: The list to append the (field, state name) of each
+                transition of the state to.
+        """
+        state_type = state.get("Type")
+        if state_type not in STATE_FIELDS:
+            self.report(state_path, f'Unknown state type "{state_type}"')
+            return
+        for field in sorted(state.keys() - STATE_FIELDS[state_type]):
+            self.report(state_path, f'Unknown field "{field}" in {state_type} State')
+
+        # Next and End aren't allowed fields of terminal states, so they were
+        # reported as unknown fields already
+        if state_type not in TERMINAL_STATE_TYPES:
+            if "Next" in state:
+                if state.get("End"):
+                    self.report(
+                        state_path, f"{state_type} States can't have Next and End"
+                    )
+                targets.append(("Next", state["Next"]))
+            elif not state.get("End"):
+                self.report(state_path, f"{state_type} States must have Next or End")
+
+        if state_type == "Task" and not isinstance(state.get("Resource"), str):
+            self.report(state_path, "Task States must have a Resource")
+        elif state_type == "Wait":
+            if sum(field in state for field in WAIT_FIELDS) != 1:
+                self.report(
+                    state_path,
+                    "Wait States must have exactly one of " + ", ".join(WAIT_FIELDS),
+                )
+        elif state_type == "Choice":
+            self.validate_choices(state, state_path, targets)
+        elif state_type == "Map":
+            if "Iterator" in state and "ItemProcessor" in state:
+                self.report(
+                    state_path, "Map States can't have both Iterator and ItemProcessor"
+                )
+            iterator = state.get("ItemProcessor", state.get("Iterator"))
+            if iterator is None:
+                self.report(state_path, "Map States must have an ItemProcessor")
+            else:
+                self.validate_machine(iterator, state_path, BRANCH_FIELDS)
+        elif state_type == "Parallel":
+            branches = state.get("Branches")
+            if not isinstance(branches, list) or not branches:
+                self.report(state_path, "Parallel States must have Branches")
+            else:
+                for branch in branches:
+                    self.validate_machine(branch, state_path, BRANCH_FIELDS)
+
+        for field in ("Retry", "Catch"):
+            if field in state:
+                self.validate_error_handlers(state, field, state_path, targets)
+
+    def validate_choices(
+        self,
+        state: Dict[str, Any],
+        state_path: Tuple[str, ...],
+        targets: List[_Transition],
+    ) -> None:
+        """Validate the choices of a Choice State, collecting their transitions.
+
+        Args:
+            state: The definition of the Choice State.
+            state_path: The names of the state.
+            targets: The list to append the transitions to.
+        """
+        choices = state.get("Choices")
+        if not isinstance(choices, list) or not choices:
+            self.report(state_path, "Choice States must have Choices")
+            choices = []
+        for choice in choices:
+            if not isinstance(choice, dict) or "Next" not in choice:
+                self.report(state_path, "Each choice must have Next")
+            else:
+                targets.append(("Choice Next", choice["Next"]))
+        if "Default" in state:
+            targets.append(("Default", state["Default"]))
+
+    def validate_error_handlers(
+        self,
+        state: Dict[str, Any],
+        field: str,
+        state_path: Tuple[str, ...],
+        targets: List[_Transition],
+    ) -> None:
+        """Validate the Retriers or Catchers of a state.
+
+        Args:
+            state: The definition of the state.
+            field: "Retry" or "Catch".
+            state_path: The names of the state.
+            targets: The list to append the transitions of Catchers to.
+        """
+        error_handlers = state[field]
+        if not isinstance(error_handlers, list):
+            self.report(state_path, f"{field} must be an array")
+            return
+        kind = "Retrier" if field == "Retry" else "Catcher"
+        for index, error_handler in enumerate(error_handlers):
+            if not isinstance(error_handler, dict):
+                self.report(state_path, f"Each {kind} must be an object")
+                continue
+            error_equals = error_handler.get("ErrorEquals")
+            if not isinstance(error_equals, list) or not error_equals:
+                self.report(state_path, f"{field} must have a non-empty ErrorEquals")
+            elif "States.ALL" in error_equals and (
+                len(error_equals) > 1 or index != len(error_handlers) - 1
+            ):
+                self.report(
+                    state_path,
+                    f'"States.ALL" must appear alone in the last {field} ErrorEquals',
+                )
+            if field == "Catch":
+                if "Next" not in error_handler:
+                    self.report(state_path, "Each Catcher must have Next")
+                else:
+                    targets.append(("Catch Next", error_handler["Next"]))
+
+
+def validate_definition(definition: Definition) -> List[ValidationIssue]:
+    """Validate a definition, collecting every issue found.
+
+    Args:
+        definition: The definition as a dictionary, a state machine, or the
+            path of a JSON file.
+
+    Returns:
+        The issues found, in the order of the states; empty if the definition
+        is valid.
+    """
+    from awsstepfuncs.state_machine import StateMachine  # noqa: F811
+
+    if isinstance(definition, (str, Path)):
+        definition = get_json_backend().loads(Path(definition).read_bytes())
+    elif isinstance(definition, StateMachine):
+        definition = definition.compile()
+    validator = _Validator()
+    validator.validate_machine(definition, (), STATE_MACHINE_FIELDS)
+    return validator.issues
+
+
+def validate_many(
+    definitions: Iterable[Definition],
+    *,
+    max_workers: Optional[int] = None,
+    chunksize: int = 16,
+) -> List[List[ValidationIssue]]:
+    """Validate many definitions across a pool of processes.
+
+    Pass the paths of JSON files rather than parsed definitions so that each
+    file is read and parsed in the worker process.
+
+    Args:
+        definitions: The definitions to validate.
+        max_workers: The number of processes. If 1, definitions are validated
+            in the current process. Defaults to the number of CPUs.
+        chunksize: How many definitions are sent to a process at a time.
+
+    Returns:
+        The issues of each definition, in the order of the definitions.
+    """
+    if max_workers == 1:
+        return [validate_definition(definition) for definition in definitions]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(validate_definition, definitions, chunksize=chunksize))
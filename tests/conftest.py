@@ -3,6 +3,8 @@ from io import StringIO
 
 import pytest
 
+from awsstepfuncs import PassState, StateMachine, TaskState
+
 
 @pytest.fixture()
 def capture_stdout():
@@ -13,3 +15,26 @@ def capture_stdout():
             return fp.getvalue()
 
     return _capture_stdout
+
+
+@pytest.fixture()
+def resource():
+    return "arn:aws:lambda:ap-southeast-2:710187714096:function:TimesTwo"
+
+
+def times_two(event, context):
+    event["foo"] *= 2
+    return event
+
+
+@pytest.fixture()
+def mock_fn():
+    return times_two
+
+
+@pytest.fixture()
+def state_machine(resource):
+    pass_state = PassState("Pass", result_path="$.result", result={"bar": 1})
+    task_state = TaskState("Times Two", resource=resource)
+    pass_state >> task_state
+    return StateMachine(start_state=pass_state)
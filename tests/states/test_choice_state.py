@@ -145,3 +145,67 @@ State output: {}
 Terminating simulation of state machine
 """
     )
+
+
+def test_choice_state_compile():
+    public_state = PassState("Public")
+    value_in_twenties_state = PassState("ValueInTwenties")
+    start_audit_state = PassState("StartAudit")
+    record_event_state = PassState("RecordEvent")
+    start_audit_state >> record_event_state
+    choice_state = ChoiceState(
+        "DispatchEvent",
+        choices=[
+            NotChoice(
+                variable="$.type",
+                string_equals="Private",
+                next_state=public_state,
+            ),
+            AndChoice(
+                [
+                    ChoiceRule(variable="$.value", is_present=True),
+                    ChoiceRule(variable="$.value", numeric_less_than=30),
+                ],
+                next_state=value_in_twenties_state,
+            ),
+            VariableChoice(
+                variable="$.rating",
+                numeric_greater_than_path="$.auditThreshold",
+                next_state=start_audit_state,
+            ),
+        ],
+        default=record_event_state,
+    )
+    state_machine = StateMachine(start_state=choice_state)
+
+    assert state_machine.compile() == {
+        "StartAt": "DispatchEvent",
+        "States": {
+            "DispatchEvent": {
+                "Type": "Choice",
+                "Choices": [
+                    {
+                        "Not": {"Variable": "$.type", "StringEquals": "Private"},
+                        "Next": "Public",
+                    },
+                    {
+                        "And": [
+                            {"Variable": "$.value", "IsPresent": True},
+                            {"Variable": "$.value", "NumericLessThan": 30},
+                        ],
+                        "Next": "ValueInTwenties",
+                    },
+                    {
+                        "Variable": "$.rating",
+                        "NumericGreaterThanPath": "$.auditThreshold",
+                        "Next": "StartAudit",
+                    },
+                ],
+                "Default": "RecordEvent",
+            },
+            "Public": {"Type": "Pass", "End": True},
+            "ValueInTwenties": {"Type": "Pass", "End": True},
+            "StartAudit": {"Type": "Pass", "Next": "RecordEvent"},
+            "RecordEvent": {"Type": "Pass", "End": True},
+        },
+    }
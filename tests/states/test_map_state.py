@@ -1,6 +1,31 @@
+import json
+import pickle
+import time
+
 import pytest
 
-from awsstepfuncs import MapState, StateMachine, TaskState
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    ChoiceState,
+    FailState,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+    VariableChoice,
+    Verbosity,
+    map_executor,
+)
+from awsstepfuncs.history import ExecutionHistory
+from awsstepfuncs.map_executor import (
+    AUTO_PROBE_ITERATIONS,
+    MAX_INLINE_CONCURRENCY,
+    WINDOW_PER_WORKER,
+    StreamedOutput,
+    iteration_concurrency,
+)
+from awsstepfuncs.metrics import SimulationMetrics
+from awsstepfuncs.trace import RingBufferSink
 
 
 @pytest.fixture()
@@ -137,3 +162,426 @@ State output: {}
 Terminating simulation of state machine
 """
     )
+
+
+def build_routing_iterator():
+    """Build an iterator routing odd and even items to different Pass States."""
+    odd_state = PassState("Odd", result="odd")
+    even_state = PassState("Even", result="even")
+    fail_state = FailState("Fail", error="IFailed", cause="I failed!")
+    choice_state = ChoiceState(
+        "Route",
+        choices=[
+            VariableChoice("$.fail", is_present=True, next_state=fail_state),
+            VariableChoice("$.parity", string_equals="odd", next_state=odd_state),
+        ],
+        default=even_state,
+    )
+    return StateMachine(start_state=choice_state)
+
+
+@pytest.mark.parametrize(
+    ("backend", "chunk_size"), [("thread", 1), ("process", 1), ("process", 3)]
+)
+@pytest.mark.parametrize("max_concurrency", [0, 1, 3])
+def test_map_state_concurrent_output_order(
+    backend, chunk_size, max_concurrency, capture_stdout
+):
+    items = [{"parity": ["even", "odd"][index % 2]} for index in range(20)]
+    map_state = MapState(
+        "Map",
+        iterator=build_routing_iterator(),
+        max_concurrency=max_concurrency,
+        backend=backend,
+        chunk_size=chunk_size,
+    )
+    state_machine = StateMachine(start_state=map_state)
+    sequential_map_state = MapState(
+        "Map", iterator=build_routing_iterator(), max_concurrency=1
+    )
+    sequential_state_machine = StateMachine(start_state=sequential_map_state)
+
+    stdout = capture_stdout(lambda: state_machine.simulate(items))
+
+    assert state_machine.simulate(items, verbosity=Verbosity.SILENT) == [
+        item["parity"] for item in items
+    ]
+    assert stdout == capture_stdout(lambda: sequential_state_machine.simulate(items))
+
+
+def build_nested_reducer_map(backend):
+    inner_map_state = MapState(
+        "Inner",
+        iterator=lambda: StateMachine(start_state=PassState("Pass")),
+        max_concurrency=2,
+        reducer="sum",
+    )
+    map_state = MapState(
+        "Outer",
+        iterator=StateMachine(start_state=inner_map_state),
+        max_concurrency=2,
+        backend=backend,
+    )
+    return StateMachine(start_state=map_state)
+
+
+def test_map_state_process_backend_keeps_nested_options():
+    items = [[1, 2], [3, 4, 5], [6]]
+
+    outputs = {
+        backend: build_nested_reducer_map(backend).simulate(
+            items, verbosity=Verbosity.SILENT
+        )
+        for backend in ["thread", "process"]
+    }
+
+    assert outputs["process"] == outputs["thread"] == [3, 12, 6]
+
+
+def test_map_state_iterator_pickles_without_simulation_attributes():
+    state_machine = build_nested_reducer_map("thread")
+    state_machine.simulate(
+        [[1]], verbosity=Verbosity.SILENT, metrics=SimulationMetrics()
+    )
+
+    unpickled = pickle.loads(pickle.dumps(state_machine))
+
+    assert unpickled.metrics is None
+    assert unpickled.start_state.metrics is None
+    assert unpickled.compile() == state_machine.compile()
+    assert unpickled.simulate([[1, 2], [3]], verbosity=Verbosity.SILENT) == [3, 3]
+
+
+@pytest.mark.parametrize("backend", ["thread", "process", "auto"])
+def test_map_state_iteration_error_caught(backend):
+    recovered_state = PassState("Recovered", result="recovered")
+    map_state = MapState(
+        "Map", iterator=build_routing_iterator(), max_concurrency=0, backend=backend
+    )
+    map_state.add_catcher(["IFailed"], next_state=recovered_state)
+    state_machine = StateMachine(start_state=map_state)
+
+    history = state_machine.simulate(
+        [{"parity": "odd"}, {"fail": True}, {"parity": "even"}],
+        verbosity=Verbosity.SILENT,
+        return_history=True,
+    )
+    assert history.output == "recovered"
+    assert (
+        state_machine.simulate(
+            [{"parity": "odd"}, {"fail": True}], verbosity=Verbosity.SILENT
+        )
+        == "recovered"
+    )
+
+
+def test_map_state_iterations_run_concurrently(resource):
+    def sleepy_mock_fn(event, context):
+        time.sleep(0.3)
+        return event
+
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=TaskState("Sleep", resource=resource)),
+        max_concurrency=0,
+    )
+    state_machine = StateMachine(start_state=map_state)
+    metrics = SimulationMetrics()
+
+    start = time.perf_counter()
+    state_output = state_machine.simulate(
+        list(range(1, 9)),
+        resource_to_mock_fn={resource: sleepy_mock_fn},
+        verbosity=Verbosity.SILENT,
+        metrics=metrics,
+    )
+
+    assert state_output == list(range(1, 9))
+    assert time.perf_counter() - start < 8 * 0.3
+    assert metrics.histograms[("Map", "Iteration")].count == 8
+    assert metrics.histograms[("Sleep", "Total")].count == 8
+
+
+def test_map_state_concurrency():
+    map_state = MapState("Map", iterator=build_routing_iterator(), max_concurrency=0)
+    assert iteration_concurrency(map_state, 1000) == MAX_INLINE_CONCURRENCY
+    assert iteration_concurrency(map_state, 5) == 5
+    map_state.max_concurrency = 3
+    assert iteration_concurrency(map_state, 1000) == 3
+    map_state.history = ExecutionHistory()
+    assert iteration_concurrency(map_state, 1000) == 1
+
+
+@pytest.mark.parametrize("cpu_count", [1, 4])
+def test_map_state_auto_backend(monkeypatch, capture_stdout, cpu_count):
+    # The routing iterator only runs Python code, so it is CPU-bound, but a
+    # throttled CPU can make even CPU-bound code wait
+    monkeypatch.setattr(map_executor.os, "cpu_count", lambda: cpu_count)
+    monkeypatch.setattr(map_executor, "AUTO_CPU_BOUND_RATIO", 0.2)
+    items = [{"parity": ["even", "odd"][index % 2]} for index in range(24)]
+    map_state = MapState(
+        "Map", iterator=build_routing_iterator(), max_concurrency=0, backend="auto"
+    )
+    state_machine = StateMachine(start_state=map_state)
+    sequential_state_machine = StateMachine(
+        start_state=MapState(
+            "Map", iterator=build_routing_iterator(), max_concurrency=1
+        )
+    )
+    metrics = SimulationMetrics()
+
+    stdout = capture_stdout(lambda: state_machine.simulate(items, metrics=metrics))
+
+    assert stdout == capture_stdout(lambda: sequential_state_machine.simulate(items))
+    assert metrics.histograms[("Map", "Iteration")].count == 24
+    decision = metrics.map_backends["Map"]
+    assert decision.probe_iterations == AUTO_PROBE_ITERATIONS
+    assert 0 < decision.cpu_time <= decision.wall_time
+    if cpu_count == 1:
+        assert decision.backend == "thread"
+        assert decision.chunk_size == 1
+    else:
+        assert decision.backend == "process"
+    assert f"Map: {decision.backend} backend" in metrics.summary()
+
+
+@pytest.mark.parametrize(
+    ("probe_iterations", "wall_time", "cpu_time", "cpu_count", "expected"),
+    [
+        # Iterations of 1 ms of CPU time, sent 5 at a time
+        (16, 20_000_000, 16_000_000, 4, ("process", 5)),
+        # Iterations of 10 ns, sent as many at a time as allowed
+        (16, 200, 160, 4, ("process", 64)),
+        # Iterations of 50 ms, sent one at a time
+        (16, 1_000_000_000, 800_000_000, 4, ("process", 1)),
+        # Iterations mostly waiting
+        (16, 20_000_000, 1_600_000, 4, ("thread", 1)),
+        # A single CPU
+        (16, 20_000_000, 16_000_000, 1, ("thread", 1)),
+        # Too few iterations to measure
+        (3, 20_000_000, 16_000_000, 4, ("thread", 1)),
+    ],
+)
+def test_decide_backend(
+    monkeypatch, probe_iterations, wall_time, cpu_time, cpu_count, expected
+):
+    monkeypatch.setattr(map_executor.os, "cpu_count", lambda: cpu_count)
+    decision = map_executor._decide_backend(probe_iterations, wall_time, cpu_time)
+    assert (decision.backend, decision.chunk_size) == expected
+
+
+def test_map_state_auto_backend_waiting_mocks(monkeypatch, resource):
+    monkeypatch.setattr(map_executor.os, "cpu_count", lambda: 4)
+
+    def sleepy_mock_fn(event, context):
+        time.sleep(0.2)
+        return event
+
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=TaskState("Sleep", resource=resource)),
+        max_concurrency=0,
+        backend="auto",
+    )
+    metrics = SimulationMetrics()
+    state_output = StateMachine(start_state=map_state).simulate(
+        list(range(1, 21)),
+        resource_to_mock_fn={resource: sleepy_mock_fn},
+        verbosity=Verbosity.SILENT,
+        metrics=metrics,
+    )
+
+    assert state_output == list(range(1, 21))
+    assert metrics.map_backends["Map"].backend == "thread"
+
+
+def test_map_state_auto_backend_few_items():
+    map_state = MapState(
+        "Map", iterator=build_routing_iterator(), max_concurrency=0, backend="auto"
+    )
+    metrics = SimulationMetrics()
+    state_output = StateMachine(start_state=map_state).simulate(
+        [{"parity": "odd"}] * 3, verbosity=Verbosity.SILENT, metrics=metrics
+    )
+
+    assert state_output == ["odd"] * 3
+    assert metrics.map_backends["Map"][:2] == ("thread", 3)
+
+
+def test_map_state_bad_backend():
+    with pytest.raises(AWSStepFuncsValueError, match="backend must be one of"):
+        MapState(
+            "Map", iterator=build_routing_iterator(), max_concurrency=0, backend="gpu"
+        )
+    with pytest.raises(AWSStepFuncsValueError, match="must not be negative"):
+        MapState("Map", iterator=build_routing_iterator(), max_concurrency=-1)
+    with pytest.raises(AWSStepFuncsValueError, match="chunk_size must be positive"):
+        MapState(
+            "Map", iterator=build_routing_iterator(), max_concurrency=0, chunk_size=0
+        )
+
+
+def pull_into(pulled, items):
+    """Yield the items, appending each item pulled to `pulled`."""
+    for item in items:
+        pulled.append(item)
+        yield item
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_map_state_streams_generator_items(max_concurrency):
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        items_path="$.items",
+        max_concurrency=max_concurrency,
+        stream_output=True,
+    )
+    state_machine = StateMachine(start_state=map_state)
+    pulled = []
+
+    state_output = state_machine.simulate(
+        {"items": pull_into(pulled, range(1, 101))}, verbosity=Verbosity.SILENT
+    )
+
+    assert isinstance(state_output, StreamedOutput)
+    assert pulled == []
+    outputs = iter(state_output)
+    assert next(outputs) == 1
+    assert len(pulled) <= max_concurrency * WINDOW_PER_WORKER + 1
+    assert list(outputs) == list(range(2, 101))
+    assert list(state_output) == []
+
+
+def test_map_state_streams_into_map():
+    first_map_state = MapState(
+        "First",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=2,
+        stream_output=True,
+    )
+    second_map_state = MapState(
+        "Second",
+        iterator=StateMachine(start_state=PassState("Done", result="done")),
+        max_concurrency=2,
+    )
+    first_map_state >> second_map_state
+    state_machine = StateMachine(start_state=first_map_state)
+
+    state_output = state_machine.simulate(
+        (item for item in range(1, 11)), verbosity=Verbosity.SILENT
+    )
+    assert state_output == ["done"] * 10
+
+
+@pytest.mark.parametrize("stream_output", [False, True])
+@pytest.mark.parametrize(
+    "snapshots", ["return_history", "record_to", "ring_buffer", "json_lines"]
+)
+def test_map_state_streams_are_snapshotted_as_markers(
+    tmp_path, stream_output, snapshots
+):
+    first_map_state = MapState(
+        "First",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=2,
+        stream_output=stream_output,
+    )
+    second_map_state = MapState(
+        "Second",
+        iterator=StateMachine(start_state=PassState("Done", result="done")),
+        max_concurrency=2,
+    )
+    first_map_state >> second_map_state
+    state_machine = StateMachine(start_state=first_map_state)
+
+    def simulate(**kwargs):
+        return state_machine.simulate(
+            (item for item in range(1, 4)), verbosity=Verbosity.SILENT, **kwargs
+        )
+
+    # Snapshotting the generator input or the streamed output doesn't consume it
+    markers = ["<generator>"] + (["<StreamedOutput>"] if stream_output else [])
+    if snapshots == "return_history":
+        history = simulate(return_history=True)
+        text = json.dumps(list(history), default=str)
+        assert json.loads(text)[-1]["executionSucceededEventDetails"] == {
+            "output": '["done","done","done"]'
+        }
+    elif snapshots == "record_to":
+        recording_path = tmp_path / "recording.bin"
+        assert simulate(record_to=recording_path) == ["done"] * 3
+        assert simulate(replay_from=recording_path) == ["done"] * 3
+        markers = []
+    elif snapshots == "ring_buffer":
+        sink = RingBufferSink()
+        assert simulate(trace_to=sink) == ["done"] * 3
+        text = json.dumps([event.payload for event in sink])
+    else:
+        trace_path = tmp_path / "trace.jsonl"
+        assert simulate(trace_to=trace_path) == ["done"] * 3
+        text = trace_path.read_text()
+    for marker in markers:
+        assert marker in text
+
+
+def test_map_state_final_streamed_output_prints_iterations(capture_stdout):
+    map_state = MapState(
+        "Map",
+        iterator=build_routing_iterator(),
+        max_concurrency=2,
+        stream_output=True,
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    stdout = capture_stdout(
+        lambda: list(state_machine.simulate([{"parity": "odd"}, {"parity": "even"}]))
+    )
+
+    # The iterations run after the simulation ends, as the output is consumed
+    lines = stdout.splitlines()
+    assert lines.index("Executing PassState('Odd')") > lines.index(
+        "State output: <StreamedOutput>"
+    )
+    assert lines[-1] == "Terminating simulation of state machine"
+    assert stdout.count("Terminating simulation of state machine") == 3
+
+
+def test_map_state_streamed_iteration_error_caught_downstream():
+    recovered_state = PassState("Recovered", result="recovered")
+    first_map_state = MapState(
+        "First",
+        iterator=build_routing_iterator(),
+        max_concurrency=1,
+        stream_output=True,
+    )
+    second_map_state = MapState(
+        "Second",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=1,
+    )
+    second_map_state.add_catcher(["IFailed"], next_state=recovered_state)
+    first_map_state >> second_map_state
+    state_machine = StateMachine(start_state=first_map_state)
+
+    assert (
+        state_machine.simulate(
+            [{"parity": "odd"}, {"fail": True}], verbosity=Verbosity.SILENT
+        )
+        == "recovered"
+    )
+
+
+@pytest.mark.parametrize("items", ["abc", {"a": 1}, 1])
+def test_map_state_items_not_an_array(items):
+    map_state = MapState(
+        "Map", iterator=StateMachine(start_state=PassState("Pass")), max_concurrency=0
+    )
+    state_machine = StateMachine(start_state=map_state)
+    history = state_machine.simulate(
+        items, verbosity=Verbosity.SILENT, return_history=True
+    )
+    assert list(history)[-1]["executionFailedEventDetails"] == {
+        "error": "States.ALL",
+        "cause": "items_path must yield an array",
+    }
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from awsstepfuncs import (
+    ChoiceState,
+    PassState,
+    StateMachine,
+    VariableChoice,
+    Verbosity,
+    counters,
+    stats,
+)
+from awsstepfuncs.reference_path import _parse_jsonpath
+
+
+@pytest.fixture()
+def counting():
+    counters.enable_stats()
+    yield
+    counters.disable_stats()
+
+
+def test_simulation_counters(counting):
+    pass_state = PassState("Pass", result_path="$.result", result={"bar": 1})
+    choice_state = ChoiceState(
+        "Choose",
+        choices=[
+            VariableChoice(
+                variable="$.foo",
+                numeric_greater_than_equals=10,
+                next_state=PassState("Big"),
+            )
+        ],
+        default=PassState("Small"),
+    )
+    pass_state >> choice_state
+    state_machine = StateMachine(start_state=pass_state)
+
+    _parse_jsonpath.cache_clear()
+    before = stats()
+    state_machine.simulate({"foo": 1}, verbosity=Verbosity.TRANSITIONS)
+    diff = stats().diff(before)
+    assert diff[counters.CHOICE_RULE_EVALUATION] == 1
+    assert diff[counters.RESULT_PATH_MERGE] == 1
+    # InputPath and OutputPath of each state, plus the Choice Rule variable
+    assert diff[counters.REFERENCE_PATH_APPLY] == 7
+    # Each distinct path is parsed once: "$" and "$.foo"
+    assert diff[counters.JSONPATH_PARSE] == 2
+    # Starting, terminating, executing each state, and choosing the default
+    assert diff[counters.PRINTER_FORMAT] == 7
+
+    before = stats()
+    state_machine.simulate({"foo": 1}, verbosity=Verbosity.SILENT)
+    diff = stats().diff(before)
+    assert diff[counters.PRINTER_FORMAT] == 0
+    assert diff[counters.REFERENCE_PATH_APPLY] == 7
+    assert diff[counters.JSONPATH_PARSE] == 0
+
+
+def test_disabled_counters():
+    before = stats()
+    StateMachine(start_state=PassState("Pass")).simulate()
+    assert stats().diff(before) == {}
+
+
+def test_thread_safe_counters(counting):
+    before = stats()
+
+    def increment():
+        for _ in range(1000):
+            counters.increment("test.counter")
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats().diff(before)["test.counter"] == 4000
+
+
+def test_snapshot():
+    counters.reset_stats()
+    counters.increment("test.counter", 2)
+    snapshot = stats()
+    assert "test.counter" in snapshot
+    assert "other.counter" not in snapshot
+    assert snapshot["other.counter"] == 0
+    assert dict(snapshot) == {"test.counter": 2}
+    assert len(snapshot) == 1
+    assert repr(snapshot) == "StatsSnapshot({'test.counter': 2})"
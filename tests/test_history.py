@@ -0,0 +1,159 @@
+import json
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    FailState,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.history import ExecutionHistory, HistoryEventType
+
+
+def test_execution_history(resource, state_machine, mock_fn):
+    history = state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, return_history=True
+    )
+    assert isinstance(history, ExecutionHistory)
+    assert history.output == {"foo": 10, "result": {"bar": 1}}
+    assert len(history) == 6
+
+    events = list(history)
+    assert [event["type"] for event in events] == [
+        "ExecutionStarted",
+        "PassStateEntered",
+        "PassStateExited",
+        "TaskStateEntered",
+        "TaskStateExited",
+        "ExecutionSucceeded",
+    ]
+    assert [event["id"] for event in events] == [1, 2, 3, 4, 5, 6]
+    assert [event["previousEventId"] for event in events] == [0, 1, 2, 3, 4, 5]
+    # The input of the Pass State is snapshotted before ResultPath mutates it
+    assert events[1]["stateEnteredEventDetails"] == {
+        "name": "Pass",
+        "input": '{"foo":5}',
+    }
+    assert events[4]["stateExitedEventDetails"] == {
+        "name": "Times Two",
+        "output": '{"foo":10,"result":{"bar":1}}',
+    }
+    assert events[-1]["executionSucceededEventDetails"] == {
+        "output": '{"foo":10,"result":{"bar":1}}'
+    }
+
+    assert [event["id"] for event in history.filter(state_name="Times Two")] == [4, 5]
+    assert [
+        event["id"]
+        for event in history.filter(event_type=HistoryEventType.STATE_ENTERED)
+    ] == [2, 4]
+    assert [
+        event["id"]
+        for event in history.filter(
+            state_name="Pass", event_type=HistoryEventType.STATE_EXITED
+        )
+    ] == [3]
+
+
+def test_execution_history_failure():
+    fail_state = FailState("Fail", error="IFailed", cause="I failed!")
+    state_machine = StateMachine(start_state=fail_state)
+
+    history = state_machine.simulate(return_history=True)
+    assert [event["type"] for event in history] == [
+        "ExecutionStarted",
+        "FailStateEntered",
+        "FailStateFailed",
+        "FailStateExited",
+        "ExecutionFailed",
+    ]
+    assert list(history)[-1]["executionFailedEventDetails"] == {
+        "error": "IFailed",
+        "cause": "I failed!",
+    }
+
+
+def test_execution_history_map_state(resource, mock_fn):
+    iterator = StateMachine(start_state=TaskState("Times Two", resource=resource))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    state_machine = StateMachine(start_state=map_state)
+
+    history = state_machine.simulate(
+        [{"foo": 1}, {"foo": 2}],
+        resource_to_mock_fn={resource: mock_fn},
+        return_history=True,
+    )
+    assert [event["type"] for event in history] == [
+        "ExecutionStarted",
+        "MapStateEntered",
+        "MapIterationStarted",
+        "TaskStateEntered",
+        "TaskStateExited",
+        "MapIterationSucceeded",
+        "MapIterationStarted",
+        "TaskStateEntered",
+        "TaskStateExited",
+        "MapIterationSucceeded",
+        "MapStateExited",
+        "ExecutionSucceeded",
+    ]
+
+
+def test_execution_history_ring_buffer():
+    history = ExecutionHistory(max_events=3)
+    for index in range(5):
+        history.add_event(HistoryEventType.EXECUTION_STARTED, payload=index)
+
+    assert len(history) == 3
+    assert [event["id"] for event in history] == [3, 4, 5]
+    assert [event["executionStartedEventDetails"]["input"] for event in history] == [
+        "2",
+        "3",
+        "4",
+    ]
+    # Payloads of evicted events are released
+    assert len(history._payloads) == 3
+
+
+def test_get_execution_history_pages():
+    history = ExecutionHistory()
+    for _ in range(5):
+        history.add_event(HistoryEventType.EXECUTION_STARTED)
+
+    event_ids = []
+    next_token = None
+    while True:
+        page = history.get_execution_history(
+            max_results=2, next_token=next_token, reverse_order=True
+        )
+        event_ids.extend(event["id"] for event in page["events"])
+        if not (next_token := page.get("nextToken")):
+            break
+    assert event_ids == [5, 4, 3, 2, 1]
+
+
+def test_history_to_jsonl(tmp_path):
+    state_machine = StateMachine(start_state=PassState("Pass"))
+    history = state_machine.simulate({"foo": 1}, return_history=True)
+
+    jsonl_path = tmp_path / "history.jsonl"
+    history.to_jsonl(jsonl_path)
+    with jsonl_path.open() as fp:
+        events = [json.loads(line) for line in fp]
+    assert [event["type"] for event in events] == [
+        "ExecutionStarted",
+        "PassStateEntered",
+        "PassStateExited",
+        "ExecutionSucceeded",
+    ]
+    assert isinstance(events[0]["timestamp"], str)
+
+
+def test_bad_max_events():
+    with pytest.raises(
+        AWSStepFuncsValueError, match="max_events must be a positive integer"
+    ):
+        ExecutionHistory(max_events=0)
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+SIMULATION_MODULES = [
+    "colorama",
+    "cProfile",
+    "dateutil",
+    "gvanim",
+    "jsonpath_rw",
+    "lambda_local",
+    "pause",
+    "ply",
+]
+
+COMPILE_ONLY = """
+import json
+import sys
+
+from awsstepfuncs import ChoiceState, PassState, StateMachine, VariableChoice, WaitState
+
+pass_state = PassState("Pass", input_path="$.foo", result_path="$.bar")
+wait_state = WaitState("Wait", timestamp_path="$.timestamp")
+choice_state = ChoiceState(
+    "Choice",
+    choices=[VariableChoice(variable="$.bar", is_present=True, next_state=wait_state)],
+    default=pass_state,
+)
+pass_state >> choice_state
+StateMachine(start_state=pass_state).compile()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def imported_modules(code):
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return {module.split(".")[0] for module in json.loads(process.stdout)}
+
+
+@pytest.mark.parametrize("module", SIMULATION_MODULES)
+def test_compile_only_import_is_lazy(module):
+    assert module not in imported_modules(COMPILE_ONLY)
+
+
+def test_simulation_imports_dependencies():
+    code = COMPILE_ONLY.replace(
+        ".compile()",
+        '.simulate({"foo": {"timestamp": "2000-01-01T00:00:00Z"}}, '
+        "verbosity=Verbosity.SILENT, profile=True)",
+    ).replace("StateMachine,", "StateMachine, Verbosity,")
+    assert imported_modules(code) >= {"cProfile", "dateutil", "jsonpath_rw", "pause"}
@@ -0,0 +1,134 @@
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.incremental import SimulationCache, SimulationStatus
+
+
+@pytest.fixture()
+def mock_calls(tmp_path):
+    return tmp_path / "mock_calls.txt"
+
+
+@pytest.fixture()
+def mock_fn(mock_calls):
+    def _mock_fn(event, context):
+        # Mocks run in a separate process, so count the calls in a file
+        with mock_calls.open("a") as fp:
+            fp.write(".")
+        event["foo"] *= 2
+        return event
+
+    return _mock_fn
+
+
+def test_incremental_simulation(tmp_path, resource, mock_calls, mock_fn):
+    task_state = TaskState("Times Two", resource=resource)
+    pass_state = PassState("Pass")
+    task_state >> pass_state
+    state_machine = StateMachine(start_state=task_state)
+    cache_path = tmp_path / "cache.json"
+
+    cache = SimulationCache(cache_path)
+    result = cache.simulate(
+        "case", state_machine, {"foo": 1}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.NEW
+    assert result.output == {"foo": 2}
+    assert mock_calls.read_text() == "."
+    cache.save()
+
+    # Nothing changed, so nothing is executed
+    cache = SimulationCache(cache_path)
+    result = cache.simulate(
+        "case", state_machine, {"foo": 1}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.UNCHANGED
+    assert result.output == {"foo": 2}
+    assert mock_calls.read_text() == "."
+
+    # A different input is a different execution
+    result = cache.simulate(
+        "case", state_machine, {"foo": 2}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.NEW
+    assert result.output == {"foo": 4}
+    assert mock_calls.read_text() == ".."
+
+    # Editing the last state resumes from it without calling the mock again
+    pass_state.result_path = None
+    pass_state.result = {"bar": 1}
+    result = cache.simulate(
+        "case", state_machine, {"foo": 2}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.RESUMED
+    assert result.resumed_from == "Pass"
+    assert result.output == {"foo": 4}
+    assert mock_calls.read_text() == ".."
+
+    # Editing the first state reruns everything, resuming from the start
+    task_state.timeout_seconds = 10
+    result = cache.simulate(
+        "case", state_machine, {"foo": 2}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.RESUMED
+    assert result.resumed_from == "Times Two"
+    assert mock_calls.read_text() == "..."
+
+
+def test_incremental_simulation_new_state(resource, mock_fn):
+    first_state = PassState("First")
+    state_machine = StateMachine(start_state=first_state)
+    cache = SimulationCache()
+    cache.simulate("case", state_machine, {"foo": 1})
+
+    # Adding a next state changes the compiled state, which now has "Next"
+    first_state >> TaskState("Times Two", resource=resource)
+    result = cache.simulate(
+        "case", state_machine, {"foo": 1}, resource_to_mock_fn={resource: mock_fn}
+    )
+    assert result.status is SimulationStatus.RESUMED
+    assert result.resumed_from == "First"
+    assert result.output == {"foo": 2}
+
+    result = cache.simulate("case", state_machine, {"foo": 1})
+    assert result.status is SimulationStatus.UNCHANGED
+    assert repr(result) == "IncrementalResult(status='unchanged', resumed_from=None)"
+
+    # Starting from another state is a different execution
+    state_machine = StateMachine(start_state=PassState("Other First"))
+    result = cache.simulate("case", state_machine, {"foo": 1})
+    assert result.status is SimulationStatus.NEW
+
+
+def test_incremental_simulation_unserializable_input():
+    state_machine = StateMachine(start_state=PassState("Pass"))
+    cache = SimulationCache()
+
+    with pytest.raises(AWSStepFuncsValueError, match="set is not JSON serializable"):
+        cache.simulate("case", state_machine, {"foo": {1, 2}})
+    assert "case" not in cache.traces
+
+
+def test_incremental_simulation_streams():
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=1,
+        stream_output=True,
+    )
+    cache = SimulationCache()
+
+    with pytest.raises(AWSStepFuncsValueError, match="streaming their output"):
+        cache.simulate("case", StateMachine(start_state=map_state), [1])
+    with pytest.raises(AWSStepFuncsValueError, match="generator is not JSON"):
+        cache.simulate(
+            "case",
+            StateMachine(start_state=PassState("Pass")),
+            (item for item in range(3)),
+        )
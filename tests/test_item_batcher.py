@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.errors import StateSimulationError
+from awsstepfuncs.item_batcher import ItemBatcher
+
+
+def batch_size(batch):
+    return len(json.dumps(batch, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expected_lengths"),
+    [
+        ({"max_items_per_batch": 3}, [3, 3, 3, 1]),
+        ({"max_items_per_batch": 20}, [10]),
+        ({"max_input_bytes_per_batch": 40}, [4, 4, 2]),
+        ({"max_items_per_batch": 3, "max_input_bytes_per_batch": 40}, [3, 3, 3, 1]),
+        ({"max_input_bytes_per_batch": 66, "batch_input": {"run": "é"}}, [4, 4, 2]),
+    ],
+)
+def test_batches(kwargs, expected_lengths):
+    items = [f"é{index}" for index in range(10)]
+    batches = list(ItemBatcher(**kwargs).batch(iter(items)))
+
+    assert [len(batch["Items"]) for batch in batches] == expected_lengths
+    assert [item for batch in batches for item in batch["Items"]] == items
+    if "batch_input" in kwargs:
+        assert all(batch["BatchInput"] == kwargs["batch_input"] for batch in batches)
+    else:
+        assert all(list(batch) == ["Items"] for batch in batches)
+    if max_bytes := kwargs.get("max_input_bytes_per_batch"):
+        assert all(batch_size(batch) <= max_bytes for batch in batches)
+        # Each batch is full: the next item would have made it too large
+        for batch, next_batch in zip(batches, batches[1:]):
+            if len(batch["Items"]) != kwargs.get("max_items_per_batch"):
+                fuller = dict(batch, Items=batch["Items"] + next_batch["Items"][:1])
+                assert batch_size(fuller) > max_bytes
+
+
+def test_item_too_large():
+    item_batcher = ItemBatcher(max_input_bytes_per_batch=20)
+    batches = item_batcher.batch(["small", "x" * 20])
+    assert next(batches) == {"Items": ["small"]}
+    with pytest.raises(StateSimulationError, match="An item of 22 bytes"):
+        next(batches)
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "message"),
+    [
+        ({}, "max_items_per_batch or max_input_bytes_per_batch must be set"),
+        ({"max_items_per_batch": 0}, "max_items_per_batch must be positive"),
+        ({"max_input_bytes_per_batch": -1}, "max_input_bytes_per_batch must be"),
+    ],
+)
+def test_invalid_item_batchers(kwargs, message):
+    with pytest.raises(AWSStepFuncsValueError, match=message):
+        ItemBatcher(**kwargs)
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 0])
+def test_map_state_batches_items(max_concurrency):
+    resource = "arn:aws:lambda:us-east-1:123456789012:function:Sum"
+
+    def mock_sum(event, context):
+        return sum(event["Items"]) * event["BatchInput"]["factor"]
+
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=TaskState("Sum", resource=resource)),
+        max_concurrency=max_concurrency,
+        item_batcher=ItemBatcher(max_items_per_batch=4, batch_input={"factor": 10}),
+    )
+    state_machine = StateMachine(start_state=map_state)
+
+    state_output = state_machine.simulate(
+        iter(range(1, 11)), resource_to_mock_fn={resource: mock_sum}, verbosity=0
+    )
+
+    assert state_output == [100, 260, 190]
+
+
+def test_round_trip():
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=0,
+        item_batcher=ItemBatcher(
+            max_items_per_batch=100,
+            max_input_bytes_per_batch=262_144,
+            batch_input={"factor": 10},
+        ),
+    )
+    compiled = StateMachine(start_state=map_state).compile()
+    assert compiled["States"]["Map"]["ItemBatcher"] == {
+        "MaxItemsPerBatch": 100,
+        "MaxInputBytesPerBatch": 262_144,
+        "BatchInput": {"factor": 10},
+    }
+    assert StateMachine.from_dict(compiled).compile() == compiled
+    assert StateMachine.from_dict(compiled).validate() == []
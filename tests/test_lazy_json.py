@@ -0,0 +1,195 @@
+import copy
+import io
+import json
+import pickle
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.lazy_json import LazyJSONArray, LazyJSONObject, open_document
+from awsstepfuncs.recording import serialize
+
+DOCUMENT = {
+    "skipped": {"nested": [1, "]}", {"a": '\\"['}], "text": "é☃"},
+    "records": [{"id": 1, "name": "é"}, {"id": 2, "name": "☃"}, {"id": 3}],
+    "run": {"id": "run-1", "attempt": 2},
+    "empty": {},
+    "flag": False,
+}
+
+
+class CountingReader(io.BytesIO):
+    """A binary file counting how many bytes were read from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def materialize(value):
+    if isinstance(value, LazyJSONObject):
+        return {key: materialize(value[key]) for key in value}
+    if isinstance(value, LazyJSONArray):
+        return [materialize(element) for element in value]
+    return value
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_lazy_document(chunk_size, indent):
+    data = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+    document = open_document(io.BytesIO(data), chunk_size=chunk_size)
+
+    assert isinstance(document, LazyJSONObject)
+    assert isinstance(document["records"], LazyJSONArray)
+    assert list(document["records"]) == DOCUMENT["records"]
+    assert isinstance(document["run"], LazyJSONObject)
+    assert document["run"]["attempt"] == 2
+    assert document["flag"] is False
+    assert "missing" not in document
+    assert list(document) == list(DOCUMENT)
+    assert len(document) == len(DOCUMENT)
+    assert materialize(document) == DOCUMENT
+    assert document == DOCUMENT
+
+
+def test_lookup_only_reads_up_to_the_key():
+    data = json.dumps({"run": 1, "records": list(range(100_000)), "after": 2}).encode()
+    reader = CountingReader(data)
+    document = open_document(reader, chunk_size=1024)
+
+    assert document["run"] == 1
+    items = document["records"]
+    assert reader.bytes_read < 10 * 1024 < len(data) / 50
+    assert sum(items) == sum(range(100_000))
+    assert document["after"] == 2
+
+
+def test_documents_which_are_not_objects():
+    array = open_document(io.BytesIO(b" [1, [2], {}] "))
+    assert isinstance(array, LazyJSONArray)
+    assert list(array) == [1, [2], {}]
+    assert list(open_document(io.BytesIO(b"[]"))) == []
+    assert open_document(io.BytesIO(' "é" '.encode())) == "é"
+
+
+def test_documents_from_paths_and_pipes(tmp_path):
+    path = tmp_path / "input.json"
+    path.write_text(json.dumps(DOCUMENT))
+    document = open_document(path)
+    assert document == DOCUMENT
+    document.close()
+
+    class Pipe(io.BytesIO):
+        def seekable(self):
+            return False
+
+    assert open_document(Pipe(path.read_bytes())) == DOCUMENT
+
+
+def test_updates_do_not_change_the_document():
+    document = open_document(io.BytesIO(json.dumps(DOCUMENT).encode()))
+    copied = copy.deepcopy(document)
+    document["result"] = [1]
+    document["run"]["attempt"] = 3
+    del document["skipped"]
+
+    assert list(document) == ["records", "run", "empty", "flag", "result"]
+    assert document["run"]["attempt"] == 3
+    with pytest.raises(KeyError):
+        document["skipped"]
+    assert copied == DOCUMENT
+    assert not open_document(io.BytesIO(b"{}"))
+    assert document["empty"] == {}
+    assert not document["empty"]
+
+
+def test_pickle_materializes():
+    document = open_document(io.BytesIO(json.dumps(DOCUMENT).encode()))
+    document["run"]["attempt"] = 3
+    del document["skipped"]
+
+    unpickled = pickle.loads(pickle.dumps(document))
+    assert type(unpickled) is dict
+    assert type(unpickled["records"]) is list
+    expected = {key: value for key, value in DOCUMENT.items() if key != "skipped"}
+    assert unpickled == {**expected, "run": {"id": "run-1", "attempt": 3}}
+
+
+def test_serialize_materializes():
+    document = open_document(io.BytesIO(json.dumps(DOCUMENT).encode()))
+
+    assert json.loads(serialize(document)) == DOCUMENT
+    assert serialize(document["records"]) == serialize(DOCUMENT["records"])
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"   ", b'{"a": 1', b'{"a" 1}', b'{"a": 1 "b": 2}', b"{1: 2}", b'["a]'],
+)
+def test_invalid_documents(data):
+    with pytest.raises(AWSStepFuncsValueError):
+        document = open_document(io.BytesIO(data))
+        materialize(document)
+
+
+def test_simulate_input_document(tmp_path):
+    path = tmp_path / "input.json"
+    path.write_text(json.dumps(DOCUMENT))
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=TaskState("Task", resource="arn")),
+        items_path="$.records",
+        max_concurrency=2,
+        result_path="$.result",
+    )
+    map_state >> TaskState("Summarize", resource="summarize")
+    state_machine = StateMachine(start_state=map_state)
+
+    def summarize(state_input, _):
+        return {"run": state_input["run"]["id"], "total": sum(state_input["result"])}
+
+    state_output = state_machine.simulate(
+        input_document=path,
+        resource_to_mock_fn={
+            "arn": lambda record, _: record["id"] * 10,
+            "summarize": summarize,
+        },
+        verbosity=0,
+    )
+
+    assert state_output == {"run": "run-1", "total": 60}
+
+
+def test_simulate_input_document_mock_returns_its_event(tmp_path):
+    path = tmp_path / "input.json"
+    path.write_text(json.dumps(DOCUMENT))
+    state_machine = StateMachine(start_state=TaskState("Echo", resource="echo"))
+
+    state_output = state_machine.simulate(
+        input_document=path,
+        resource_to_mock_fn={"echo": lambda event, _: event},
+        verbosity=0,
+    )
+
+    assert state_output == DOCUMENT
+
+
+def test_simulate_input_document_and_state_input():
+    state_machine = StateMachine(start_state=PassState("Pass"))
+    with pytest.raises(
+        AWSStepFuncsValueError,
+        match="Cannot pass both state_input and input_document",
+    ):
+        state_machine.simulate({}, input_document=io.BytesIO(b"{}"))
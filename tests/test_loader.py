@@ -0,0 +1,213 @@
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from awsstepfuncs import (
+    AndChoice,
+    AWSStepFuncsValueError,
+    ChoiceRule,
+    ChoiceState,
+    FailState,
+    MapState,
+    NotChoice,
+    PassState,
+    StateMachine,
+    SucceedState,
+    TaskState,
+    VariableChoice,
+    WaitState,
+)
+from awsstepfuncs.synthetic import generate_state_machine
+
+
+def build_state_machine():
+    succeed_state = SucceedState("Succeed", output_path="$.result")
+    fail_state = FailState("Fail", error="MyError", cause="It failed")
+    wait_state = WaitState(
+        "Wait", timestamp=datetime(2021, 1, 1, tzinfo=timezone.utc), comment="Wait"
+    )
+    task_state = TaskState(
+        "Task",
+        resource="arn:aws:lambda:us-east-1:123456789012:function:Foo",
+        input_path="$.data",
+        result_selector={"value.$": "$.value"},
+        result_path="$.result",
+        timeout_seconds=10,
+    )
+    task_state.add_retrier(["States.Timeout"], max_attempts=2, backoff_rate=1.5)
+    task_state.add_catcher(["States.ALL"], next_state=fail_state)
+    map_iterator = PassState("Double", parameters={"double.$": "$.value"})
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=map_iterator, comment="Iterator"),
+        items_path="$.items",
+        result_path=None,
+        max_concurrency=4,
+    )
+    choice_state = ChoiceState(
+        "Choose",
+        choices=[
+            NotChoice("$.skip", is_present=True, next_state=task_state),
+            AndChoice(
+                [
+                    ChoiceRule("$.value", numeric_greater_than_equals_path="$.min"),
+                    ChoiceRule("$.value", string_matches="*.json"),
+                ],
+                next_state=map_state,
+            ),
+            VariableChoice("$.wait", boolean_equals=True, next_state=wait_state),
+        ],
+        default=succeed_state,
+    )
+    pass_state = PassState("Start", result={"a": [1, 2]}, result_path="$.pass")
+    pass_state >> choice_state
+    task_state >> succeed_state
+    map_state >> succeed_state
+    wait_state >> succeed_state
+    return StateMachine(start_state=pass_state, comment="All states", version="1.0")
+
+
+def test_round_trip():
+    state_machine = build_state_machine()
+    compiled = state_machine.compile()
+    assert StateMachine.from_dict(compiled).compile() == compiled
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_round_trip_synthetic(seed):
+    state_machine = generate_state_machine(
+        seed, n_states=50, task_ratio=0.2, map_ratio=0.2, map_depth=2
+    )
+    compiled = state_machine.compile()
+    assert StateMachine.from_dict(compiled).compile() == compiled
+
+
+def test_from_json(tmp_path):
+    compiled = build_state_machine().compile()
+    path = tmp_path / "state_machine.json"
+    path.write_text(json.dumps(compiled))
+    assert StateMachine.from_json(path).compile() == compiled
+    assert StateMachine.from_json(str(path)).compile() == compiled
+    assert (
+        StateMachine.from_json(io.StringIO(json.dumps(compiled))).compile() == compiled
+    )
+    assert (
+        StateMachine.from_json(io.BytesIO(json.dumps(compiled).encode())).compile()
+        == compiled
+    )
+
+
+def test_load_simulates():
+    state_machine = StateMachine.from_dict(
+        {
+            "StartAt": "Map",
+            "States": {
+                "Map": {
+                    "Type": "Map",
+                    "ItemsPath": "$.items",
+                    "ItemProcessor": {
+                        "ProcessorConfig": {"Mode": "INLINE"},
+                        "StartAt": "Pass",
+                        "States": {
+                            "Pass": {"Type": "Pass", "Result": "done", "End": True}
+                        },
+                    },
+                    "End": True,
+                }
+            },
+        }
+    )
+    assert state_machine.simulate({"items": [1, 2]}) == ["done", "done"]
+
+
+def test_map_iterator_loaded_lazily():
+    compiled = build_state_machine().compile()
+    compiled["States"]["Map"]["Iterator"]["States"]["Double"]["Type"] = "Bogus"
+    state_machine = StateMachine.from_dict(compiled)
+    map_state = next(state for state in state_machine.all_states if state.name == "Map")
+    with pytest.raises(AWSStepFuncsValueError, match='Unsupported type "Bogus"'):
+        map_state.iterator
+
+
+@pytest.mark.parametrize(
+    ("definition", "message"),
+    [
+        ({"States": {}}, "State machine definitions must have StartAt"),
+        (
+            {"StartAt": "Missing", "States": {}},
+            'Transition to unknown state "Missing"',
+        ),
+        (
+            {"StartAt": "A", "States": {"A": {"Type": "Pass", "Next": "Missing"}}},
+            'Transition to unknown state "Missing"',
+        ),
+        (
+            {"StartAt": "A", "States": {"A": {"Type": "Parallel", "End": True}}},
+            'Unsupported type "Parallel" of state "A"',
+        ),
+        (
+            {"StartAt": "A", "States": {"A": {"Type": "Pass", "Foo": 1}}},
+            'Unsupported field "Foo" in state "A"',
+        ),
+        (
+            {"StartAt": "A", "States": {}, "TimeoutSeconds": 1},
+            'Unsupported field "TimeoutSeconds" in state machine',
+        ),
+        (
+            {
+                "StartAt": "A",
+                "States": {
+                    "A": {
+                        "Type": "Choice",
+                        "Choices": [{"Or": [], "Next": "A"}],
+                    }
+                },
+            },
+            'Unsupported Choice Rule "Or"',
+        ),
+        (
+            {"StartAt": "A", "States": {"A": {"Type": "Choice"}}},
+            'Missing field "Choices" in state "A"',
+        ),
+        (
+            {
+                "StartAt": "A",
+                "States": {
+                    "A": {
+                        "Type": "Choice",
+                        "Choices": [{"Variable": "$.a", "IsPresent": True}],
+                    }
+                },
+            },
+            'Missing field "Next" in a choice of state "A"',
+        ),
+        (
+            {
+                "StartAt": "A",
+                "States": {
+                    "A": {"Type": "Task", "Resource": "r", "End": True, "Retry": [{}]}
+                },
+            },
+            'Missing field "ErrorEquals" in a Retrier of state "A"',
+        ),
+        (
+            {
+                "StartAt": "A",
+                "States": {
+                    "A": {
+                        "Type": "Task",
+                        "Resource": "r",
+                        "End": True,
+                        "Catch": [{"ErrorEquals": ["States.ALL"]}],
+                    }
+                },
+            },
+            'Missing field "Next" in a Catcher of state "A"',
+        ),
+    ],
+)
+def test_invalid_definitions(definition, message):
+    with pytest.raises(AWSStepFuncsValueError, match=message):
+        StateMachine.from_dict(definition)
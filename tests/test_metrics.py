@@ -0,0 +1,142 @@
+import pickle
+from io import StringIO
+
+from awsstepfuncs import MapState, PassState, StateMachine, TaskState
+from awsstepfuncs.metrics import LatencyHistogram, MapBackendDecision, SimulationMetrics
+
+
+def test_simulation_metrics(resource, mock_fn):
+    pass_state = PassState("Pass", result_path="$.result", result={"bar": 1})
+    task_state = TaskState(
+        "Times Two", resource=resource, result_selector={"foo.$": "$.foo"}
+    )
+    pass_state >> task_state
+    state_machine = StateMachine(start_state=pass_state)
+
+    metrics = SimulationMetrics()
+    for foo in range(3):
+        state_machine.simulate(
+            {"foo": foo}, resource_to_mock_fn={resource: mock_fn}, metrics=metrics
+        )
+
+    assert {key: histogram.count for key, histogram in metrics.histograms.items()} == {
+        ("Pass", "InputPath"): 3,
+        ("Pass", "Execute"): 3,
+        ("Pass", "ResultPath"): 3,
+        ("Pass", "OutputPath"): 3,
+        ("Pass", "Total"): 3,
+        ("Times Two", "InputPath"): 3,
+        ("Times Two", "Execute"): 3,
+        ("Times Two", "ResultSelector"): 3,
+        ("Times Two", "ResultPath"): 3,
+        ("Times Two", "OutputPath"): 3,
+        ("Times Two", "Total"): 3,
+    }
+    task_total = metrics.histograms[("Times Two", "Total")]
+    task_execute = metrics.histograms[("Times Two", "Execute")]
+    assert task_total.min >= task_execute.min > 0
+
+    lines = metrics.summary().splitlines()
+    assert lines[0].split() == [
+        "State",
+        "Phase",
+        "Count",
+        "Mean",
+        "p50",
+        "p90",
+        "p99",
+        "Max",
+    ]
+    assert [line.split()[:2] for line in lines[1:6]] == [
+        ["Pass", "InputPath"],
+        ["Pass", "Execute"],
+        ["Pass", "ResultPath"],
+        ["Pass", "OutputPath"],
+        ["Pass", "Total"],
+    ]
+
+
+def test_map_state_metrics(resource, mock_fn):
+    iterator = StateMachine(start_state=TaskState("Times Two", resource=resource))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    state_machine = StateMachine(start_state=map_state)
+
+    metrics = SimulationMetrics()
+    state_machine.simulate(
+        [{"foo": 1}, {"foo": 2}],
+        resource_to_mock_fn={resource: mock_fn},
+        metrics=metrics,
+    )
+    assert metrics.histograms[("Map", "Total")].count == 1
+    assert metrics.histograms[("Times Two", "Execute")].count == 2
+
+
+def test_no_metrics():
+    pass_state = PassState("Pass")
+    state_machine = StateMachine(start_state=pass_state)
+    state_machine.simulate({"foo": 1})
+    assert pass_state.metrics is None
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    for value in [0, 31, 32, 63, 64, 2**50]:
+        histogram.record(value)
+    assert list(histogram.buckets()) == [
+        (0, 1),
+        (31, 1),
+        (33, 1),
+        (63, 1),
+        (67, 1),
+        (
+            LatencyHistogram.bucket_upper_bound(LatencyHistogram.bucket_index(2**50)),
+            1,
+        ),
+    ]
+    assert histogram.percentile(100) == 2**50
+
+    other = LatencyHistogram()
+    other.record(10)
+    histogram.merge(other)
+    assert histogram.count == 7
+    assert histogram.percentile(0) == 0
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_prometheus_export():
+    metrics = SimulationMetrics()
+    metrics.record('Say "hi"', "Total", 1000)
+    metrics.record('Say "hi"', "Total", 2000)
+
+    other = SimulationMetrics()
+    other.record('Say "hi"', "Total", 2000)
+    metrics.merge(other)
+
+    fp = StringIO()
+    metrics.to_prometheus(fp)
+    assert (
+        fp.getvalue()
+        == """# HELP awsstepfuncs_state_phase_duration_seconds Duration of each phase of simulated states.
+# TYPE awsstepfuncs_state_phase_duration_seconds histogram
+awsstepfuncs_state_phase_duration_seconds_bucket{state="Say \\"hi\\"",phase="Total",le="1.023e-06"} 1
+awsstepfuncs_state_phase_duration_seconds_bucket{state="Say \\"hi\\"",phase="Total",le="2.047e-06"} 3
+awsstepfuncs_state_phase_duration_seconds_bucket{state="Say \\"hi\\"",phase="Total",le="+Inf"} 3
+awsstepfuncs_state_phase_duration_seconds_sum{state="Say \\"hi\\"",phase="Total"} 5e-06
+awsstepfuncs_state_phase_duration_seconds_count{state="Say \\"hi\\"",phase="Total"} 3
+"""
+    )
+
+
+def test_map_backend_decisions():
+    metrics = SimulationMetrics()
+    metrics.record_backend("Map", MapBackendDecision("thread", 16, 8_000_000, 0, 1))
+    other = SimulationMetrics()
+    other.record_backend(
+        "Map", MapBackendDecision("process", 16, 40_000_000, 36_000_000, 8)
+    )
+    metrics.merge(pickle.loads(pickle.dumps(other)))
+
+    assert metrics.map_backends["Map"].backend == "process"
+    assert metrics.summary().splitlines()[-1] == (
+        "Map: process backend, chunks of 8 (CPU 90% of 40.000 ms over 16 iterations)"
+    )
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from awsstepfuncs import PassState, StateMachine, Verbosity
+from awsstepfuncs.printer import Printer
+
+
+class Unprintable:
+    def __str__(self):
+        raise AssertionError("Should not be formatted")
+
+
+def test_printer_levels():
+    stream = StringIO()
+    printer = Printer(verbosity=Verbosity.SUMMARY, stream=stream)
+    printer("Summary", level=Verbosity.SUMMARY)
+    printer("Transition")
+    printer("Payload", Unprintable(), level=Verbosity.PAYLOADS)
+    printer.flush()
+    assert stream.getvalue() == "Summary\n"
+    assert printer.enabled(Verbosity.SUMMARY)
+    assert not printer.enabled(Verbosity.TRANSITIONS)
+
+
+def test_silent_printer():
+    stream = StringIO()
+    printer = Printer(verbosity=Verbosity.SILENT, stream=stream)
+    printer("Summary", Unprintable(), level=Verbosity.SUMMARY)
+    printer.flush()
+    assert stream.getvalue() == ""
+
+
+def test_printer_buffer():
+    stream = StringIO()
+    printer = Printer(stream=stream, buffer_size=10)
+    printer("Hello")
+    assert stream.getvalue() == ""
+    printer("world!")
+    assert stream.getvalue() == "Hello\nworld!\n"
+
+
+def test_printer_truncation():
+    stream = StringIO()
+    printer = Printer(max_payload_length=5, stream=stream)
+    printer("A long message is never truncated:", "abcdefgh", "abc")
+    printer("Only payloads are truncated:", "abcdefgh", level=Verbosity.PAYLOADS)
+    printer.flush()
+    assert (
+        stream.getvalue()
+        == """A long message is never truncated: abcdefgh abc
+Only payloads are truncated: abcde... (8 characters)
+"""
+    )
+
+
+def test_simulate_verbosity(capture_stdout):
+    pass_state = PassState("Pass", result={"foo": "bar"})
+    state_machine = StateMachine(start_state=pass_state)
+
+    stdout = capture_stdout(
+        lambda: state_machine.simulate(verbosity=Verbosity.TRANSITIONS)
+    )
+    assert (
+        stdout
+        == """Starting simulation of state machine
+Executing PassState('Pass')
+Terminating simulation of state machine
+"""
+    )
+
+    stdout = capture_stdout(lambda: state_machine.simulate(verbosity=Verbosity.SILENT))
+    assert stdout == ""
+
+    stdout = capture_stdout(lambda: state_machine.simulate(max_payload_length=8))
+    assert "Executing PassState('Pass')" in stdout
+    assert "State output: {'foo': ... (14 characters)" in stdout
@@ -0,0 +1,120 @@
+import json
+import pstats
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.profiling import SimulationProfiler
+
+
+def test_profile(resource, state_machine, mock_fn):
+    state_machine.simulate(
+        {"foo": 1}, resource_to_mock_fn={resource: mock_fn}, profile=True
+    )
+    profiler = state_machine.profiler
+    assert isinstance(profiler, SimulationProfiler)
+    assert set(profiler.states) == {"Pass", "Times Two"}
+
+    task_profile = profiler.states["Times Two"]
+    assert task_profile.state_type == "Task"
+    assert task_profile.resource == resource
+    assert task_profile.calls == 1
+    assert 0 < task_profile.mock_ns < task_profile.total_ns
+    assert task_profile.library_ns == task_profile.total_ns - task_profile.mock_ns
+    assert profiler.states["Pass"].mock_ns == 0
+
+    lines = profiler.report().splitlines()
+    assert lines[0].split() == [
+        "State",
+        "Type",
+        "Resource",
+        "Calls",
+        "Total",
+        "Library",
+        "Mocks",
+    ]
+    assert len(lines) == 3
+
+    # Functions called by the state are attributed to it
+    function_names = {
+        function_name
+        for _, _, function_name in profiler.stats("Pass").stats  # type: ignore
+    }
+    assert "apply" in function_names
+
+
+def test_profile_batch_and_map_state(tmp_path, resource, mock_fn):
+    iterator = StateMachine(start_state=TaskState("Times Two", resource=resource))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    state_machine = StateMachine(start_state=map_state)
+
+    profiler = SimulationProfiler()
+    for _ in range(2):
+        state_machine.simulate(
+            [{"foo": 1}, {"foo": 2}],
+            resource_to_mock_fn={resource: mock_fn},
+            profile=profiler,
+        )
+    assert profiler.states["Map"].calls == 2
+    assert profiler.states["Map/Times Two"].calls == 4
+    map_profile = profiler.states["Map"]
+    assert map_profile.nested_ns > 0
+    assert map_profile.mock_ns == 0
+
+    pstats_path = tmp_path / "simulation.pstats"
+    profiler.to_pstats(pstats_path)
+    assert pstats.Stats(str(pstats_path)).total_calls > 0
+
+    speedscope_path = tmp_path / "simulation.speedscope.json"
+    profiler.to_speedscope(speedscope_path)
+    with speedscope_path.open() as fp:
+        speedscope = json.load(fp)
+    frame_names = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    assert frame_names == ["Map (Map)", "Times Two (Task)", f"Mock {resource}"]
+    (profile,) = speedscope["profiles"]
+    assert profile["type"] == "evented"
+    assert [event["type"] for event in profile["events"][:6]] == [
+        "O",
+        "O",
+        "O",
+        "C",
+        "C",
+        "O",
+    ]
+
+
+def test_profile_same_name_in_nested_iterators():
+    def build_map_state(name, items):
+        return MapState(
+            name,
+            iterator=StateMachine(start_state=PassState("Step")),
+            items_path=f"$.{items}",
+            result_path=f"$.{items}",
+            max_concurrency=0,
+        )
+
+    first_map_state = build_map_state("First", "a")
+    second_map_state = build_map_state("Second", "b")
+    first_map_state >> second_map_state
+    state_machine = StateMachine(start_state=first_map_state)
+
+    profiler = SimulationProfiler()
+    state_machine.simulate({"a": [1], "b": [1, 2, 3]}, profile=profiler)
+
+    assert set(profiler.states) == {"First", "First/Step", "Second", "Second/Step"}
+    assert profiler.states["First/Step"].calls == 1
+    assert profiler.states["Second/Step"].calls == 3
+    assert profiler.states["Second/Step"].state_name == "Step"
+    assert "Second/Step" in profiler.report()
+    assert profiler.stats("First/Step").total_calls > 0
+
+
+def test_profile_unknown_state():
+    with pytest.raises(AWSStepFuncsValueError, match="No profile for state 'Pass'"):
+        SimulationProfiler().stats("Pass")
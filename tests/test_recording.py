@@ -0,0 +1,134 @@
+import pytest
+
+from awsstepfuncs import AWSStepFuncsValueError, MapState, StateMachine, TaskState
+from awsstepfuncs.errors import ReplayDivergenceError
+from awsstepfuncs.recording import read_records, write_record
+
+
+def failing_mock_fn(event, context):
+    assert False
+
+
+def test_record_then_replay(tmp_path, resource, state_machine, mock_fn):
+    recording_path = tmp_path / "recording.bin"
+    state_output = state_machine.simulate(
+        {"foo": 5},
+        resource_to_mock_fn={resource: mock_fn},
+        record_to=recording_path,
+    )
+    assert state_output == {"foo": 10, "result": {"bar": 1}}
+
+    with recording_path.open("rb") as fp:
+        records = list(read_records(fp))
+    assert [record["type"] for record in records] == [
+        "transition",
+        "mock",
+        "transition",
+        "end",
+    ]
+    assert records[0]["state"] == "Pass"
+    assert records[0]["next"] == "Times Two"
+    assert records[1] == {
+        "type": "mock",
+        "resource": resource,
+        "input": {"foo": 5, "result": {"bar": 1}},
+        "output": {"foo": 10, "result": {"bar": 1}},
+    }
+    assert records[2]["next"] is None
+
+    # The mock must not be called when replaying
+    replayed_output = state_machine.simulate(
+        {"foo": 5},
+        resource_to_mock_fn={resource: failing_mock_fn},
+        replay_from=recording_path,
+    )
+    assert replayed_output == state_output
+
+
+def test_replay_divergence(tmp_path, resource, state_machine, mock_fn):
+    recording_path = tmp_path / "recording.bin"
+    state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, record_to=recording_path
+    )
+
+    with pytest.raises(ReplayDivergenceError) as exc_info:
+        state_machine.simulate({"foo": 6}, replay_from=recording_path)
+
+    # The first transition already has a different input digest
+    assert exc_info.value.position == 1
+    assert exc_info.value.expected["state"] == "Pass"
+    assert exc_info.value.expected["input"] != exc_info.value.actual["input"]
+
+
+def test_replay_divergence_changed_definition(
+    tmp_path, resource, state_machine, mock_fn
+):
+    recording_path = tmp_path / "recording.bin"
+    state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, record_to=recording_path
+    )
+
+    state_machine.start_state.next_state = None
+    with pytest.raises(ReplayDivergenceError, match="Replay diverged at record 1"):
+        state_machine.simulate({"foo": 5}, replay_from=recording_path)
+
+
+def test_replay_map_state(tmp_path, resource, mock_fn):
+    iterator = StateMachine(start_state=TaskState("Times Two", resource=resource))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    state_machine = StateMachine(start_state=map_state)
+
+    recording_path = tmp_path / "recording.bin"
+    state_output = state_machine.simulate(
+        [{"foo": 1}, {"foo": 2}],
+        resource_to_mock_fn={resource: mock_fn},
+        record_to=recording_path,
+    )
+    assert state_output == [{"foo": 2}, {"foo": 4}]
+    assert (
+        state_machine.simulate([{"foo": 1}, {"foo": 2}], replay_from=recording_path)
+        == state_output
+    )
+
+    with pytest.raises(ReplayDivergenceError, match="Replay diverged at record 4"):
+        state_machine.simulate([{"foo": 1}, {"foo": 3}], replay_from=recording_path)
+
+
+def test_record_and_replay_exclusive(tmp_path, state_machine):
+    with pytest.raises(
+        AWSStepFuncsValueError,
+        match="Cannot both record and replay the same simulation",
+    ):
+        state_machine.simulate(
+            record_to=tmp_path / "a.bin", replay_from=tmp_path / "b.bin"
+        )
+
+
+def test_truncated_recording(tmp_path, resource, state_machine, mock_fn):
+    recording_path = tmp_path / "recording.bin"
+    state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, record_to=recording_path
+    )
+    recording_path.write_bytes(recording_path.read_bytes()[:-3])
+
+    with recording_path.open("rb") as fp, pytest.raises(
+        AWSStepFuncsValueError, match="Truncated record in recording"
+    ):
+        list(read_records(fp))
+
+
+def test_replay_unused_records(tmp_path, resource, state_machine, mock_fn):
+    recording_path = tmp_path / "recording.bin"
+    state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, record_to=recording_path
+    )
+    unused = {"type": "mock", "resource": resource, "input": {}, "output": {}}
+    with recording_path.open("ab") as fp:
+        write_record(fp, unused)
+
+    with pytest.raises(ReplayDivergenceError) as exc_info:
+        state_machine.simulate({"foo": 5}, replay_from=recording_path)
+
+    assert exc_info.value.position == 5
+    assert exc_info.value.expected == unused
+    assert exc_info.value.actual is None
@@ -0,0 +1,109 @@
+import pytest
+
+from awsstepfuncs import AWSStepFuncsValueError, MapState, PassState, StateMachine
+from awsstepfuncs.errors import StateSimulationError
+from awsstepfuncs.reducers import Reducer, top_k
+
+
+@pytest.mark.parametrize(
+    ("name", "outputs", "reduction"),
+    [
+        ("count", [5, 6, 7], 3),
+        ("count", [], 0),
+        ("sum", [1, 2, 3.5], 6.5),
+        ("sum", [], 0),
+        ("min", [3, 1, 2], 1),
+        ("max", [3, 1, 2], 3),
+        ("max", [], None),
+        ("merge", [{"a": 1, "b": 1}, {"b": 2}, {}], {"a": 1, "b": 2}),
+        ("merge", [], {}),
+    ],
+)
+def test_built_in_reducers(name, outputs, reduction):
+    assert Reducer.from_name(name).reduce(outputs) == reduction
+
+
+def test_reductions_start_from_a_copy():
+    reducer = Reducer.from_name("merge")
+    assert reducer.reduce([{"a": 1}]) == {"a": 1}
+    assert reducer.reduce([{"b": 1}]) == {"b": 1}
+
+
+def test_reduction_consumes_outputs_one_by_one():
+    def outputs():
+        for output in range(3):
+            yield output
+            assert running_totals[-1] == sum(range(output + 1))
+
+    running_totals = []
+
+    def combine(total, output):
+        running_totals.append(total + output)
+        return total + output
+
+    assert Reducer(combine, initial=0).reduce(outputs()) == 3
+
+
+def test_top_k():
+    outputs = [
+        {"id": index, "score": score} for index, score in enumerate([2, 5, 2, 9])
+    ]
+    assert top_k(3, key=lambda output: output["score"]).reduce(outputs) == [
+        {"id": 3, "score": 9},
+        {"id": 1, "score": 5},
+        {"id": 0, "score": 2},
+    ]
+    assert top_k(10).reduce([3, 1, 2]) == [3, 2, 1]
+    assert top_k(1).reduce([]) == []
+
+
+def test_invalid_reducers():
+    with pytest.raises(AWSStepFuncsValueError, match="reducer must be one of"):
+        Reducer.from_name("median")
+    with pytest.raises(AWSStepFuncsValueError, match="k must be a positive integer"):
+        top_k(0)
+    with pytest.raises(StateSimulationError, match="Failed to reduce output"):
+        Reducer.from_name("sum").reduce([1, "a"])
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+@pytest.mark.parametrize(
+    ("reducer", "state_output"),
+    [
+        ("count", 20),
+        ("sum", sum(range(1, 21))),
+        ("max", 20),
+        (top_k(2), [20, 19]),
+        (Reducer(lambda digits, output: digits + str(output), initial=""), "123456"),
+    ],
+    ids=["count", "sum", "max", "top_k", "custom"],
+)
+def test_map_state_reducer(backend, reducer, state_output):
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass", input_path="$.value")),
+        items_path="$.items",
+        result_path="$.reduced",
+        max_concurrency=4,
+        backend=backend,
+        reducer=reducer,
+    )
+    state_machine = StateMachine(start_state=map_state)
+    n_items = 6 if isinstance(state_output, str) else 20
+    items = [{"value": value} for value in range(1, n_items + 1)]
+
+    assert state_machine.simulate({"items": items}, verbosity=0) == {
+        "items": items,
+        "reduced": state_output,
+    }
+
+
+def test_map_state_reducer_with_stream_output():
+    with pytest.raises(AWSStepFuncsValueError, match="can't be used together"):
+        MapState(
+            "Map",
+            iterator=StateMachine(start_state=PassState("Pass")),
+            max_concurrency=0,
+            stream_output=True,
+            reducer="sum",
+        )
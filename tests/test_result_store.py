@@ -0,0 +1,102 @@
+import pickle
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.result_store import ResultStore, SpilledOutput
+
+
+def store_outputs(outputs, memory_limit):
+    store = ResultStore(memory_limit)
+    for output in outputs:
+        store.append(output)
+    return store.finish()
+
+
+def test_outputs_fitting_in_memory_are_a_list():
+    outputs = [{"index": index} for index in range(10)]
+    assert store_outputs(outputs, memory_limit=1000) == outputs
+    assert store_outputs([], memory_limit=0) == []
+
+
+@pytest.mark.parametrize("memory_limit", [0, 50])
+def test_spilled_outputs(memory_limit):
+    outputs = [{"index": index, "name": "é" * index} for index in range(100)]
+    spilled_output = store_outputs(outputs, memory_limit)
+
+    assert isinstance(spilled_output, SpilledOutput)
+    assert len(spilled_output) == 100
+    assert list(spilled_output) == outputs
+    assert [spilled_output[index] for index in range(100)] == outputs
+    assert spilled_output[-1] == outputs[-1]
+    assert spilled_output[95:] == outputs[95:]
+    assert spilled_output[::-30] == outputs[::-30]
+    assert spilled_output.index(outputs[42]) == 42
+    with pytest.raises(IndexError):
+        spilled_output[100]
+    assert pickle.loads(pickle.dumps(spilled_output)) == outputs
+    spilled_output.close()
+
+
+def test_map_state_spills_outputs():
+    first_map_state = MapState(
+        "First",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        output_memory_limit=100,
+    )
+    second_map_state = MapState(
+        "Second",
+        iterator=StateMachine(start_state=PassState("Pass", input_path="$.index")),
+        max_concurrency=4,
+    )
+    first_map_state >> second_map_state
+    state_machine = StateMachine(start_state=first_map_state)
+    items = [{"index": index} for index in range(1, 101)]
+
+    assert state_machine.simulate(items, verbosity=0) == list(range(1, 101))
+
+    first_map_state.next_state = None
+    spilled_output = StateMachine(start_state=first_map_state).simulate(
+        items, verbosity=0
+    )
+    assert isinstance(spilled_output, SpilledOutput)
+    assert list(spilled_output) == items
+
+
+def test_map_state_spilled_outputs_into_task():
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=4,
+        output_memory_limit=100,
+    )
+    map_state >> TaskState("Echo", resource="echo")
+    state_machine = StateMachine(start_state=map_state)
+    items = [{"index": index} for index in range(1, 101)]
+
+    state_output = state_machine.simulate(
+        items, resource_to_mock_fn={"echo": lambda event, _: event}, verbosity=0
+    )
+
+    assert state_output == items
+
+
+def test_map_state_output_memory_limit_validation():
+    iterator = StateMachine(start_state=PassState("Pass"))
+    with pytest.raises(AWSStepFuncsValueError, match="must not be negative"):
+        MapState("Map", iterator=iterator, max_concurrency=0, output_memory_limit=-1)
+    with pytest.raises(AWSStepFuncsValueError, match="can't be used together"):
+        MapState(
+            "Map",
+            iterator=iterator,
+            max_concurrency=0,
+            reducer="count",
+            output_memory_limit=0,
+        )
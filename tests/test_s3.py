@@ -0,0 +1,245 @@
+import json
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    FailState,
+    MapState,
+    PassState,
+    StateMachine,
+    TaskState,
+    Verbosity,
+)
+from awsstepfuncs.s3 import S3_LIST_OBJECTS, ItemReader, LocalS3, ResultWriter
+
+ITEMS = [{"id": "1", "name": "é"}, {"id": "2", "name": "b, c"}]
+
+
+@pytest.fixture()
+def s3_directory(tmp_path):
+    bucket = tmp_path / "bucket"
+    (bucket / "items").mkdir(parents=True)
+    (bucket / "items" / "items.json").write_text(json.dumps(ITEMS))
+    (bucket / "items" / "items.jsonl").write_text(
+        "".join(json.dumps(item) + "\n" for item in ITEMS)
+    )
+    (bucket / "items" / "items.csv").write_text('id,name\n1,é\n2,"b, c"\n')
+    (bucket / "items" / "headless.csv").write_text('1,é\n2,"b, c"\n')
+    return tmp_path
+
+
+def simulate_map(s3_directory, state_input=None, **kwargs):
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=2,
+        **kwargs,
+    )
+    return StateMachine(start_state=map_state).simulate(
+        state_input, verbosity=Verbosity.SILENT, s3_directory=s3_directory
+    )
+
+
+@pytest.mark.parametrize(
+    ("key", "reader_kwargs"),
+    [
+        ("items/items.json", {"input_type": "JSON"}),
+        ("items/items.jsonl", {"input_type": "JSONL"}),
+        ("items/items.csv", {"input_type": "CSV"}),
+        (
+            "items/headless.csv",
+            {
+                "input_type": "CSV",
+                "csv_header_location": "GIVEN",
+                "csv_headers": ["id", "name"],
+            },
+        ),
+    ],
+)
+def test_item_reader(s3_directory, key, reader_kwargs):
+    item_reader = ItemReader(
+        parameters={"Bucket": "bucket", "Key.$": "$.key"}, **reader_kwargs
+    )
+    assert simulate_map(s3_directory, {"key": key}, item_reader=item_reader) == ITEMS
+
+
+def test_item_reader_mmap(s3_directory):
+    item_reader = ItemReader(
+        parameters={"Bucket": "bucket", "Key": "items/items.jsonl"},
+        input_type="JSONL",
+        max_items=1,
+    )
+    s3 = LocalS3(s3_directory, mmap_threshold=1)
+    with s3.open_object("bucket", "items/items.jsonl") as fp:
+        assert not hasattr(fp, "name")  # Memory-mapped
+    assert list(item_reader.read(s3, {})) == ITEMS[:1]
+
+
+def test_item_reader_list_objects(s3_directory):
+    item_reader = ItemReader(
+        resource=S3_LIST_OBJECTS,
+        parameters={"Bucket": "bucket", "Prefix": "items/items"},
+    )
+    state_output = simulate_map(s3_directory, item_reader=item_reader)
+    assert [item["Key"] for item in state_output] == [
+        "items/items.csv",
+        "items/items.json",
+        "items/items.jsonl",
+    ]
+    assert state_output[0]["Size"] == len('id,name\n1,é\n2,"b, c"\n'.encode())
+
+
+@pytest.mark.parametrize("key", ["missing.json", "../../etc/passwd", "items"])
+def test_item_reader_failed(s3_directory, key):
+    item_reader = ItemReader(
+        parameters={"Bucket": "bucket", "Key": key}, input_type="JSON"
+    )
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=0,
+        item_reader=item_reader,
+    )
+    map_state.add_catcher(
+        ["States.ItemReaderFailed"], next_state=PassState("Caught", result="caught")
+    )
+    state_machine = StateMachine(start_state=map_state)
+    assert (
+        state_machine.simulate(verbosity=Verbosity.SILENT, s3_directory=s3_directory)
+        == "caught"
+    )
+
+
+@pytest.mark.parametrize("output_type", [None, "JSONL"])
+def test_result_writer(s3_directory, output_type):
+    result_writer = ResultWriter(
+        parameters={"Bucket": "results", "Prefix": "runs/"},
+        output_type=output_type,
+        results_per_shard=2,
+    )
+    items = [{"index": index} for index in range(5)]
+    state_output = simulate_map(s3_directory, items, result_writer=result_writer)
+
+    s3 = LocalS3(s3_directory)
+    details = state_output["ResultWriterDetails"]
+    assert details["Bucket"] == "results"
+    map_run_id = state_output["MapRunArn"].rsplit("/", 1)[-1]
+    assert details["Key"] == f"runs/{map_run_id}/manifest.json"
+    manifest = json.loads(s3.path("results", details["Key"]).read_text())
+    shards = manifest["ResultFiles"]["SUCCEEDED"]
+    assert [shard["Key"] for shard in shards] == [
+        f"runs/{map_run_id}/SUCCEEDED_{index}.json" for index in range(3)
+    ]
+
+    records = []
+    for shard in shards:
+        text = s3.path("results", shard["Key"]).read_text()
+        assert shard["Size"] == len(text)
+        if output_type == "JSONL":
+            records.extend(json.loads(line) for line in text.splitlines())
+        else:
+            records.extend(json.loads(text))
+    assert [json.loads(record["Input"]) for record in records] == items
+    assert [json.loads(record["Output"]) for record in records] == items
+    assert {record["Status"] for record in records} == {"SUCCEEDED"}
+
+
+def test_round_trip():
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=0,
+        item_reader=ItemReader(
+            parameters={"Bucket": "bucket", "Key": "items.csv"},
+            input_type="CSV",
+            csv_header_location="GIVEN",
+            csv_headers=["id"],
+            max_items=10,
+        ),
+        result_writer=ResultWriter(
+            parameters={"Bucket": "results"}, output_type="JSONL"
+        ),
+    )
+    compiled = StateMachine(start_state=map_state).compile()
+    assert compiled["States"]["Map"]["ItemReader"] == {
+        "Resource": "arn:aws:states:::s3:getObject",
+        "ReaderConfig": {
+            "InputType": "CSV",
+            "CSVHeaderLocation": "GIVEN",
+            "CSVHeaders": ["id"],
+            "MaxItems": 10,
+        },
+        "Parameters": {"Bucket": "bucket", "Key": "items.csv"},
+    }
+    assert StateMachine.from_dict(compiled).compile() == compiled
+    assert StateMachine.from_dict(compiled).validate() == []
+
+
+def test_s3_directory_required():
+    item_reader = ItemReader(parameters={"Bucket": "b", "Key": "k"}, input_type="JSON")
+    with pytest.raises(AWSStepFuncsValueError, match="simulate it with s3_directory"):
+        simulate_map(None, item_reader=item_reader)
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "message"),
+    [
+        ({"resource": "arn:aws:states:::s3:deleteObject"}, "Unsupported ItemReader"),
+        ({"input_type": "XML"}, "input_type must be one of"),
+        ({"input_type": "CSV", "csv_header_location": "GIVEN"}, "csv_headers"),
+        ({"input_type": "JSON", "max_items": -1}, "must not be negative"),
+    ],
+)
+def test_invalid_item_readers(kwargs, message):
+    with pytest.raises(AWSStepFuncsValueError, match=message):
+        ItemReader(parameters={}, **kwargs)
+
+
+def test_result_writer_keeps_iteration_errors(s3_directory):
+    def build_state_machine(iterator_state):
+        map_state = MapState(
+            "Map",
+            iterator=StateMachine(start_state=iterator_state),
+            max_concurrency=0,
+            result_writer=ResultWriter(parameters={"Bucket": "results"}),
+        )
+        map_state.add_catcher(
+            ["States.ResultWriterFailed"],
+            next_state=PassState("Writer Failed", result="writer failed"),
+        )
+        map_state.add_catcher(
+            ["IFailed"], next_state=PassState("Caught", result="caught")
+        )
+        return StateMachine(start_state=map_state)
+
+    state_machine = build_state_machine(FailState("Fail", error="IFailed", cause=""))
+    assert (
+        state_machine.simulate(
+            [1], verbosity=Verbosity.SILENT, s3_directory=s3_directory
+        )
+        == "caught"
+    )
+
+    # Errors that aren't States errors, here recording a result that isn't
+    # JSON-serializable, are raised as they are
+    resource = "arn:aws:lambda:us-east-1:123456789012:function:Set"
+    state_machine = build_state_machine(TaskState("Task", resource=resource))
+    with pytest.raises(AWSStepFuncsValueError, match="set is not JSON serializable"):
+        state_machine.simulate(
+            [1],
+            verbosity=Verbosity.SILENT,
+            s3_directory=s3_directory,
+            resource_to_mock_fn={resource: lambda event, context: {1}},
+            record_to=s3_directory / "recording",
+        )
+
+    # Errors writing the results are still failures of the result writer
+    (s3_directory / "results").write_text("Not a bucket")
+    state_machine = build_state_machine(PassState("Pass"))
+    assert (
+        state_machine.simulate(
+            [1], verbosity=Verbosity.SILENT, s3_directory=s3_directory
+        )
+        == "writer failed"
+    )
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import io
+import json
+import sys
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    ChoiceState,
+    PassState,
+    StateMachine,
+    SucceedState,
+    VariableChoice,
+)
+from awsstepfuncs.serialization import (
+    OrjsonBackend,
+    StdlibJSONBackend,
+    get_json_backend,
+    set_json_backend,
+)
+
+
+@pytest.fixture(autouse=True)
+def _reset_json_backend():
+    yield
+    set_json_backend("auto")
+
+
+def build_state_machine(*, reverse_choices=False, comment="A machine"):
+    succeed_state = SucceedState("Succeed")
+    first_pass_state = PassState("First", result={"b": 1, "a": "é"})
+    second_pass_state = PassState("Second")
+    first_pass_state >> succeed_state
+    second_pass_state >> succeed_state
+    choices = [
+        VariableChoice("$.first", is_present=True, next_state=first_pass_state),
+        VariableChoice("$.second", is_present=True, next_state=second_pass_state),
+    ]
+    choice_state = ChoiceState(
+        "Choice",
+        choices=choices[::-1] if reverse_choices else choices,
+        default=succeed_state,
+    )
+    return StateMachine(start_state=choice_state, comment=comment, version="1.0")
+
+
+def canonical_json(state_machine):
+    fp = io.BytesIO()
+    state_machine.to_json(fp, canonical=True)
+    return fp.getvalue()
+
+
+def test_canonical_json():
+    state_machine = build_state_machine()
+    canonical = canonical_json(state_machine)
+    assert json.loads(canonical) == state_machine.compile()
+    assert canonical.startswith(b'{"Comment":"A machine","StartAt":"Choice"')
+    assert b" " not in canonical.replace(b"A machine", b"")
+    states = json.loads(canonical)["States"]
+    assert list(states) == sorted(states)
+    assert canonical == canonical_json(build_state_machine())
+
+
+def test_canonical_json_file(tmp_path):
+    state_machine = build_state_machine()
+    state_machine.to_json(tmp_path / "state_machine.json", canonical=True)
+    state_machine.to_json(tmp_path / "state_machine.json.gz", canonical=True)
+    canonical = canonical_json(state_machine)
+    assert (tmp_path / "state_machine.json").read_bytes() == canonical
+    with gzip.open(tmp_path / "state_machine.json.gz") as fp:
+        assert fp.read() == canonical
+
+    text_fp = io.StringIO()
+    state_machine.to_json(text_fp, canonical=True)
+    assert text_fp.getvalue() == canonical.decode()
+
+
+def test_definition_hash():
+    state_machine = build_state_machine()
+    definition_hash = state_machine.definition_hash()
+    assert definition_hash == hashlib.sha256(canonical_json(state_machine)).hexdigest()
+    assert definition_hash == build_state_machine().definition_hash()
+    assert definition_hash != build_state_machine(comment="Other").definition_hash()
+    # The order of choices matters, so it changes the definition
+    assert (
+        definition_hash != build_state_machine(reverse_choices=True).definition_hash()
+    )
+
+    state_machine.start_state.default.comment = "Changed"
+    assert state_machine.definition_hash() != definition_hash
+
+
+def test_compile_order_is_stable():
+    state_machine = build_state_machine()
+    assert list(state_machine.compile()["States"]) == [
+        "Choice",
+        "First",
+        "Succeed",
+        "Second",
+    ]
+
+
+def test_json_backends_agree():
+    pytest.importorskip("orjson")
+    state_machine = build_state_machine()
+    set_json_backend("orjson")
+    assert isinstance(get_json_backend(), OrjsonBackend)
+    orjson_canonical = canonical_json(state_machine)
+    set_json_backend("json")
+    assert isinstance(get_json_backend(), StdlibJSONBackend)
+    assert canonical_json(state_machine) == orjson_canonical
+
+
+def test_json_backend_without_orjson(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    with pytest.raises(AWSStepFuncsValueError, match="orjson is not installed"):
+        set_json_backend("orjson")
+    set_json_backend("auto")
+    assert isinstance(get_json_backend(), StdlibJSONBackend)
+
+
+def test_custom_json_backend():
+    class CountingBackend(StdlibJSONBackend):
+        calls = 0
+
+        def dumps(self, data):
+            self.calls += 1
+            return super().dumps(data)
+
+    backend = CountingBackend()
+    set_json_backend(backend)
+    build_state_machine().definition_hash()
+    assert backend.calls > 0
+
+
+def test_unknown_json_backend():
+    with pytest.raises(AWSStepFuncsValueError, match="Unknown JSON backend 'yaml'"):
+        set_json_backend("yaml")
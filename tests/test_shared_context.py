@@ -0,0 +1,135 @@
+import array
+import pickle
+import subprocess
+import sys
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from awsstepfuncs import AWSStepFuncsValueError, MapState, StateMachine, TaskState
+from awsstepfuncs.shared_context import SharedContext, SharedTable
+
+TABLE = {f"key {index}": {"index": index, "name": "é" * index} for index in range(500)}
+
+
+@pytest.fixture()
+def shared_context():
+    with SharedContext() as shared_context:
+        yield shared_context
+
+
+def test_shared_table(shared_context):
+    table = shared_context.share_table(TABLE)
+
+    assert len(table) == 500
+    assert table["key 42"] == TABLE["key 42"]
+    assert "key 499" in table
+    assert "key 500" not in table
+    assert 1 not in table
+    with pytest.raises(KeyError):
+        table["key 500"]
+    assert dict(table) == TABLE
+    assert list(table) == sorted(TABLE)
+    assert dict(shared_context.share_table({})) == {}
+
+
+def test_handles_pickle_small(shared_context):
+    table = shared_context.share_table(TABLE)
+    blob = shared_context.share_bytes(b"x" * 1_000_000)
+    shared_array = shared_context.share_array(array.array("q", range(100_000)))
+
+    for handle in (table, blob, shared_array):
+        assert len(pickle.dumps(handle)) < 200
+    assert pickle.loads(pickle.dumps(table))["key 7"] == TABLE["key 7"]
+    assert pickle.loads(pickle.dumps(blob)).buffer == b"x" * 1_000_000
+    assert sum(pickle.loads(pickle.dumps(shared_array)).view) == sum(range(100_000))
+
+
+def test_shared_bytes_and_arrays_are_read_only(shared_context):
+    blob = shared_context.share_bytes(bytearray(b"hello"))
+    shared_array = shared_context.share_array(array.array("d", [1.5, 2.5]))
+
+    assert len(blob) == 5
+    assert blob.buffer.tobytes() == b"hello"
+    assert shared_array.view.tolist() == [1.5, 2.5]
+    with pytest.raises(TypeError):
+        blob.buffer[0] = 0
+    with pytest.raises(TypeError):
+        shared_array.view[0] = 0.0
+
+
+def test_shared_numpy_array(shared_context):
+    numpy = pytest.importorskip("numpy")
+    matrix = numpy.arange(12, dtype=numpy.float32).reshape(3, 4)
+    shared_matrix = shared_context.share_array(matrix)
+
+    assert shared_matrix.shape == (3, 4)
+    numpy.testing.assert_array_equal(shared_matrix.numpy(), matrix)
+    assert not shared_matrix.numpy().flags.writeable
+    with pytest.raises(AWSStepFuncsValueError, match="C-contiguous"):
+        shared_context.share_array(matrix.T)
+
+
+def test_numpy_not_installed(shared_context, monkeypatch):
+    shared_array = shared_context.share_array(array.array("d", [1.0]))
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    with pytest.raises(AWSStepFuncsValueError, match="numpy is not installed"):
+        shared_array.numpy()
+
+
+def test_invalid_shared_data(shared_context):
+    with pytest.raises(AWSStepFuncsValueError, match="keys must be strings"):
+        shared_context.share_table({1: "one"})
+    with pytest.raises(AWSStepFuncsValueError, match="buffer protocol"):
+        shared_context.share_array([1, 2])
+
+
+def test_close_releases_memory():
+    shared_context = SharedContext()
+    table = shared_context.share_table(TABLE)
+    name = table.name
+    shared_context.close()
+
+    with pytest.raises(FileNotFoundError):
+        SharedTable(name)["key 1"]
+
+
+def test_attaching_process_does_not_unlink(shared_context):
+    table = shared_context.share_table(TABLE)
+    script = (
+        "import pickle, sys\n"
+        "table = pickle.loads(sys.stdin.buffer.read())\n"
+        "print(table['key 7']['index'])\n"
+    )
+    child = subprocess.run(
+        [sys.executable, "-c", script],
+        input=pickle.dumps(table),
+        capture_output=True,
+        check=True,
+    )
+
+    assert child.stdout == b"7\n"
+    assert b"leaked" not in child.stderr
+    # The block must outlive the process that attached it
+    SharedMemory(name=table.name).close()
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_mocks_read_shared_table(shared_context, backend):
+    resource = "arn:aws:lambda:us-east-1:123456789012:function:Lookup"
+    table = shared_context.share_table(TABLE)
+
+    def mock_lookup(event, context):
+        return table[event]["name"]
+
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=TaskState("Lookup", resource=resource)),
+        max_concurrency=2,
+        backend=backend,
+    )
+    state_output = StateMachine(start_state=map_state).simulate(
+        ["key 1", "key 3"], resource_to_mock_fn={resource: mock_lookup}, verbosity=0
+    )
+
+    assert state_output == ["é", "ééé"]
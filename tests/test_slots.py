@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from awsstepfuncs import (
+    AndChoice,
+    ChoiceRule,
+    ChoiceState,
+    FailState,
+    MapState,
+    NotChoice,
+    PassState,
+    StateMachine,
+    SucceedState,
+    TaskState,
+    VariableChoice,
+    WaitState,
+)
+from awsstepfuncs.error_handlers import Catcher, Retrier
+from awsstepfuncs.item_batcher import ItemBatcher
+from awsstepfuncs.lazy_json import open_document
+from awsstepfuncs.reducers import Reducer
+from awsstepfuncs.reference_path import ReferencePath
+from awsstepfuncs.shared_context import SharedContext, SharedTable
+
+pass_state = PassState("Pass")
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        pass_state,
+        ChoiceState("Choice", choices=[]),
+        FailState("Fail", error="Error", cause="Cause"),
+        MapState(
+            "Map", iterator=StateMachine(start_state=pass_state), max_concurrency=0
+        ),
+        SucceedState("Succeed"),
+        TaskState("Task", resource="arn"),
+        WaitState("Wait", seconds=1),
+        ChoiceRule("$.foo", is_present=True),
+        ChoiceRule("$.foo", string_equals_path="$.bar").data_test_expression,
+        AndChoice([ChoiceRule("$.foo", is_present=True)], next_state=pass_state),
+        NotChoice("$.foo", is_present=True, next_state=pass_state),
+        VariableChoice("$.foo", is_present=True, next_state=pass_state),
+        Catcher(["States.ALL"], next_state=pass_state),
+        Retrier(["States.ALL"]),
+        ReferencePath("$.foo"),
+        Reducer(max),
+        ItemBatcher(max_items_per_batch=10),
+        SharedContext(),
+        SharedTable("unmapped"),
+        open_document(io.BytesIO(b'{"a": []}')),
+        open_document(io.BytesIO(b"[]")),
+    ],
+    ids=lambda instance: instance.__class__.__name__,
+)
+def test_no_instance_dict(instance):
+    assert not hasattr(instance, "__dict__")
+    with pytest.raises(AttributeError):
+        instance.undeclared_attribute = None
+
+
+def test_data_test_expression_type():
+    data_test_expression = ChoiceRule("$.foo", numeric_equals=1).data_test_expression
+    assert data_test_expression.type == "numeric_equals"
+    assert data_test_expression.expression_type.name == "NUMERIC_EQUALS"
+
+
+def test_names_are_interned():
+    first_state = PassState("".join(["Pa", "ss"]))
+    second_state = PassState("".join(["Pa", "ss"]))
+    assert first_state.name is second_state.name
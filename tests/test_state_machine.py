@@ -1,13 +1,20 @@
+import gzip
+import io
 import json
 
 import pytest
 
 from awsstepfuncs import (
     AWSStepFuncsValueError,
+    ChoiceState,
     FailState,
+    MapState,
     PassState,
     StateMachine,
+    SucceedState,
     TaskState,
+    VariableChoice,
+    Verbosity,
 )
 
 
@@ -58,3 +65,89 @@ def test_to_json(tmp_path):
             },
         },
     }
+
+
+def test_all_states_with_loop():
+    first_state = PassState("First")
+    loop_state = ChoiceState(
+        "Loop",
+        choices=[
+            VariableChoice("$.done", boolean_equals=False, next_state=first_state)
+        ],
+        default=SucceedState("Done"),
+    )
+    first_state >> loop_state
+    state_machine = StateMachine(start_state=first_state)
+
+    assert {state.name for state in state_machine.all_states} == {
+        "First",
+        "Loop",
+        "Done",
+    }
+
+
+@pytest.fixture()
+def map_state_machine():
+    iterator = StateMachine(start_state=PassState("Iterate"))
+    map_state = MapState("Map", iterator=iterator, max_concurrency=0)
+    map_state >> TaskState("Task", resource="123")
+    return StateMachine(start_state=map_state, comment="Maps", version="1.1")
+
+
+def test_to_json_matches_compile(tmp_path, map_state_machine):
+    compiled_path = tmp_path / "state_machine.json"
+    map_state_machine.to_json(compiled_path)
+    assert json.loads(compiled_path.read_text()) == map_state_machine.compile()
+
+
+def test_to_json_gzip(tmp_path, map_state_machine):
+    compiled_path = tmp_path / "state_machine.json.gz"
+    map_state_machine.to_json(compiled_path)
+    with gzip.open(compiled_path, "rt") as fp:
+        assert json.load(fp) == map_state_machine.compile()
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_to_json_file_object(map_state_machine, binary):
+    fp = io.BytesIO() if binary else io.StringIO()
+    map_state_machine.to_json(fp)
+    assert not fp.closed
+    assert json.loads(fp.getvalue()) == map_state_machine.compile()
+
+
+def test_compile_cache(map_state_machine):
+    map_state = map_state_machine.start_state
+    task_state = map_state.next_state
+    compiled_task_state = map_state_machine.compile()["States"]["Task"]
+    assert map_state_machine.compile()["States"]["Task"] is compiled_task_state
+
+    task_state.timeout_seconds = 10
+    assert map_state_machine.compile()["States"]["Task"]["TimeoutSeconds"] == 10
+
+    task_state.add_retrier(["States.ALL"])
+    assert "Retry" in map_state_machine.compile()["States"]["Task"]
+
+    task_state.name = "Renamed Task"
+    assert map_state_machine.compile()["States"]["Map"]["Next"] == "Renamed Task"
+
+    map_state.iterator.start_state.comment = "Nested"
+    compiled_iterator = map_state_machine.compile()["States"]["Map"]["Iterator"]
+    assert compiled_iterator["States"]["Iterate"]["Comment"] == "Nested"
+
+    map_state.parameters["foo"] = "bar"
+    assert "Parameters" not in map_state_machine.compile()["States"]["Map"]
+    map_state.invalidate()
+    assert map_state_machine.compile()["States"]["Map"]["Parameters"] == {"foo": "bar"}
+
+
+def test_simulating_choice_state_keeps_cache():
+    choice_state = ChoiceState(
+        "Choice",
+        choices=[
+            VariableChoice("$.foo", is_present=True, next_state=SucceedState("Succeed"))
+        ],
+    )
+    state_machine = StateMachine(start_state=choice_state)
+    compiled_choice_state = state_machine.compile()["States"]["Choice"]
+    state_machine.simulate({"foo": 1}, verbosity=Verbosity.SILENT)
+    assert state_machine.compile()["States"]["Choice"] is compiled_choice_state
@@ -0,0 +1,97 @@
+import pytest
+
+from awsstepfuncs import AWSStepFuncsValueError, Verbosity
+from awsstepfuncs.synthetic import (
+    SYNTHETIC_RESOURCE,
+    generate_payload,
+    generate_state_machine,
+    identity_mock,
+)
+
+
+def test_generate_state_machine_is_reproducible():
+    compiled = generate_state_machine(1, n_states=200, map_depth=2).compile()
+    assert compiled == generate_state_machine(1, n_states=200, map_depth=2).compile()
+    assert compiled != generate_state_machine(2, n_states=200, map_depth=2).compile()
+    assert len(compiled["States"]) == 200
+
+
+def test_generate_state_machine_shape():
+    state_machine = generate_state_machine(
+        3,
+        n_states=300,
+        choice_ratio=0.3,
+        choice_branching=3,
+        back_edge_ratio=1,
+        task_ratio=0.2,
+        map_ratio=0.1,
+        map_depth=1,
+        map_iterator_states=4,
+        catcher_density=1,
+    )
+    states = state_machine.compile()["States"]
+    state_types = {state["Type"] for state in states.values()}
+    assert state_types == {"Pass", "Choice", "Task", "Map", "Succeed"}
+
+    for state in states.values():
+        if state["Type"] == "Choice":
+            back_edge, *choices = state["Choices"]
+            assert back_edge["Variable"] == "$.loop"
+            assert len(choices) == 3
+        elif state["Type"] in {"Task", "Map"}:
+            assert state["Catch"][0]["ErrorEquals"] == ["States.ALL"]
+        if state["Type"] == "Map":
+            assert len(state["Iterator"]["States"]) == 4
+
+
+def test_simulate_generated_state_machine():
+    state_machine = generate_state_machine(
+        4,
+        n_states=15,
+        choice_ratio=0.3,
+        back_edge_ratio=1,
+        map_ratio=0.3,
+        map_depth=2,
+        map_iterator_states=3,
+    )
+    payload = generate_payload(4, n_items=2, map_depth=2)
+    history = state_machine.simulate(
+        payload, verbosity=Verbosity.SILENT, return_history=True
+    )
+    assert list(history)[-1]["type"] == "ExecutionSucceeded"
+
+
+def test_identity_mock():
+    assert SYNTHETIC_RESOURCE.startswith("arn:aws:lambda:")
+    assert identity_mock({"foo": 1}, None) == {"foo": 1}
+
+
+def test_generate_payload():
+    payload = generate_payload(5, n_keys=3, depth=4, n_items=2, map_depth=3)
+    assert payload == generate_payload(5, n_keys=3, depth=4, n_items=2, map_depth=3)
+
+    data = payload["data"]
+    for _ in range(3):
+        assert len(data) == 3
+        data = data["key0"]
+
+    items = payload["items"]
+    for _ in range(2):
+        assert len(items) == 2
+        items = items[0]["items"]
+    assert "items" not in items[0]
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "message"),
+    [
+        ({"n_states": 0}, "State machines must have at least one state"),
+        (
+            {"choice_ratio": 0.5, "task_ratio": 0.5, "map_ratio": 0.5},
+            "choice_ratio, task_ratio, and map_ratio must add up to at most 1",
+        ),
+    ],
+)
+def test_bad_generator_arguments(kwargs, message):
+    with pytest.raises(AWSStepFuncsValueError, match=message):
+        generate_state_machine(1, **kwargs)
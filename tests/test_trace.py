@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from awsstepfuncs import (
+    AWSStepFuncsValueError,
+    FailState,
+    PassState,
+    StateMachine,
+    TaskState,
+)
+from awsstepfuncs.trace import (
+    JsonLinesSink,
+    NullSink,
+    RingBufferSink,
+    TraceEvent,
+    TraceEventType,
+)
+
+
+def test_trace_events(resource, state_machine, mock_fn):
+    sink = RingBufferSink()
+    state_machine.simulate(
+        {"foo": 5}, resource_to_mock_fn={resource: mock_fn}, trace_to=sink
+    )
+    assert all(isinstance(event, TraceEvent) for event in sink)
+    assert [
+        (event.event_type, event.state_name, event.detail, event.payload)
+        for event in sink
+    ] == [
+        (TraceEventType.EXECUTION_STARTED, None, None, {"foo": 5}),
+        # The payload is snapshotted before ResultPath mutates the input
+        (TraceEventType.STATE_ENTERED, "Pass", "Pass", {"foo": 5}),
+        (TraceEventType.PATH_APPLIED, "Pass", "InputPath", {"foo": 5}),
+        (
+            TraceEventType.PATH_APPLIED,
+            "Pass",
+            "ResultPath",
+            {"foo": 5, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.PATH_APPLIED,
+            "Pass",
+            "OutputPath",
+            {"foo": 5, "result": {"bar": 1}},
+        ),
+        (TraceEventType.STATE_EXITED, "Pass", "Pass", {"foo": 5, "result": {"bar": 1}}),
+        (
+            TraceEventType.STATE_ENTERED,
+            "Times Two",
+            "Task",
+            {"foo": 5, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.PATH_APPLIED,
+            "Times Two",
+            "InputPath",
+            {"foo": 5, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.MOCK_INVOKED,
+            "Times Two",
+            resource,
+            {"foo": 10, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.PATH_APPLIED,
+            "Times Two",
+            "ResultPath",
+            {"foo": 10, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.PATH_APPLIED,
+            "Times Two",
+            "OutputPath",
+            {"foo": 10, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.STATE_EXITED,
+            "Times Two",
+            "Task",
+            {"foo": 10, "result": {"bar": 1}},
+        ),
+        (
+            TraceEventType.EXECUTION_SUCCEEDED,
+            None,
+            None,
+            {"foo": 10, "result": {"bar": 1}},
+        ),
+    ]
+
+
+def test_trace_catcher_and_failure(tmp_path):
+    resource = "123"
+    task_state = TaskState("Task", resource=resource)
+    fail_state = FailState("Failure", error="IFailed", cause="I failed!")
+    task_state.add_catcher(["States.ALL"], next_state=fail_state)
+    state_machine = StateMachine(start_state=task_state)
+
+    def failure_mock_fn(event, context):
+        raise ValueError("Oops")
+
+    trace_path = tmp_path / "trace.jsonl"
+    state_machine.simulate(
+        resource_to_mock_fn={resource: failure_mock_fn}, trace_to=trace_path
+    )
+    with trace_path.open() as fp:
+        events = [json.loads(line) for line in fp]
+
+    catcher_event = next(event for event in events if event["type"] == "CatcherMatched")
+    assert catcher_event["state"] == "Task"
+    assert catcher_event["detail"] == "Failure"
+    assert catcher_event["payload"][0] == "States.TaskFailed"
+
+    assert events[-1] == {
+        "timestamp": events[-1]["timestamp"],
+        "type": "ExecutionFailed",
+        "state": None,
+        "detail": None,
+        "payload": ["IFailed", "I failed!"],
+    }
+
+
+def test_json_lines_sink_buffer(tmp_path):
+    trace_path = tmp_path / "trace.jsonl"
+    sink = JsonLinesSink(trace_path, buffer_size=1024)
+    sink.emit(TraceEventType.EXECUTION_STARTED, payload={})
+    assert trace_path.read_text() == ""
+    sink.close()
+    assert json.loads(trace_path.read_text())["type"] == "ExecutionStarted"
+
+
+def test_null_sink():
+    state_machine = StateMachine(start_state=PassState("Pass"))
+    assert state_machine.simulate({"foo": 1}, trace_to=NullSink()) == {"foo": 1}
+
+
+def test_bad_ring_buffer_size():
+    with pytest.raises(
+        AWSStepFuncsValueError, match="max_events must be a positive integer"
+    ):
+        RingBufferSink(max_events=0)
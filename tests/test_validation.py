@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+from awsstepfuncs import MapState, PassState, StateMachine
+from awsstepfuncs.synthetic import generate_state_machine
+from awsstepfuncs.validation import ValidationIssue, validate_definition, validate_many
+
+
+def issues_of(definition):
+    return [str(issue) for issue in validate_definition(definition)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_synthetic_state_machines_are_valid(seed):
+    state_machine = generate_state_machine(
+        seed, n_states=50, task_ratio=0.2, map_ratio=0.2, map_depth=2
+    )
+    assert state_machine.validate() == []
+    assert validate_definition(state_machine.compile()) == []
+
+
+def test_collects_every_issue():
+    definition = {
+        "StartAt": "Start",
+        "Version": "1.0",
+        "Foo": 1,
+        "States": {
+            "Start": {"Type": "Pass", "Next": "Choose", "End": True},
+            "Choose": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.a", "IsPresent": True}],
+                "Default": "Missing",
+                "End": True,
+            },
+            "Task": {
+                "Type": "Task",
+                "Retry": [{"ErrorEquals": ["States.ALL"]}, {"ErrorEquals": ["A"]}],
+                "Catch": [{"ErrorEquals": []}],
+                "Bar": 2,
+            },
+            "Done": {"Type": "Succeed"},
+        },
+    }
+    assert issues_of(definition) == [
+        'Unknown field "Foo"',
+        "Start: Pass States can't have Next and End",
+        'Choose: Unknown field "End" in Choice State',
+        "Choose: Each choice must have Next",
+        'Choose: Default refers to unknown state "Missing"',
+        'Task: Unknown field "Bar" in Task State',
+        "Task: Task States must have Next or End",
+        "Task: Task States must have a Resource",
+        'Task: "States.ALL" must appear alone in the last Retry ErrorEquals',
+        "Task: Catch must have a non-empty ErrorEquals",
+        "Task: Each Catcher must have Next",
+        "Task: State is not reachable from StartAt",
+        "Done: State is not reachable from StartAt",
+    ]
+
+
+def test_nested_state_machines():
+    definition = {
+        "StartAt": "Map",
+        "States": {
+            "Map": {
+                "Type": "Map",
+                "ItemProcessor": {
+                    "StartAt": "Missing",
+                    "States": {"Map": {"Type": "Pass", "End": True}},
+                },
+                "Next": "Parallel",
+            },
+            "Parallel": {
+                "Type": "Parallel",
+                "Branches": [
+                    {
+                        "StartAt": "Wait",
+                        "States": {"Wait": {"Type": "Wait", "End": True}},
+                    }
+                ],
+                "End": True,
+            },
+        },
+    }
+    assert issues_of(definition) == [
+        'Map: StartAt refers to unknown state "Missing"',
+        "Map > Map: State names must be unique",
+        "Parallel > Wait: Wait States must have exactly one of Seconds, Timestamp, "
+        "SecondsPath, TimestampPath",
+    ]
+
+
+def test_nested_duplicate_names_in_python():
+    pass_state = PassState("Pass")
+    map_state = MapState(
+        "Map",
+        iterator=StateMachine(start_state=PassState("Pass")),
+        max_concurrency=0,
+    )
+    map_state >> pass_state
+    assert StateMachine(start_state=map_state).validate() == [
+        ValidationIssue(("Pass",), "State names must be unique")
+    ]
+
+
+@pytest.mark.parametrize(
+    ("definition", "message"),
+    [
+        ([], "State machine definitions must be objects"),
+        ({"StartAt": "A", "States": {}}, "States must be a non-empty object"),
+        (
+            {"StartAt": "A", "States": {"A": {"Type": "Magic"}}},
+            'A: Unknown state type "Magic"',
+        ),
+    ],
+)
+def test_invalid_definitions(definition, message):
+    assert issues_of(definition) == [message]
+
+
+def test_error_handlers_must_be_objects():
+    definition = {
+        "StartAt": "Task",
+        "States": {
+            "Task": {
+                "Type": "Task",
+                "Resource": "arn:aws:lambda:us-east-1:123456789012:function:Do",
+                "Retry": ["x", {"ErrorEquals": []}],
+                "Catch": [1],
+                "End": True,
+            }
+        },
+    }
+    assert issues_of(definition) == [
+        "Task: Each Retrier must be an object",
+        "Task: Retry must have a non-empty ErrorEquals",
+        "Task: Each Catcher must be an object",
+    ]
+    # One invalid definition doesn't stop the others from being validated
+    assert validate_many([definition, {"StartAt": "A"}], max_workers=1)[0] == (
+        validate_definition(definition)
+    )
+
+
+def test_validate_many(tmp_path):
+    valid = generate_state_machine(0, n_states=20, map_depth=1).compile()
+    invalid = {"StartAt": "Missing", "States": {"A": {"Type": "Succeed"}}}
+    path = tmp_path / "state_machine.json"
+    path.write_text(json.dumps(invalid))
+    definitions = [valid, invalid, path, str(path)]
+
+    expected = [validate_definition(definition) for definition in definitions]
+    assert expected[0] == []
+    assert expected[2] == expected[1] != []
+    assert validate_many(definitions, max_workers=1) == expected
+    assert validate_many(definitions, max_workers=2, chunksize=1) == expected